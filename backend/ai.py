@@ -1,17 +1,11 @@
 import os
 import json
-import uuid
-import hashlib
-from typing import Optional, List
+import asyncio
+from typing import AsyncIterator, Dict, Optional, List
 from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-try:
-    from openai import OpenAI  # type: ignore
-except Exception:
-    OpenAI = None  # type: ignore
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
 import aiosqlite
 from huggingface_hub import InferenceClient
 from PIL import Image
@@ -24,11 +18,18 @@ except Exception:
     redis = None  # type: ignore
     REDIS_AVAILABLE = False
 
-from database import DB_PATH
-from auth import SECRET_KEY, ALGORITHM
+from database import pool
+from auth import get_current_user
+from openai_client import chat_completion, get_openai_client, stream_chat_completion
+from recipe_stream import RecipeStreamParser
+from answer_cache import answer_cache, make_answer_cache_key
+from prompt_context import ChatContext, load_chat_context, prompt_context_cache
+from image_jobs import ImageJob, ImageJobQueue
+from image_cache import make_image_cache_key, recipe_image_cache
+from image_renditions import create_renditions
+from image_store import local_path, store_image
 
 router = APIRouter(prefix="/ask-ai", tags=["ai"])
-security = HTTPBearer()  # require token
 
 
 class AIRequest(BaseModel):
@@ -61,10 +62,18 @@ async def get_redis() -> Optional["redis.Redis"]:
     return _redis_client
 
 
-def make_image_cache_key(name: str, ingredients: List[str]) -> str:
-    normalized = (name.strip().lower() + "|" + ",".join(sorted([i.strip().lower() for i in ingredients])))
-    h = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
-    return f"recipe_image:{h}"
+RECIPE_COMPLETION_OPTIONS = {
+    "model": "gpt-4o-mini",
+    "temperature": 0.6,
+    "max_tokens": 600,
+    "response_format": {"type": "json_object"},
+}
+# How long /ask-ai/stream keeps the connection open waiting for image events
+IMAGE_TIMEOUT = float(os.getenv("AI_IMAGE_TIMEOUT", "12"))
+# Cross-worker single-flight: lock lifetime, and how long/often followers poll
+IMAGE_LOCK_TTL = int(os.getenv("AI_IMAGE_LOCK_TTL", "120"))
+IMAGE_LOCK_WAIT = float(os.getenv("AI_IMAGE_LOCK_WAIT", "90"))
+IMAGE_LOCK_POLL = float(os.getenv("AI_IMAGE_LOCK_POLL", "0.5"))
 
 
 def make_recent_list_key(user_id: Optional[int]) -> Optional[str]:
@@ -73,10 +82,6 @@ def make_recent_list_key(user_id: Optional[int]) -> Optional[str]:
     return f"recent_recipes:{user_id}"
 
 
-def clamp_list(items: List[str], max_len: int) -> List[str]:
-    return items[:max_len]
-
-
 def generate_food_image(recipe_name: str, ingredients: List[str]) -> str:
     """Generate a food image using Hugging Face Stable Diffusion with lighter compute."""
     try:
@@ -111,172 +116,154 @@ def generate_food_image(recipe_name: str, ingredients: List[str]) -> str:
             num_inference_steps=steps,
         )
 
-        os.makedirs("uploaded_images", exist_ok=True)
-        image_filename = f"recipe_{uuid.uuid4().hex[:8]}.png"
-        image_path = os.path.join("uploaded_images", image_filename)
-        image.save(image_path)
-        return f"uploaded_images/{image_filename}"
+        image_path = store_image(image, "PNG")
+        try:
+            create_renditions(local_path(image_path))
+        except Exception as e:
+            print(f"Failed to build renditions for {image_path}: {e}")
+        return image_path
     except Exception as e:
         print(f"Error generating image: {e}")
         return ""
 
 
-def get_current_user(token: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[int]:
-    if token is None:
-        return None
+async def save_chat_message(db: aiosqlite.Connection, user_id: int, role: str, content: str) -> None:
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return int(payload.get("user_id"))
-    except JWTError:
-        return None
+        await db.execute(
+            "INSERT INTO chat_messages (user_id, role, content) VALUES (?, ?, ?)",
+            (user_id, role, content),
+        )
+        await db.commit()
+    except Exception as e:
+        print(f"Failed to save chat message: {e}")
+
+
+def render_chat_messages(context: ChatContext, question: str) -> List[dict]:
+    """System prompt (pre-rendered in the context) plus recent chat history and the question."""
+    messages = [{"role": "system", "content": context.system_prompt}]
+    for m in context.recent:
+        clipped = m["content"][:1500]
+        messages.append({"role": m["role"], "content": clipped})
+    messages.append({"role": "user", "content": question})
+    return messages
 
 
-async def fetch_user_pantry_items(user_id: int) -> List[str]:
-    query = "SELECT name FROM pantry_items WHERE user_id = ?"
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(query, (user_id,))
-        rows = await cursor.fetchall()
-    return [row[0] for row in rows]
-
-
-async def fetch_user_dietary_preferences(user_id: int) -> dict:
-    query = """SELECT dietary_preferences, allergies, cuisine_preferences 
-               FROM users WHERE id = ?"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(query, (user_id,))
-        row = await cursor.fetchone()
-        if row:
-            return {
-                "dietary_preferences": row[0],
-                "allergies": row[1],
-                "cuisine_preferences": row[2]
-            }
-    return {
-        "dietary_preferences": None,
-        "allergies": None,
-        "cuisine_preferences": None
-    }
-
-
-async def fetch_user_utensils(user_id: int) -> List[str]:
-    query = "SELECT name, category FROM utensils WHERE user_id = ?"
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(query, (user_id,))
-        rows = await cursor.fetchall()
-    return [f"{row[0]} ({row[1]})" for row in rows]
-
-
-async def save_chat_message(user_id: int, role: str, content: str) -> None:
+def is_json_object(text: str) -> bool:
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute(
-                "INSERT INTO chat_messages (user_id, role, content) VALUES (?, ?, ?)",
-                (user_id, role, content),
-            )
-            await db.commit()
-    except Exception as e:
-        print(f"Failed to save chat message: {e}")
+        return isinstance(json.loads(text), dict)
+    except (TypeError, ValueError):
+        return False
 
 
-async def get_recent_messages(user_id: int, limit: int = 5) -> List[dict]:
+def answer_key_for(context: ChatContext, question: str) -> str:
+    return make_answer_cache_key(question, context.pantry, context.dietary, context.utensils, context.recent)
+
+
+async def persist_chat(user_id: int, question: str, answer: str) -> None:
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute(
-                "SELECT role, content FROM chat_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
-                (user_id, limit),
-            )
-            rows = await cursor.fetchall()
-        # Reverse to chronological order
-        return [{"role": row[0], "content": row[1]} for row in rows[::-1]]
+        async with pool.acquire() as db:
+            await save_chat_message(db, user_id, "user", question)
+            await save_chat_message(db, user_id, "assistant", answer)
+        prompt_context_cache.record_turn(user_id, question, answer)
     except Exception as e:
-        print(f"Failed to load chat messages: {e}")
-        return []
+        print(f"Failed to persist chat: {e}")
+
+
+async def produce_recipe_image(job: ImageJob) -> str:
+    """Generate and cache a recipe image, at most once across workers.
+
+    The durable cache is checked first. A Redis lock on the cache key then
+    elects one worker to call Hugging Face; the others poll Redis until the
+    image appears. Without Redis, or if waiting exceeds IMAGE_LOCK_WAIT,
+    generate locally.
+    """
+    r = await get_redis()
+    cached = await recipe_image_cache.get(job.key, r)
+    if cached:
+        return cached
+
+    lock = None
+    if r is not None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IMAGE_LOCK_WAIT
+        try:
+            candidate = r.lock(f"{job.key}:lock", timeout=IMAGE_LOCK_TTL, blocking=False)
+            while True:
+                if await candidate.acquire():
+                    lock = candidate
+                    break
+                if loop.time() >= deadline:
+                    print(f"Timed out waiting for image lock on {job.key}")
+                    break
+                await asyncio.sleep(IMAGE_LOCK_POLL)
+                cached = await r.get(job.key)  # type: ignore
+                if cached:
+                    return cached
+        except Exception as e:
+            print(f"Image lock unavailable: {e}")
+
+    try:
+        if lock is not None:
+            # Another worker may have finished between our last check and acquiring
+            cached = await recipe_image_cache.get(job.key, r)
+            if cached:
+                return cached
+        image_path = await image_jobs.run_blocking(generate_food_image, job.name, job.ingredients)
+        if image_path:
+            try:
+                await recipe_image_cache.put(job.key, image_path, job.name, job.ingredients, r)
+            except Exception as e:
+                print(f"Failed to record recipe image: {e}")
+        return image_path
+    finally:
+        if lock is not None:
+            try:
+                await lock.release()
+            except Exception:
+                pass
+
+
+image_jobs = ImageJobQueue(produce_recipe_image)
+
+
+async def attach_recipe_image(user_id: int, recipe: dict, r) -> Optional[ImageJob]:
+    """Fill recipe['image'] from the cache, or queue a background job and attach its id and status URL."""
+    recipe["image"] = ""
+    name = recipe.get("name") or ""
+    ingredients = recipe.get("ingredients") or []
+    if not name or not ingredients:
+        return None
+    cache_key = make_image_cache_key(name, ingredients)
+    cached = await recipe_image_cache.get(cache_key, r) or await recipe_image_cache.get_similar(cache_key, name, ingredients, r)
+    if cached:
+        recipe["image"] = cached
+        return None
+    job = image_jobs.submit(user_id, name, ingredients, cache_key)
+    if job is not None:
+        recipe["image_job_id"] = job.id
+        recipe["image_status_url"] = f"{router.prefix}/images/{job.id}"
+    return job
 
 
 @router.post("/")
-async def ask_ai(request: AIRequest, token: HTTPAuthorizationCredentials = Depends(security)):
+async def ask_ai(request: AIRequest, http_request: Request, user_id: int = Depends(get_current_user)):
     try:
-        # Enforce auth
-        try:
-            payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id: Optional[int] = int(payload.get("user_id"))
-        except Exception:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key or OpenAI is None:
+        if get_openai_client() is None:
             raise HTTPException(status_code=503, detail="AI service unavailable")
 
-        client = OpenAI(api_key=api_key)  # type: ignore
-
-        pantry_context = ""
-        dietary_context = ""
-        utensils_context = ""
-
-        recent_msgs = await get_recent_messages(user_id, limit=5)
-        
-        if user_id is not None:
-            # Limit pantry items added to the prompt to reduce tokens
-            items = await fetch_user_pantry_items(user_id)
-            items = clamp_list(items, 30)
-            if items:
-                formatted = [f"- {name}" for name in items]
-                pantry_context = "\nUser pantry items:\n" + "\n".join(formatted)
-
-            prefs = await fetch_user_dietary_preferences(user_id)
-            dietary_parts = []
-            if prefs["dietary_preferences"]:
-                dietary_parts.append(f"Diet Type: {prefs['dietary_preferences']}")
-            if prefs["allergies"]:
-                dietary_parts.append(f"⚠️ ALLERGIES (MUST AVOID): {prefs['allergies']}")
-            if prefs["cuisine_preferences"]:
-                dietary_parts.append(f"Preferred Cuisines: {prefs['cuisine_preferences']}")
-            if dietary_parts:
-                dietary_context = "\n\nUser Dietary Preferences:\n" + "\n".join(dietary_parts)
-            
-            utensils = await fetch_user_utensils(user_id)
-            utensils = clamp_list(utensils, 25)
-            if utensils:
-                formatted = [f"- {name}" for name in utensils]
-                utensils_context = "\n\nAvailable Kitchen Utensils:\n" + "\n".join(formatted)
-
-        system_msg = {
-            "role": "system",
-            "content": (
-                "You are a helpful cooking assistant AI Chef. Return STRICT JSON ONLY. No markdown, no prose.\n\n"
-                "When the user asks for recipes, respond with EXACTLY this JSON object shape:\n"
-                "{\n  \"recipes\": [\n    {\n      \"name\": \"Descriptive Recipe Name\",\n      \"ingredients\": [\"ingredient with quantity\", \"ingredient\"],\n      \"instructions\": \"Sentence 1.\\nSentence 2.\\nSentence 3.\",\n      \"nutrients\": {\"calories\": 450, \"protein\": 30, \"carbs\": 60, \"fat\": 15},\n      \"prep_time\": 15,\n      \"cook_time\": 25,\n      \"image\": \"\",\n      \"id\": 1\n    }\n  ],\n  \"follow_up\": \"A short, friendly follow-up question\"\n}\n\n"
-                "Rules for instructions: write clear sentences separated by \n, DO NOT prefix with numbers or bullets (no '1.', '-', '•'). Avoid quotes inside sentences when possible. No trailing commas anywhere.\n\n"
-                "If the user asks a cooking question (not recipes), reply with a JSON object: {\"answer\": \"text\", \"recipes\": [] } and keep it short.\n\n"
-                "Apply dietary and equipment rules strictly.\n"
-                + dietary_context
-                + pantry_context
-                + utensils_context
-            ),
-        }
-
-        messages = [system_msg]
-        for m in recent_msgs:
-            clipped = m["content"][:1500]
-            messages.append({"role": m["role"], "content": clipped})
-        messages.append({"role": "user", "content": request.question})
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.6,
-            max_tokens=600,
-            response_format={"type": "json_object"},
-        )
-
-        answer = response.choices[0].message.content if response.choices else ""
+        context = await load_chat_context(user_id, http_request.state.user)
+        answer_key = answer_key_for(context, request.question)
+        r = await get_redis()
+        answer = await answer_cache.get(answer_key, r)
+        if answer is None:
+            messages = render_chat_messages(context, request.question)
+            response = await chat_completion(messages=messages, **RECIPE_COMPLETION_OPTIONS)
+            answer = response.choices[0].message.content if response.choices else ""
+            if is_json_object(answer):
+                await answer_cache.set(answer_key, answer, r)
 
         # Persist conversation
-        try:
-            await save_chat_message(user_id, "user", request.question)
-            await save_chat_message(user_id, "assistant", answer)
-        except Exception as e:
-            print(f"Failed to persist chat: {e}")
+        await persist_chat(user_id, request.question, answer)
 
         # First try to parse full JSON object
         try:
@@ -286,50 +273,10 @@ async def ask_ai(request: AIRequest, token: HTTPAuthorizationCredentials = Depen
 
             # If we have recipes array, optionally generate images
             if isinstance(recipes, list):
-                # Try cache & generation path (reuse existing code pattern)
-                r = await get_redis()
-                to_generate = []
-                for i, rec in enumerate(recipes):
-                    if not isinstance(rec, dict):
-                        continue
-                    name = rec.get('name') or ''
-                    ingredients = rec.get('ingredients') or []
-                    cache_key = make_image_cache_key(name, ingredients) if name and ingredients else None
-                    img_path = None
-                    if r is not None and cache_key is not None:
-                        try:
-                            img_path = await r.get(cache_key)  # type: ignore
-                        except Exception:
-                            img_path = None
-                    if img_path:
-                        rec['image'] = img_path
-                    else:
-                        rec['image'] = ""
-                        to_generate.append(i)
-
-                if to_generate:
-                    from concurrent.futures import ThreadPoolExecutor
-                    import concurrent.futures
-                    executor = ThreadPoolExecutor(max_workers=3)
-                    futures = {executor.submit(generate_food_image, recipes[i].get('name', ''), recipes[i].get('ingredients', [])): i for i in to_generate}
-                    try:
-                        for future in concurrent.futures.as_completed(futures, timeout=12):
-                            try:
-                                image_path = future.result()
-                                idx = futures[future]
-                                if image_path:
-                                    recipes[idx]['image'] = image_path
-                                    r = await get_redis()
-                                    if r is not None:
-                                        try:
-                                            cache_key = make_image_cache_key(recipes[idx].get('name', ''), recipes[idx].get('ingredients', []))
-                                            await r.set(cache_key, image_path, ex=7 * 24 * 3600)  # 7 days
-                                        except Exception:
-                                            pass
-                            except Exception as e:
-                                print(f"Image generation failed: {e}")
-                    except concurrent.futures.TimeoutError:
-                        print("Image generation timed out")
+                # Cached images are filled in now; the rest are generated in the background
+                for rec in recipes:
+                    if isinstance(rec, dict):
+                        await attach_recipe_image(user_id, rec, r)
 
                 return {"answer": "Here are some recipe suggestions for you:", "recipes": recipes, "follow_up": follow_up_text}
         except Exception as e:
@@ -337,5 +284,110 @@ async def ask_ai(request: AIRequest, token: HTTPAuthorizationCredentials = Depen
 
         # Fallback: return plain text if not parsable
         return {"answer": answer, "recipes": None, "follow_up": None}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def recipe_deltas(context: ChatContext, question: str) -> AsyncIterator[str]:
+    """Completion text for the prompt: the cached answer in one piece, or live deltas (then cached)."""
+    answer_key = answer_key_for(context, question)
+    r = await get_redis()
+    cached = await answer_cache.get(answer_key, r)
+    if cached is not None:
+        yield cached
+        return
+    chunks = []
+    async for delta in stream_chat_completion(messages=render_chat_messages(context, question), **RECIPE_COMPLETION_OPTIONS):
+        chunks.append(delta)
+        yield delta
+    answer = "".join(chunks)
+    if is_json_object(answer):
+        await answer_cache.set(answer_key, answer, r)
+
+
+async def stream_recipe_events(user_id: int, question: str, context: ChatContext) -> AsyncIterator[str]:
+    """SSE stream: a `recipe` event as each recipe's JSON closes, `image` events as
+    pictures become ready, a `message` event with the answer/follow-up text, then `done`.
+    """
+    parser = RecipeStreamParser()
+    r = await get_redis()
+    image_waits: Dict[asyncio.Future, int] = {}
+
+    def finished_images() -> List[str]:
+        events = []
+        for waiter in [w for w in image_waits if w.done()]:
+            index = image_waits.pop(waiter)
+            image_path = waiter.result()
+            if image_path:
+                events.append(sse_event("image", {"index": index, "image": image_path}))
+        return events
+
+    try:
+        async for delta in recipe_deltas(context, question):
+            for recipe in parser.feed(delta):
+                index = parser.count - 1
+                job = await attach_recipe_image(user_id, recipe, r)
+                yield sse_event("recipe", {"index": index, "recipe": recipe})
+                if job is not None:
+                    image_waits[job.result] = index
+            for event in finished_images():
+                yield event
+
+        answer = parser.text
+        await persist_chat(user_id, question, answer)
+
+        try:
+            parsed = json.loads(answer)
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, dict) and isinstance(parsed.get("recipes"), list):
+            text = parsed.get("answer") or ("Here are some recipe suggestions for you:" if parsed["recipes"] else "")
+            yield sse_event("message", {"answer": text, "follow_up": parsed.get("follow_up")})
+        else:
+            yield sse_event("message", {"answer": answer, "follow_up": None})
+
+        # Jobs outliving the stream keep running; clients can poll image_status_url
+        if image_waits:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + IMAGE_TIMEOUT
+            while image_waits and loop.time() < deadline:
+                await asyncio.wait(list(image_waits), timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED)
+                for event in finished_images():
+                    yield event
+        yield sse_event("done", {"recipes": parser.count, "pending_images": len(image_waits)})
+    except Exception as e:
+        print(f"AI stream failed: {e}")
+        yield sse_event("error", {"detail": str(e)})
+
+
+@router.post("/stream")
+async def ask_ai_stream(request: AIRequest, http_request: Request, user_id: int = Depends(get_current_user)):
+    """Same prompt as POST /ask-ai/, streamed as server-sent events."""
+    if get_openai_client() is None:
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+    context = await load_chat_context(user_id, http_request.state.user)
+    return StreamingResponse(
+        stream_recipe_events(user_id, request.question, context),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/images/{job_id}")
+async def get_image_job(job_id: str, user_id: int = Depends(get_current_user)):
+    """Status of a background recipe-image job; `image` is set once status is "done"."""
+    job = image_jobs.get(job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Image job not found")
+    return job.to_dict()
+
+
+@router.get("/cache/stats")
+async def cache_stats(user_id: int = Depends(get_current_user)):
+    return {"answers": answer_cache.stats(), "images": recipe_image_cache.stats()}
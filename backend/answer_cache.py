@@ -0,0 +1,151 @@
+import os
+import re
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Answers are keyed on the normalized question plus content hashes of every
+# input that shapes the prompt, so a hit is only possible while the user's
+# kitchen state and recent conversation are unchanged. Exchanges at the end
+# of the history that asked this same question are left out of the key, so
+# asking again (which appended that exchange) can still hit, while
+# follow-ups such as "another one" stay tied to their conversation. Tune
+# through the env.
+ANSWER_CACHE_ENABLED = os.getenv("AI_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_TTL = int(os.getenv("AI_ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("AI_ANSWER_CACHE_SIZE", "512"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return _WHITESPACE.sub(" ", question.strip().lower()).rstrip("?!. ")
+
+
+def _digest(value) -> str:
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _history_before(question: str, recent: Sequence[Dict]) -> List[Dict]:
+    """Recent turns without the trailing exchanges that asked `question` itself."""
+    turns = list(recent)
+    while (
+        len(turns) >= 2
+        and turns[-2]["role"] == "user"
+        and turns[-1]["role"] == "assistant"
+        and normalize_question(turns[-2]["content"]) == question
+    ):
+        turns = turns[:-2]
+    return turns
+
+
+def make_answer_cache_key(
+    question: str,
+    pantry: Iterable[str],
+    dietary: Sequence[Optional[str]],
+    utensils: Iterable[str],
+    recent: Sequence[Dict],
+) -> str:
+    question = normalize_question(question)
+    parts = [
+        question,
+        _digest(sorted(i.strip().lower() for i in pantry)),
+        _digest([(d or "").strip().lower() for d in dietary]),
+        _digest(sorted(u.strip().lower() for u in utensils)),
+        _digest([[m["role"], m["content"]] for m in _history_before(question, recent)]),
+    ]
+    h = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+    return f"ai_answer:{h}"
+
+
+class AnswerCache:
+    """In-process LRU with expiry, backed by Redis when a client is supplied.
+
+    The local LRU always answers first; Redis lets workers share answers and
+    refills the local copy on a hit there.
+    """
+
+    def __init__(self, ttl: int = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_local(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.time() + (ttl if ttl is not None else self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str, r=None) -> Optional[str]:
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        value = self._get_local(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if r is not None:
+            try:
+                value = await r.get(key)
+            except Exception:
+                value = None
+            if value is not None:
+                try:
+                    remaining = await r.ttl(key)
+                except Exception:
+                    remaining = None
+                self._put_local(key, value, remaining if remaining and remaining > 0 else None)
+                self.hits += 1
+                self.redis_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, r=None) -> None:
+        if not ANSWER_CACHE_ENABLED or not value:
+            return
+        self._put_local(key, value)
+        self.stores += 1
+        if r is not None:
+            try:
+                await r.set(key, value, ex=self.ttl)
+            except Exception:
+                pass
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+answer_cache = AnswerCache()
@@ -1,16 +1,116 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from passlib.context import CryptContext
-from jose import jwt
+from jose import jwt, JWTError
 import aiosqlite
 import redis.asyncio as redis
+import os
+import time
+import hashlib
 import secrets
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from database import DB_PATH
+from typing import Dict, NamedTuple, Optional
+from database import get_db, pool
+from passwords import hasher
 
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+TOKEN_CACHE_DEFAULT_TTL = 300  # seconds, for tokens without an exp claim
+# The cached user row is re-read after this long. Other workers' profile
+# writes only invalidate their own cache, so this bounds how stale goals
+# and preferences can get; the signature check stays cached until `exp`.
+TOKEN_USER_TTL = int(os.getenv("TOKEN_USER_TTL", "300"))
+
+USER_COLUMNS = (
+    "id", "username", "name", "email", "height", "weight",
+    "daily_calorie_goal", "daily_protein_goal", "daily_carbs_goal", "daily_fat_goal",
+    "breakfast_time", "lunch_time", "dinner_time", "snack_time",
+    "dietary_preferences", "allergies", "cuisine_preferences",
+)
+
+security = HTTPBearer()
+
+
+class CachedToken(NamedTuple):
+    user_id: int
+    expires_at: float  # token `exp`
+    user: Dict
+    user_expires_at: float  # when `user` must be re-read
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens, keyed by token hash, valid until `exp`.
+
+    Saves the signature check and the users lookup on every authenticated
+    call. Entries also carry the user's row for up to TOKEN_USER_TTL, so
+    profile writes must call invalidate_user().
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, CachedToken]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CachedToken]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CachedToken) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        for key in [k for k, e in self._entries.items() if e.user_id == user_id]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+async def fetch_user(db: aiosqlite.Connection, user_id: int) -> Optional[Dict]:
+    cursor = await db.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE id = ?", (user_id,))
+    row = await cursor.fetchone()
+    return dict(zip(USER_COLUMNS, row)) if row else None
+
+
+async def get_current_user(request: Request, token: HTTPAuthorizationCredentials = Depends(security)) -> int:
+    """Shared auth dependency: returns the user id and sets request.state.user"""
+    key = hashlib.sha256(token.credentials.encode("utf-8")).hexdigest()
+    now = time.time()
+    entry = token_cache.get(key)
+    if entry is None or entry.user_expires_at <= now:
+        if entry is None:
+            try:
+                payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+                user_id = int(payload["user_id"])
+            except (JWTError, KeyError, ValueError, TypeError):
+                raise HTTPException(status_code=401, detail="Invalid token")
+            exp = payload.get("exp")
+            expires_at = float(exp) if exp is not None else now + TOKEN_CACHE_DEFAULT_TTL
+        else:
+            # Verified token, stale user row: only re-read the row
+            user_id, expires_at = entry.user_id, entry.expires_at
+        async with pool.acquire() as db:
+            user = await fetch_user(db, user_id)
+        if user is None:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        entry = CachedToken(user_id, expires_at, user, min(expires_at, now + TOKEN_USER_TTL))
+        token_cache.put(key, entry)
+    request.state.user = entry.user
+    return entry.user_id
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -31,104 +131,114 @@ class ResetPassword(BaseModel):
 
 @router.post("/register")
 async def register(user: UserRegister):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id FROM users WHERE LOWER(username) = LOWER(?)", (user.username,))
-        if await cursor.fetchone():
+    # Pooled connections are only held for the queries, never across bcrypt
+    async with pool.acquire() as db:
+        cursor = await db.execute("SELECT id FROM users WHERE username = ? COLLATE NOCASE", (user.username,))
+        exists = await cursor.fetchone()
+    if exists:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    password_hash = await hasher.hash(user.password)
+    async with pool.acquire() as db:
+        try:
+            await db.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (user.username, password_hash))
+            await db.commit()
+        except aiosqlite.IntegrityError:
+            # A concurrent registration of the same name (in any case) won the race
             raise HTTPException(status_code=400, detail="Username already exists")
-        password_hash = pwd_context.hash(user.password)
-        await db.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (user.username, password_hash))
-        await db.commit()
     return {"message": "User registered successfully"}
 
 @router.post("/login")
 async def login(user: UserLogin):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id, password_hash, username, name FROM users WHERE LOWER(username) = LOWER(?)", (user.username,))
+    # Release the pooled connection before the slow bcrypt check
+    async with pool.acquire() as db:
+        cursor = await db.execute("SELECT id, password_hash, username, name FROM users WHERE username = ? COLLATE NOCASE", (user.username,))
         row = await cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=401, detail="Invalid username")
-        if not pwd_context.verify(user.password, row[1]):
-            raise HTTPException(status_code=401, detail="Wrong password")
-        user_id = row[0]
-        username = row[2]
-        name = row[3] or username  # Use name if available, otherwise username
-        exp = datetime.utcnow() + timedelta(hours=12)
-        token = jwt.encode({"user_id": user_id, "username": username, "exp": exp}, SECRET_KEY, algorithm=ALGORITHM)
+    if not row:
+        raise HTTPException(status_code=401, detail="Invalid username")
+    if not await hasher.verify(user.password, row[1]):
+        raise HTTPException(status_code=401, detail="Wrong password")
+    user_id = row[0]
+    username = row[2]
+    name = row[3] or username  # Use name if available, otherwise username
+    exp = datetime.utcnow() + timedelta(hours=12)
+    token = jwt.encode({"user_id": user_id, "username": username, "exp": exp}, SECRET_KEY, algorithm=ALGORITHM)
     return {"access_token": token, "token_type": "bearer", "username": username, "name": name}
 
 @router.post("/forgot-password")
-async def forgot_password(request: ForgotPassword):
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Check if user exists
-        cursor = await db.execute("SELECT id FROM users WHERE LOWER(username) = LOWER(?)", (request.username,))
-        user_row = await cursor.fetchone()
-        
-        if not user_row:
-            # For security, don't reveal if username exists or not
-            return {"message": "If the username exists, a reset token has been generated"}
-        
-        user_id = user_row[0]
-        
-        # Generate a secure random token
-        reset_token = secrets.token_urlsafe(32)
-        
-        # Set expiration time (24 hours from now)
-        expires_at = datetime.now() + timedelta(hours=24)
-        
-        # Save the reset token to database
-        await db.execute(
-            "INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (?, ?, ?)",
-            (user_id, reset_token, expires_at)
-        )
-        await db.commit()
-        
-        # In production, you would email this token to the user
-        # For development, we'll return it directly
-        return {
-            "message": "Password reset token generated",
-            "reset_token": reset_token,
-            "note": "In production, this token would be sent via email"
-        }
+async def forgot_password(request: ForgotPassword, db: aiosqlite.Connection = Depends(get_db)):
+    # Check if user exists
+    cursor = await db.execute("SELECT id FROM users WHERE username = ? COLLATE NOCASE", (request.username,))
+    user_row = await cursor.fetchone()
+
+    if not user_row:
+        # For security, don't reveal if username exists or not
+        return {"message": "If the username exists, a reset token has been generated"}
+
+    user_id = user_row[0]
+
+    # Generate a secure random token
+    reset_token = secrets.token_urlsafe(32)
+
+    # Set expiration time (24 hours from now)
+    expires_at = datetime.now() + timedelta(hours=24)
+
+    # Save the reset token to database
+    await db.execute(
+        "INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (?, ?, ?)",
+        (user_id, reset_token, expires_at)
+    )
+    await db.commit()
+
+    # In production, you would email this token to the user
+    # For development, we'll return it directly
+    return {
+        "message": "Password reset token generated",
+        "reset_token": reset_token,
+        "note": "In production, this token would be sent via email"
+    }
 
 @router.post("/reset-password")
 async def reset_password(request: ResetPassword):
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Find the reset token
+    # Find the reset token
+    async with pool.acquire() as db:
         cursor = await db.execute("""
             SELECT user_id, expires_at, used FROM password_reset_tokens 
             WHERE token = ?
         """, (request.token,))
         token_row = await cursor.fetchone()
-        
-        if not token_row:
-            raise HTTPException(status_code=400, detail="Invalid reset token")
-        
-        user_id, expires_at_str, used = token_row
-        
-        # Check if token is already used
-        if used:
+
+    if not token_row:
+        raise HTTPException(status_code=400, detail="Invalid reset token")
+
+    user_id, expires_at_str, used = token_row
+
+    # Check if token is already used
+    if used:
+        raise HTTPException(status_code=400, detail="Reset token has already been used")
+
+    # Check if token is expired
+    expires_at = datetime.fromisoformat(expires_at_str)
+    if datetime.now() > expires_at:
+        raise HTTPException(status_code=400, detail="Reset token has expired")
+
+    # Hash the new password without holding a pooled connection
+    password_hash = await hasher.hash(request.new_password)
+
+    async with pool.acquire() as db:
+        # Mark the token as used; only one concurrent reset with it can succeed
+        cursor = await db.execute(
+            "UPDATE password_reset_tokens SET used = TRUE WHERE token = ? AND NOT used",
+            (request.token,)
+        )
+        if cursor.rowcount != 1:
+            await db.rollback()
             raise HTTPException(status_code=400, detail="Reset token has already been used")
-        
-        # Check if token is expired
-        expires_at = datetime.fromisoformat(expires_at_str)
-        if datetime.now() > expires_at:
-            raise HTTPException(status_code=400, detail="Reset token has expired")
-        
-        # Hash the new password
-        password_hash = pwd_context.hash(request.new_password)
-        
+
         # Update the user's password
         await db.execute(
             "UPDATE users SET password_hash = ? WHERE id = ?",
             (password_hash, user_id)
         )
-        
-        # Mark the token as used
-        await db.execute(
-            "UPDATE password_reset_tokens SET used = TRUE WHERE token = ?",
-            (request.token,)
-        )
-        
         await db.commit()
-        
-        return {"message": "Password has been reset successfully"} 
\ No newline at end of file
+
+    return {"message": "Password has been reset successfully"}
@@ -0,0 +1,60 @@
+"""
+Build thumb/card/full renditions for images already in uploaded_images
+(flat legacy files and the content-addressed objects/ store).
+
+Only missing renditions are written unless --force is given, so the command
+can be re-run safely (e.g. after changing IMAGE_RENDITION_FORMAT).
+
+    python backfill_renditions.py --workers 4
+"""
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from image_renditions import RENDITION_SIZES, SOURCE_EXTENSIONS, UPLOAD_DIR, create_renditions, rendition_path
+from image_store import OBJECTS_DIR, is_digest
+
+
+def source_images():
+    for entry in os.scandir(UPLOAD_DIR):
+        if entry.is_file() and entry.name.lower().endswith(SOURCE_EXTENSIONS):
+            yield entry.path
+    # Content-addressed originals; their renditions (<sha256>_<size>) are skipped
+    for root, _, files in os.walk(OBJECTS_DIR):
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if is_digest(stem) and ext.lower() in SOURCE_EXTENSIONS:
+                yield os.path.join(root, name)
+
+
+def needs_renditions(path: str) -> bool:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return any(not os.path.exists(rendition_path(stem, size)) for size in RENDITION_SIZES)
+
+
+def backfill(force: bool, workers: int):
+    pending = [path for path in source_images() if force or needs_renditions(path)]
+    print(f"{len(pending)} image(s) need renditions")
+
+    def build(path):
+        try:
+            create_renditions(path, overwrite=force)
+            return None
+        except Exception as e:
+            return f"{path}: {e}"
+
+    # Pillow releases the GIL while decoding and resampling, so threads scale
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        errors = [err for err in pool.map(build, pending) if err]
+
+    for err in errors:
+        print(f"Failed {err}")
+    print(f"\n✅ Built renditions for {len(pending) - len(errors)} image(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill compressed image renditions")
+    parser.add_argument("--force", action="store_true", help="Rebuild renditions that already exist")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    backfill(args.force, args.workers)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Login burst benchmark.
+
+Fires concurrent /auth/login requests at a running server while a probe
+thread keeps hitting a cheap endpoint, then reports login throughput and the
+probe's latency percentiles. With bcrypt on the event loop the probe's p99
+tracks the login burst; with the password pool it should stay flat.
+
+    python run_server.py            # in another terminal
+    python bench_login.py --logins 200 --concurrency 16
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post_json(url, payload, timeout=30.0):
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def probe(url, stop, latencies, errors):
+    backoff = 0.005
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30.0) as resp:
+                resp.read()
+        except Exception:
+            # Count the failure and back off instead of spinning while the
+            # server refuses connections
+            errors.append(time.perf_counter() - start)
+            stop.wait(backoff)
+            backoff = min(backoff * 2, 1.0)
+            continue
+        backoff = 0.005
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        time.sleep(0.005)
+
+
+def run_probe(url, seconds):
+    latencies, errors = [], []
+    stop = threading.Event()
+    thread = threading.Thread(target=probe, args=(url, stop, latencies, errors), daemon=True)
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure login throughput and side-endpoint latency")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--logins", type=int, default=200, help="Total login requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent login clients")
+    parser.add_argument("--probe-path", default="/", help="Cheap endpoint measured during the burst")
+    args = parser.parse_args()
+
+    base = args.base_url.rstrip("/")
+    username = f"bench_{uuid.uuid4().hex[:8]}"
+    password = "bench-password"
+    status = post_json(f"{base}/auth/register", {"username": username, "password": password})
+    if status != 200:
+        raise SystemExit(f"Could not register benchmark user (HTTP {status})")
+
+    probe_url = f"{base}{args.probe_path}"
+    idle, idle_errors = run_probe(probe_url, 2.0)
+
+    latencies, errors = [], []
+    stop = threading.Event()
+    probe_thread = threading.Thread(target=probe, args=(probe_url, stop, latencies, errors), daemon=True)
+    probe_thread.start()
+
+    login_url = f"{base}/auth/login"
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(
+            lambda _: post_json(login_url, {"username": username, "password": password}),
+            range(args.logins),
+        ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe_thread.join()
+
+    ok = statuses.count(200)
+    shed = statuses.count(503)
+    print(f"Logins: {ok} ok, {shed} shed (503), {len(statuses) - ok - shed} other in {elapsed:.2f}s")
+    print(f"Login throughput: {ok / elapsed:.1f} req/s")
+    for label, samples, failed in (("idle", idle, idle_errors), ("during burst", latencies, errors)):
+        if failed:
+            print(f"{args.probe_path} {label}: {len(failed)} failed requests")
+        if samples:
+            print(
+                f"{args.probe_path} latency {label}: n={len(samples)} "
+                f"p50={statistics.median(samples):.1f}ms p99={percentile(samples, 99):.1f}ms "
+                f"max={max(samples):.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
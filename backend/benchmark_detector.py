@@ -0,0 +1,159 @@
+"""
+Compare detector backends on latency, throughput, memory and accuracy.
+
+Each backend runs in its own child process so peak RSS is measured in
+isolation. Latency is single-image predict (p50/p95), throughput is images
+per second with batches the size the micro-batcher would send, and mAP
+comes from ultralytics validation when a dataset YAML is given.
+
+    python benchmark_detector.py --images samples/ --data food.yaml
+    python benchmark_detector.py --images samples/ --backends torch onnx onnx-int8
+
+Backends: torch, onnx, onnx-int8, openvino, openvino-int8 (export the
+non-torch ones first with export_detector.py).
+"""
+import os
+import json
+import time
+import sys
+import argparse
+import statistics
+import multiprocessing
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from yolo_batcher import YOLO_MAX_BATCH
+from yolo_model import YOLO_WEIGHTS, backend_weights, load_yolo
+
+BACKEND_CHOICES = ("torch", "onnx", "onnx-int8", "openvino", "openvino-int8")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def sample_images(directory: str, limit: int) -> List[Image.Image]:
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    if not names:
+        raise SystemExit(f"No images found in {directory}")
+    return [Image.open(os.path.join(directory, n)).convert("RGB") for n in names]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process, or None where it can't be read."""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        # Windows reports the peak working set
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return round(peak / 2**20, 1) if peak else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def run_backend(name: str, weights: str, images_dir: str, data: str, limit: int, rounds: int, batch: int) -> Dict:
+    backend, _, variant = name.partition("-")
+    path = backend_weights(weights, backend, int8=variant == "int8")
+    images = sample_images(images_dir, limit)
+
+    started = time.perf_counter()
+    model = load_yolo(path)
+    model.predict(source=images[0], save=False, verbose=False)  # warm-up
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(rounds):
+        for image in images:
+            t0 = time.perf_counter()
+            model.predict(source=image, save=False, verbose=False)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+
+    processed = 0
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for i in range(0, len(images), batch):
+            chunk = images[i:i + batch]
+            model.predict(source=chunk, save=False, verbose=False)
+            processed += len(chunk)
+    throughput = processed / (time.perf_counter() - t0)
+
+    result = {
+        "backend": name,
+        "weights": path,
+        "load_s": round(load_seconds, 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        "img_per_s": round(throughput, 1),
+        "map50": None,
+        "map50_95": None,
+    }
+    if data:
+        metrics = model.val(data=data, batch=batch, verbose=False, plots=False)
+        result["map50"] = round(float(metrics.box.map50), 4)
+        result["map50_95"] = round(float(metrics.box.map), 4)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def _child(conn, *args):
+    try:
+        conn.send(run_backend(*args))
+    except BaseException as e:
+        conn.send({"backend": args[0], "error": str(e)})
+    finally:
+        conn.close()
+
+
+def benchmark(backends: List[str], **options) -> List[Dict]:
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name in backends:
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(
+            target=_child,
+            args=(child, name, options["weights"], options["images"], options["data"], options["limit"], options["rounds"], options["batch"]),
+        )
+        proc.start()
+        child.close()
+        try:
+            results.append(parent.recv())
+        except EOFError:
+            results.append({"backend": name, "error": f"worker exited with code {proc.exitcode}"})
+        proc.join()
+    return results
+
+
+def print_table(results: List[Dict]) -> None:
+    columns = ["backend", "load_s", "p50_ms", "p95_ms", "img_per_s", "peak_rss_mb", "map50", "map50_95"]
+    print("  ".join(f"{c:>13}" for c in columns))
+    for row in results:
+        if "error" in row:
+            print(f"{row['backend']:>13}  failed: {row['error']}")
+            continue
+        print("  ".join(f"{str(row.get(c)):>13}" for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark YOLO detector backends")
+    parser.add_argument("--images", required=True, help="Directory of sample images")
+    parser.add_argument("--data", default="", help="Dataset YAML with labels, for mAP")
+    parser.add_argument("--backends", nargs="+", choices=BACKEND_CHOICES, default=list(BACKEND_CHOICES))
+    parser.add_argument("--weights", default=YOLO_WEIGHTS)
+    parser.add_argument("--limit", type=int, default=32, help="Max sample images")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=YOLO_MAX_BATCH)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON instead of a table")
+    args = parser.parse_args()
+
+    results = benchmark(
+        args.backends, weights=args.weights, images=args.images, data=args.data,
+        limit=args.limit, rounds=args.rounds, batch=args.batch,
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
@@ -1,7 +1,23 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Set
+
 import aiosqlite
 
 DB_PATH = 'app.db'
 
+logger = logging.getLogger(__name__)
+
+# Connection pool tuning (override through the environment)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", str(16 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
 CREATE_USERS = '''
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -120,108 +136,512 @@ CREATE TABLE IF NOT EXISTS chat_messages (
 );
 '''
 
+CREATE_SCHEMA_VERSION = '''
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+'''
+
+CREATE_INDEXES = [
+    # Per-user lists; name/category trailing columns make the lists covering
+    "CREATE INDEX IF NOT EXISTS idx_pantry_items_user ON pantry_items(user_id, name)",
+    "CREATE INDEX IF NOT EXISTS idx_grocery_items_user ON grocery_items(user_id, name)",
+    "CREATE INDEX IF NOT EXISTS idx_utensils_user ON utensils(user_id, category, name)",
+    "CREATE INDEX IF NOT EXISTS idx_meal_plans_user ON meal_plans(user_id, start_date)",
+    "CREATE INDEX IF NOT EXISTS idx_meal_plan_items_plan ON meal_plan_items(meal_plan_id, day, meal_type, meal_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_messages_user ON chat_messages(user_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_favorite_meals_user ON favorite_meals(user_id, meal_id)",
+    "CREATE INDEX IF NOT EXISTS idx_password_reset_tokens_user ON password_reset_tokens(user_id)",
+    # Global lookups
+    "CREATE INDEX IF NOT EXISTS idx_meals_name ON meals(name)",
+    "CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE)",
+]
+
+# External-content FTS5 index over the meals catalog, kept in sync by triggers
+CREATE_MEALS_FTS = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS meals_fts USING fts5(
+        name, ingredients, instructions,
+        content='meals', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS meals_fts_ai AFTER INSERT ON meals BEGIN
+        INSERT INTO meals_fts(rowid, name, ingredients, instructions)
+        VALUES (new.id, new.name, new.ingredients, new.instructions);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS meals_fts_ad AFTER DELETE ON meals BEGIN
+        INSERT INTO meals_fts(meals_fts, rowid, name, ingredients, instructions)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.instructions);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS meals_fts_au AFTER UPDATE OF name, ingredients, instructions ON meals BEGIN
+        INSERT INTO meals_fts(meals_fts, rowid, name, ingredients, instructions)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.instructions);
+        INSERT INTO meals_fts(rowid, name, ingredients, instructions)
+        VALUES (new.id, new.name, new.ingredients, new.instructions);
+    END
+    ''',
+]
+
+CREATE_DAILY_NUTRITION = '''
+CREATE TABLE IF NOT EXISTS daily_nutrition (
+    user_id INTEGER NOT NULL,
+    date TEXT NOT NULL, -- ISO date the weekday's totals start on; they repeat every 7 days
+    calories INTEGER NOT NULL DEFAULT 0,
+    protein INTEGER NOT NULL DEFAULT 0,
+    carbs INTEGER NOT NULL DEFAULT 0,
+    fat INTEGER NOT NULL DEFAULT 0,
+    meal_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date),
+    FOREIGN KEY(user_id) REFERENCES users(id)
+) WITHOUT ROWID;
+'''
+
+CREATE_RECIPE_IMAGES = '''
+CREATE TABLE IF NOT EXISTS recipe_images (
+    cache_key TEXT PRIMARY KEY, -- make_image_cache_key(name, ingredients)
+    image_path TEXT NOT NULL,
+    name TEXT,
+    ingredients TEXT, -- JSON array of ingredient strings
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+'''
+
+# First calendar date of a plan item: Monday of the plan's start_date week
+# plus `day` (0=Monday), matching how the planner screen assigns weekdays.
+# Plans are reused as weekly templates, so readers (see
+# nutrition_analytics.build_daily_arrays) repeat the row every 7 days.
+def _item_date_sql(plan: str, item: str) -> str:
+    return f"date({plan}.start_date, '+1 day', 'weekday 1', '-7 days', '+' || {item}.day || ' days')"
+
+# Adds one item's meal to (or, with sign=-1, removes it from) its day's totals
+def _apply_item_sql(item: str, sign: int) -> str:
+    return f'''
+        INSERT INTO daily_nutrition (user_id, date, calories, protein, carbs, fat, meal_count)
+        SELECT mp.user_id, {_item_date_sql("mp", item)},
+               {sign} * COALESCE(m.calories, 0), {sign} * COALESCE(m.protein, 0),
+               {sign} * COALESCE(m.carbs, 0), {sign} * COALESCE(m.fat, 0), {sign}
+        FROM meal_plans mp JOIN meals m ON m.id = {item}.meal_id
+        WHERE mp.id = {item}.meal_plan_id
+        ON CONFLICT(user_id, date) DO UPDATE SET
+            calories = calories + excluded.calories,
+            protein = protein + excluded.protein,
+            carbs = carbs + excluded.carbs,
+            fat = fat + excluded.fat,
+            meal_count = meal_count + excluded.meal_count;'''
+
+# Applies a per-meal nutrient delta to every day the meal is planned on
+def _apply_meal_delta_sql(meal_id: str, calories: str, protein: str, carbs: str, fat: str, count: str) -> str:
+    return f'''
+        INSERT INTO daily_nutrition (user_id, date, calories, protein, carbs, fat, meal_count)
+        SELECT mp.user_id, {_item_date_sql("mp", "mpi")},
+               COUNT(*) * ({calories}), COUNT(*) * ({protein}),
+               COUNT(*) * ({carbs}), COUNT(*) * ({fat}), COUNT(*) * ({count})
+        FROM meal_plan_items mpi JOIN meal_plans mp ON mp.id = mpi.meal_plan_id
+        WHERE mpi.meal_id = {meal_id}
+        GROUP BY 1, 2
+        ON CONFLICT(user_id, date) DO UPDATE SET
+            calories = calories + excluded.calories,
+            protein = protein + excluded.protein,
+            carbs = carbs + excluded.carbs,
+            fat = fat + excluded.fat,
+            meal_count = meal_count + excluded.meal_count;'''
+
+# Drops days whose last meal was removed; scoped to the affected users' key range
+def _prune_empty_days_sql(users: str) -> str:
+    return f"DELETE FROM daily_nutrition WHERE user_id IN ({users}) AND meal_count <= 0;"
+
+# Triggers keep daily_nutrition in step with every write to plan items or meals
+CREATE_DAILY_NUTRITION_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS daily_nutrition_items_ai AFTER INSERT ON meal_plan_items BEGIN
+        {_apply_item_sql("new", 1)}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS daily_nutrition_items_ad AFTER DELETE ON meal_plan_items BEGIN
+        {_apply_item_sql("old", -1)}
+        {_prune_empty_days_sql("SELECT user_id FROM meal_plans WHERE id = old.meal_plan_id")}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS daily_nutrition_items_au
+    AFTER UPDATE OF meal_plan_id, day, meal_id ON meal_plan_items BEGIN
+        {_apply_item_sql("old", -1)}
+        {_apply_item_sql("new", 1)}
+        {_prune_empty_days_sql("SELECT user_id FROM meal_plans WHERE id IN (old.meal_plan_id, new.meal_plan_id)")}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS daily_nutrition_meals_au
+    AFTER UPDATE OF calories, protein, carbs, fat ON meals BEGIN
+        {_apply_meal_delta_sql(
+            "new.id",
+            "COALESCE(new.calories, 0) - COALESCE(old.calories, 0)",
+            "COALESCE(new.protein, 0) - COALESCE(old.protein, 0)",
+            "COALESCE(new.carbs, 0) - COALESCE(old.carbs, 0)",
+            "COALESCE(new.fat, 0) - COALESCE(old.fat, 0)",
+            "0",
+        )}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS daily_nutrition_meals_ad AFTER DELETE ON meals BEGIN
+        {_apply_meal_delta_sql(
+            "old.id",
+            "-COALESCE(old.calories, 0)",
+            "-COALESCE(old.protein, 0)",
+            "-COALESCE(old.carbs, 0)",
+            "-COALESCE(old.fat, 0)",
+            "-1",
+        )}
+        {_prune_empty_days_sql(
+            "SELECT mp.user_id FROM meal_plan_items mpi JOIN meal_plans mp ON mp.id = mpi.meal_plan_id "
+            "WHERE mpi.meal_id = old.id"
+        )}
+    END
+    ''',
+]
+
+# Keep utensil categories non-NULL (writes of NULL become 'Other'), so
+# utensil lists can sort and seek on idx_utensils_user
+CREATE_UTENSIL_CATEGORY_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS utensils_category_ai AFTER INSERT ON utensils
+    WHEN new.category IS NULL BEGIN
+        UPDATE utensils SET category = 'Other' WHERE id = new.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS utensils_category_au AFTER UPDATE OF category ON utensils
+    WHEN new.category IS NULL BEGIN
+        UPDATE utensils SET category = 'Other' WHERE id = new.id;
+    END
+    ''',
+]
+
+REBUILD_DAILY_NUTRITION = f'''
+INSERT INTO daily_nutrition (user_id, date, calories, protein, carbs, fat, meal_count)
+SELECT mp.user_id, {_item_date_sql("mp", "mpi")},
+       SUM(COALESCE(m.calories, 0)), SUM(COALESCE(m.protein, 0)),
+       SUM(COALESCE(m.carbs, 0)), SUM(COALESCE(m.fat, 0)), COUNT(*)
+FROM meal_plan_items mpi
+JOIN meal_plans mp ON mp.id = mpi.meal_plan_id
+JOIN meals m ON m.id = mpi.meal_id
+GROUP BY 1, 2
+'''
+
+async def _migrate_baseline(db: aiosqlite.Connection) -> None:
+    """Create the original tables and upgrade databases that predate versioning."""
+    await db.execute(CREATE_USERS)
+    await db.execute(CREATE_MEALS)
+    await db.execute(CREATE_MEAL_PLANS)
+    await db.execute(CREATE_MEAL_PLAN_ITEMS)
+    await db.execute(CREATE_PANTRY_ITEMS)
+    await db.execute(CREATE_FAVORITE_MEALS)
+    await db.execute(CREATE_GROCERY_ITEMS)
+    await db.execute(CREATE_PASSWORD_RESET_TOKENS)
+    await db.execute(CREATE_UTENSILS)
+    await db.execute(CREATE_CHAT_MESSAGES)
+    # Migrate legacy pantry schema that had a 'calories' column
+    try:
+        cursor = await db.execute("PRAGMA table_info(pantry_items)")
+        cols = await cursor.fetchall()
+        if any(col[1] == 'calories' for col in cols):
+            await db.execute("ALTER TABLE pantry_items RENAME TO pantry_items_old")
+            await db.execute('''
+            CREATE TABLE pantry_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                FOREIGN KEY(user_id) REFERENCES users(id)
+            );
+            ''')
+            await db.execute("INSERT INTO pantry_items (id, user_id, name) SELECT id, user_id, name FROM pantry_items_old")
+            await db.execute("DROP TABLE pantry_items_old")
+    except Exception:
+        pass
+
+    # Migrate users table to add name, email, height, weight, and nutrition goals
+    try:
+        cursor = await db.execute("PRAGMA table_info(users)")
+        cols = await cursor.fetchall()
+        col_names = [col[1] for col in cols]
+
+        if 'name' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN name TEXT")
+        if 'email' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN email TEXT")
+        if 'height' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN height REAL")
+        if 'weight' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN weight REAL")
+        if 'daily_calorie_goal' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN daily_calorie_goal INTEGER DEFAULT 2000")
+        if 'daily_protein_goal' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN daily_protein_goal INTEGER DEFAULT 50")
+        if 'daily_carbs_goal' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN daily_carbs_goal INTEGER DEFAULT 250")
+        if 'daily_fat_goal' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN daily_fat_goal INTEGER DEFAULT 70")
+        if 'breakfast_time' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN breakfast_time TEXT DEFAULT '08:00'")
+        if 'lunch_time' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN lunch_time TEXT DEFAULT '13:00'")
+        if 'dinner_time' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN dinner_time TEXT DEFAULT '19:00'")
+        if 'snack_time' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN snack_time TEXT DEFAULT '16:00'")
+        if 'dietary_preferences' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN dietary_preferences TEXT")
+        if 'allergies' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN allergies TEXT")
+        if 'cuisine_preferences' not in col_names:
+            await db.execute("ALTER TABLE users ADD COLUMN cuisine_preferences TEXT")
+    except Exception:
+        pass
+
+    # Migrate meals table to add new comprehensive fields
+    try:
+        cursor = await db.execute("PRAGMA table_info(meals)")
+        cols = await cursor.fetchall()
+        col_names = [col[1] for col in cols]
+
+        if 'ingredients' not in col_names:
+            await db.execute("ALTER TABLE meals ADD COLUMN ingredients TEXT")
+        if 'instructions' not in col_names:
+            await db.execute("ALTER TABLE meals ADD COLUMN instructions TEXT")
+        if 'protein' not in col_names:
+            await db.execute("ALTER TABLE meals ADD COLUMN protein INTEGER DEFAULT 0")
+        if 'carbs' not in col_names:
+            await db.execute("ALTER TABLE meals ADD COLUMN carbs INTEGER DEFAULT 0")
+        if 'fat' not in col_names:
+            await db.execute("ALTER TABLE meals ADD COLUMN fat INTEGER DEFAULT 0")
+        if 'prep_time' not in col_names:
+            await db.execute("ALTER TABLE meals ADD COLUMN prep_time INTEGER DEFAULT 0")
+        if 'cook_time' not in col_names:
+            await db.execute("ALTER TABLE meals ADD COLUMN cook_time INTEGER DEFAULT 0")
+    except Exception:
+        pass
+
+    # Migrate meal_plan_items to add meal_type
+    try:
+        cursor = await db.execute("PRAGMA table_info(meal_plan_items)")
+        cols = await cursor.fetchall()
+        col_names = [col[1] for col in cols]
+
+        if 'meal_type' not in col_names:
+            await db.execute("ALTER TABLE meal_plan_items ADD COLUMN meal_type TEXT DEFAULT 'Breakfast'")
+    except Exception:
+        pass
+
+
+async def _migrate_indexes(db: aiosqlite.Connection) -> None:
+    """Index every per-user lookup and ORDER BY the routers issue."""
+    for statement in CREATE_INDEXES:
+        await db.execute(statement)
+
+
+
+async def _migrate_meals_fts(db: aiosqlite.Connection) -> None:
+    """Add the meals full-text index and backfill it from existing rows."""
+    for statement in CREATE_MEALS_FTS:
+        await db.execute(statement)
+    await db.execute("INSERT INTO meals_fts(meals_fts) VALUES ('rebuild')")
+
+
+
+async def _migrate_daily_nutrition(db: aiosqlite.Connection) -> None:
+    """Add the per-day nutrition rollup, its maintenance triggers and a backfill."""
+    await db.execute(CREATE_DAILY_NUTRITION)
+    # Lets the meal triggers find every plan item that references a meal
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_meal_plan_items_meal ON meal_plan_items(meal_id)")
+    for statement in CREATE_DAILY_NUTRITION_TRIGGERS:
+        await db.execute(statement)
+    await db.execute("DELETE FROM daily_nutrition")
+    await db.execute(REBUILD_DAILY_NUTRITION)
+
+
+def _recipe_image_key_v5(name: str, ingredients: list) -> str:
+    # Frozen copy of image_cache.make_image_cache_key as of migration 5, so
+    # later changes to the live key don't change what this migration writes
+    normalized = (name.strip().lower() + "|" + ",".join(sorted([i.strip().lower() for i in ingredients])))
+    h = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+    return f"recipe_image:{h}"
+
+
+async def _migrate_recipe_images(db: aiosqlite.Connection) -> None:
+    """Durable recipe → image index, seeded from meals saved with a generated image."""
+    await db.execute(CREATE_RECIPE_IMAGES)
+    cursor = await db.execute(
+        "SELECT name, ingredients, image FROM meals WHERE image LIKE 'uploaded_images/recipe_%'"
+    )
+    rows = []
+    for name, ingredients_json, image in await cursor.fetchall():
+        try:
+            ingredients = json.loads(ingredients_json) if ingredients_json else []
+        except ValueError:
+            continue
+        # Generated images are saved flat in uploaded_images/ (the relative
+        # path is resolved by file name, as image_store.local_path did then)
+        path = os.path.join("uploaded_images", os.path.basename(image.replace("\\", "/")))
+        if name and ingredients and os.path.exists(path):
+            rows.append((_recipe_image_key_v5(name, ingredients), image, name, json.dumps(ingredients)))
+    await db.executemany(
+        "INSERT OR IGNORE INTO recipe_images (cache_key, image_path, name, ingredients) VALUES (?, ?, ?, ?)",
+        rows,
+    )
+
+
+class MigrationDeferred(Exception):
+    """Raised by a migration that can't apply yet; it is retried on the next startup."""
+
+
+async def _migrate_unique_usernames(db: aiosqlite.Connection) -> None:
+    """Enforce case-insensitive username uniqueness, matching the NOCASE lookups."""
+    cursor = await db.execute(
+        "SELECT username COLLATE NOCASE FROM users GROUP BY username COLLATE NOCASE HAVING COUNT(*) > 1"
+    )
+    duplicates = [row[0] for row in await cursor.fetchall()]
+    if duplicates:
+        # Don't rewrite existing accounts; register() still rejects new clashes
+        # it can see, and the index is created once the duplicates are resolved
+        raise MigrationDeferred(f"case-insensitive duplicate usernames exist: {', '.join(duplicates)}")
+    await db.execute("DROP INDEX IF EXISTS idx_users_username_nocase")
+    await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE)")
+
+
+async def _migrate_utensil_categories(db: aiosqlite.Connection) -> None:
+    """Store 'Other' instead of NULL categories so lists can sort and page on the raw column."""
+    await db.execute("UPDATE utensils SET category = 'Other' WHERE category IS NULL")
+    for statement in CREATE_UTENSIL_CATEGORY_TRIGGERS:
+        await db.execute(statement)
+
+
+# Ordered, append-only list of (version, migration). Each migration must be
+# idempotent so a partially upgraded database can safely re-run it, and may
+# raise MigrationDeferred to be retried on a later startup.
+MIGRATIONS = [
+    (1, _migrate_baseline),
+    (2, _migrate_indexes),
+    (3, _migrate_meals_fts),
+    (4, _migrate_daily_nutrition),
+    (5, _migrate_recipe_images),
+    (6, _migrate_unique_usernames),
+    (7, _migrate_utensil_categories),
+]
+
+
+async def get_applied_versions(db: aiosqlite.Connection) -> Set[int]:
+    await db.execute(CREATE_SCHEMA_VERSION)
+    cursor = await db.execute("SELECT version FROM schema_version")
+    return {row[0] for row in await cursor.fetchall()}
+
+
 async def init_db():
     async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(CREATE_USERS)
-        await db.execute(CREATE_MEALS)
-        await db.execute(CREATE_MEAL_PLANS)
-        await db.execute(CREATE_MEAL_PLAN_ITEMS)
-        await db.execute(CREATE_PANTRY_ITEMS)
-        await db.execute(CREATE_FAVORITE_MEALS)
-        await db.execute(CREATE_GROCERY_ITEMS)
-        await db.execute(CREATE_PASSWORD_RESET_TOKENS)
-        await db.execute(CREATE_UTENSILS)
-        await db.execute(CREATE_CHAT_MESSAGES)
-        # Migrate legacy pantry schema that had a 'calories' column
-        try:
-            cursor = await db.execute("PRAGMA table_info(pantry_items)")
-            cols = await cursor.fetchall()
-            if any(col[1] == 'calories' for col in cols):
-                await db.execute("ALTER TABLE pantry_items RENAME TO pantry_items_old")
-                await db.execute('''
-                CREATE TABLE pantry_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    name TEXT NOT NULL,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                );
-                ''')
-                await db.execute("INSERT INTO pantry_items (id, user_id, name) SELECT id, user_id, name FROM pantry_items_old")
-                await db.execute("DROP TABLE pantry_items_old")
-        except Exception:
-            pass
-        
-        # Migrate users table to add name, email, height, weight, and nutrition goals
-        try:
-            cursor = await db.execute("PRAGMA table_info(users)")
-            cols = await cursor.fetchall()
-            col_names = [col[1] for col in cols]
-            
-            if 'name' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN name TEXT")
-            if 'email' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN email TEXT")
-            if 'height' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN height REAL")
-            if 'weight' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN weight REAL")
-            if 'daily_calorie_goal' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN daily_calorie_goal INTEGER DEFAULT 2000")
-            if 'daily_protein_goal' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN daily_protein_goal INTEGER DEFAULT 50")
-            if 'daily_carbs_goal' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN daily_carbs_goal INTEGER DEFAULT 250")
-            if 'daily_fat_goal' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN daily_fat_goal INTEGER DEFAULT 70")
-            if 'breakfast_time' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN breakfast_time TEXT DEFAULT '08:00'")
-            if 'lunch_time' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN lunch_time TEXT DEFAULT '13:00'")
-            if 'dinner_time' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN dinner_time TEXT DEFAULT '19:00'")
-            if 'snack_time' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN snack_time TEXT DEFAULT '16:00'")
-            if 'dietary_preferences' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN dietary_preferences TEXT")
-            if 'allergies' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN allergies TEXT")
-            if 'cuisine_preferences' not in col_names:
-                await db.execute("ALTER TABLE users ADD COLUMN cuisine_preferences TEXT")
-        except Exception:
-            pass
-        
-        # Migrate meals table to add new comprehensive fields
-        try:
-            cursor = await db.execute("PRAGMA table_info(meals)")
-            cols = await cursor.fetchall()
-            col_names = [col[1] for col in cols]
-            
-            if 'ingredients' not in col_names:
-                await db.execute("ALTER TABLE meals ADD COLUMN ingredients TEXT")
-            if 'instructions' not in col_names:
-                await db.execute("ALTER TABLE meals ADD COLUMN instructions TEXT")
-            if 'protein' not in col_names:
-                await db.execute("ALTER TABLE meals ADD COLUMN protein INTEGER DEFAULT 0")
-            if 'carbs' not in col_names:
-                await db.execute("ALTER TABLE meals ADD COLUMN carbs INTEGER DEFAULT 0")
-            if 'fat' not in col_names:
-                await db.execute("ALTER TABLE meals ADD COLUMN fat INTEGER DEFAULT 0")
-            if 'prep_time' not in col_names:
-                await db.execute("ALTER TABLE meals ADD COLUMN prep_time INTEGER DEFAULT 0")
-            if 'cook_time' not in col_names:
-                await db.execute("ALTER TABLE meals ADD COLUMN cook_time INTEGER DEFAULT 0")
-        except Exception:
-            pass
-        
-        # Migrate meal_plan_items to add meal_type
+        await configure_connection(db)
+        applied = await get_applied_versions(db)
+        for version, migrate in MIGRATIONS:
+            if version in applied:
+                continue
+            # Apply each step atomically together with its version bump
+            await db.execute("BEGIN")
+            try:
+                await migrate(db)
+                await db.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+                await db.commit()
+            except MigrationDeferred as e:
+                # Left unrecorded so it runs again next time; later steps still apply
+                await db.rollback()
+                logger.warning(f"Deferred schema migration {version} ({migrate.__name__}): {e}")
+                continue
+            except Exception:
+                await db.rollback()
+                raise
+            print(f"Applied schema migration {version}: {migrate.__name__}")
+
+
+async def configure_connection(db: aiosqlite.Connection) -> None:
+    """Apply the per-connection pragmas used by every pooled connection."""
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA synchronous=NORMAL")
+    await db.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    # Negative cache_size is interpreted by SQLite as KiB rather than pages
+    await db.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    await db.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    await db.execute("PRAGMA temp_store=MEMORY")
+
+
+class ConnectionPool:
+    """Fixed-size pool of long-lived aiosqlite connections.
+
+    Each aiosqlite connection owns a background thread, so opening one per
+    request is expensive compared to the small queries the routers issue.
+    Connections are opened once at startup and handed out through a queue.
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = max(1, size)
+        self._queue: Optional[asyncio.Queue] = None
+        self._connections: list = []
+
+    @property
+    def is_open(self) -> bool:
+        return self._queue is not None
+
+    async def open(self) -> None:
+        if self.is_open:
+            return
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.size)
+        for _ in range(self.size):
+            db = await aiosqlite.connect(self.path)
+            await configure_connection(db)
+            self._connections.append(db)
+            queue.put_nowait(db)
+        self._queue = queue
+
+    async def close(self) -> None:
+        if not self.is_open:
+            return
+        self._queue = None
+        connections, self._connections = self._connections, []
+        for db in connections:
+            try:
+                await db.close()
+            except Exception as e:
+                print(f"Failed to close database connection: {e}")
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._queue is None:
+            raise RuntimeError("Database pool is not open")
+        queue = self._queue
+        db = await queue.get()
         try:
-            cursor = await db.execute("PRAGMA table_info(meal_plan_items)")
-            cols = await cursor.fetchall()
-            col_names = [col[1] for col in cols]
-            
-            if 'meal_type' not in col_names:
-                await db.execute("ALTER TABLE meal_plan_items ADD COLUMN meal_type TEXT DEFAULT 'Breakfast'")
-        except Exception:
-            pass
-        
-        await db.commit() 
\ No newline at end of file
+            yield db
+        finally:
+            # Never hand a connection with a half-finished transaction to the next request
+            try:
+                if db.in_transaction:
+                    await db.rollback()
+            except Exception as e:
+                print(f"Failed to reset pooled connection: {e}")
+            queue.put_nowait(db)
+
+
+pool = ConnectionPool()
+
+
+async def get_db() -> AsyncIterator[aiosqlite.Connection]:
+    """FastAPI dependency yielding a pooled connection for the request."""
+    async with pool.acquire() as db:
+        yield db
@@ -0,0 +1,71 @@
+"""
+Export the YOLO detector (best.pt) for the ONNX Runtime / OpenVINO backends.
+
+Artifacts are written next to the weights with the names yolo_model expects,
+so serving one is just YOLO_BACKEND=onnx|openvino (plus YOLO_INT8=1 for the
+quantized variant).
+
+    python export_detector.py --backend onnx --int8
+    python export_detector.py --backend openvino --int8 --data food.yaml
+
+ONNX INT8 uses ONNX Runtime dynamic quantization (weights only, no
+calibration data) and is written alongside the FP32 model. OpenVINO INT8 is
+post-training quantization through NNCF, needs a dataset YAML for
+calibration and writes only the INT8 model; run without --int8 for FP32.
+"""
+import os
+import shutil
+import argparse
+
+from yolo_model import YOLO_BACKENDS, YOLO_WEIGHTS, YOLO_WARMUP_SIZE, backend_weights
+
+
+def export_onnx(weights: str, imgsz: int, int8: bool) -> str:
+    from ultralytics import YOLO
+
+    # Dynamic axes so the micro-batcher can send any batch size
+    path = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    target = backend_weights(weights, "onnx")
+    if os.path.abspath(path) != os.path.abspath(target):
+        shutil.move(path, target)
+    if not int8:
+        return target
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized = backend_weights(weights, "onnx", int8=True)
+    quantize_dynamic(target, quantized, weight_type=QuantType.QUInt8)
+    return quantized
+
+
+def export_openvino(weights: str, imgsz: int, int8: bool, data: str) -> str:
+    from ultralytics import YOLO
+
+    if int8 and not data:
+        raise SystemExit("--data is required for OpenVINO INT8 calibration")
+    options = {"format": "openvino", "imgsz": imgsz, "dynamic": True}
+    if int8:
+        options.update(int8=True, data=data)
+    path = YOLO(weights).export(**options)
+    target = backend_weights(weights, "openvino", int8)
+    if os.path.abspath(path) != os.path.abspath(target):
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        shutil.move(path, target)
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the YOLO detector for faster CPU backends")
+    parser.add_argument("--backend", choices=[b for b in YOLO_BACKENDS if b != "torch"], required=True)
+    parser.add_argument("--weights", default=YOLO_WEIGHTS)
+    parser.add_argument("--imgsz", type=int, default=YOLO_WARMUP_SIZE)
+    parser.add_argument("--int8", action="store_true", help="Quantize to INT8 (ONNX keeps the FP32 model too; OpenVINO writes only INT8)")
+    parser.add_argument("--data", default="", help="Dataset YAML (OpenVINO INT8 calibration)")
+    args = parser.parse_args()
+
+    if args.backend == "onnx":
+        path = export_onnx(args.weights, args.imgsz, args.int8)
+    else:
+        path = export_openvino(args.weights, args.imgsz, args.int8, args.data)
+    print(f"\n✅ Exported {path}")
@@ -0,0 +1,158 @@
+import os
+import json
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from database import pool
+from image_similarity import SimilarityIndex
+from image_store import local_path
+
+# Recipe → image lookups go in-process LRU → Redis (optional, shared) →
+# the durable recipe_images table, so an image that already exists on disk
+# is never generated again just because Redis was down or evicted the key.
+RECIPE_IMAGE_CACHE_SIZE = int(os.getenv("RECIPE_IMAGE_CACHE_SIZE", "2048"))
+IMAGE_CACHE_TTL = 7 * 24 * 3600  # 7 days in Redis; SQLite keeps entries indefinitely
+# On an exact-key miss, reuse the image of the most similar known recipe when
+# its cosine similarity (see image_similarity) reaches this threshold
+IMAGE_SIMILARITY_ENABLED = os.getenv("AI_IMAGE_SIMILARITY", "1") == "1"
+IMAGE_SIMILARITY_THRESHOLD = float(os.getenv("AI_IMAGE_SIMILARITY_THRESHOLD", "0.8"))
+
+
+def make_image_cache_key(name: str, ingredients: List[str]) -> str:
+    normalized = (name.strip().lower() + "|" + ",".join(sorted([i.strip().lower() for i in ingredients])))
+    h = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+    return f"recipe_image:{h}"
+
+
+class RecipeImageCache:
+    def __init__(self, max_entries: int = RECIPE_IMAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._similar: Optional[SimilarityIndex] = None
+        self._similar_lock = asyncio.Lock()
+        self.similar_lookups = 0
+        self.similar_hits = 0
+
+    def _remember(self, key: str, image_path: str) -> None:
+        self._entries[key] = image_path
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str, r=None) -> Optional[str]:
+        image_path = self._entries.get(key)
+        if image_path is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return image_path
+
+        if r is not None:
+            try:
+                image_path = await r.get(key)
+            except Exception:
+                image_path = None
+            if image_path:
+                self._remember(key, image_path)
+                self.redis_hits += 1
+                return image_path
+
+        async with pool.acquire() as db:
+            cursor = await db.execute("SELECT image_path FROM recipe_images WHERE cache_key = ?", (key,))
+            row = await cursor.fetchone()
+            if row is not None and not os.path.exists(local_path(row[0])):
+                # The file was removed from uploaded_images; forget the mapping
+                await db.execute("DELETE FROM recipe_images WHERE cache_key = ?", (key,))
+                await db.commit()
+                row = None
+        if row is None:
+            self.misses += 1
+            return None
+
+        image_path = row[0]
+        self._remember(key, image_path)
+        self.db_hits += 1
+        if r is not None:
+            try:
+                await r.set(key, image_path, ex=IMAGE_CACHE_TTL)
+            except Exception:
+                pass
+        return image_path
+
+    async def _similarity_index(self) -> SimilarityIndex:
+        if self._similar is None:
+            async with self._similar_lock:
+                if self._similar is None:
+                    async with pool.acquire() as db:
+                        cursor = await db.execute("SELECT name, ingredients, image_path FROM recipe_images")
+                        rows = await cursor.fetchall()
+                    index = SimilarityIndex(max(256, len(rows)))
+                    for name, ingredients_json, image_path in rows:
+                        index.add(name or "", json.loads(ingredients_json) if ingredients_json else [], image_path)
+                    self._similar = index
+        return self._similar
+
+    async def get_similar(self, key: str, name: str, ingredients: List[str], r=None) -> Optional[str]:
+        """Image of the nearest known recipe if it clears the threshold.
+
+        A hit is recorded under `key` so the next lookup is an exact one.
+        """
+        if not IMAGE_SIMILARITY_ENABLED:
+            return None
+        index = await self._similarity_index()
+        self.similar_lookups += 1
+        match = index.nearest(name, ingredients)
+        if match is None or match[1] < IMAGE_SIMILARITY_THRESHOLD or not os.path.exists(local_path(match[0])):
+            return None
+        self.similar_hits += 1
+        await self.put(key, match[0], name, ingredients, r, index=False)
+        return match[0]
+
+    async def put(self, key: str, image_path: str, name: str, ingredients: List[str], r=None, index: bool = True) -> None:
+        async with pool.acquire() as db:
+            await db.execute(
+                "INSERT OR REPLACE INTO recipe_images (cache_key, image_path, name, ingredients) VALUES (?, ?, ?, ?)",
+                (key, image_path, name, json.dumps(ingredients)),
+            )
+            await db.commit()
+        self._remember(key, image_path)
+        if index and self._similar is not None:
+            self._similar.add(name, ingredients, image_path)
+        if r is not None:
+            try:
+                await r.set(key, image_path, ex=IMAGE_CACHE_TTL)
+            except Exception:
+                pass
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._similar = None
+
+    def stats(self) -> Dict:
+        hits = self.memory_hits + self.redis_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_hits": self.memory_hits,
+            "redis_hits": self.redis_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "similarity": {
+                "enabled": IMAGE_SIMILARITY_ENABLED,
+                "threshold": IMAGE_SIMILARITY_THRESHOLD,
+                "indexed": len(self._similar) if self._similar is not None else None,
+                "lookups": self.similar_lookups,
+                "hits": self.similar_hits,
+                "hit_rate": round(self.similar_hits / self.similar_lookups, 3) if self.similar_lookups else None,
+            },
+        }
+
+
+recipe_image_cache = RecipeImageCache()
@@ -0,0 +1,160 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Recipe images are produced by a fixed set of background workers so the
+# /ask-ai response never waits on Stable Diffusion. At most IMAGE_WORKERS
+# generations run at once process-wide; beyond IMAGE_QUEUE_LIMIT queued jobs
+# new requests simply get no image job. Jobs for the same cache key share
+# one generation while it is queued or running (single-flight).
+IMAGE_WORKERS = int(os.getenv("AI_IMAGE_WORKERS", "3"))
+IMAGE_QUEUE_LIMIT = int(os.getenv("AI_IMAGE_QUEUE_LIMIT", "64"))
+IMAGE_JOB_TTL = int(os.getenv("AI_IMAGE_JOB_TTL", "3600"))
+MAX_TRACKED_JOBS = 5000
+
+
+class ImageJob:
+    def __init__(self, user_id: int, name: str, ingredients: List[str], key: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.name = name
+        self.ingredients = ingredients
+        self.key = key
+        self.status = "queued"  # queued | running | done | failed
+        self.image = ""
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Jobs for the same key submitted while this one was in flight
+        self.followers: List["ImageJob"] = []
+
+    def set_running(self) -> None:
+        for job in [self] + self.followers:
+            job.status = "running"
+
+    def finish(self, status: str, image: str = "", error: Optional[str] = None) -> None:
+        for job in [self] + self.followers:
+            job.status = status
+            job.image = image
+            job.error = error
+            job.finished_at = time.time()
+            if not job.result.done():
+                job.result.set_result(image)
+
+    def to_dict(self) -> Dict:
+        return {"job_id": self.id, "status": self.status, "image": self.image, "error": self.error}
+
+
+class ImageJobQueue:
+    """Bounded queue of image jobs drained by a fixed pool of worker tasks.
+
+    `generate(job) -> path` is awaited by the workers and should push blocking
+    work through `run_blocking`, which uses the queue's dedicated thread pool.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[ImageJob], Awaitable[str]],
+        workers: int = IMAGE_WORKERS,
+        queue_limit: int = IMAGE_QUEUE_LIMIT,
+    ):
+        self.generate = generate
+        self.workers = max(1, workers)
+        self.queue_limit = max(1, queue_limit)
+        self._jobs: "OrderedDict[str, ImageJob]" = OrderedDict()
+        self._inflight: Dict[str, ImageJob] = {}
+        self.deduplicated = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_limit)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="recipe-image")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def shutdown(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self._jobs.values():
+            if job.status in ("queued", "running"):
+                job.finish("failed", error="Server shutting down")
+        if self._executor is not None:
+            # Running generations cannot be interrupted; queued ones are dropped
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._queue = None
+        self._inflight.clear()
+
+    async def run_blocking(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def submit(self, user_id: int, name: str, ingredients: List[str], key: str) -> Optional[ImageJob]:
+        """Queue a generation, or attach to the one already in flight for `key`.
+
+        Returns None when the queue is full or not running.
+        """
+        if self._queue is None:
+            return None
+        self._prune()
+        job = ImageJob(user_id, name, ingredients, key)
+        leader = self._inflight.get(key)
+        if leader is not None:
+            job.status = leader.status
+            leader.followers.append(job)
+            self.deduplicated += 1
+        else:
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                print("Image job queue full, skipping image generation")
+                return None
+            self._inflight[key] = job
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - IMAGE_JOB_TTL
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            expired = job.finished_at is not None and job.finished_at < cutoff
+            if not expired and len(self._jobs) < MAX_TRACKED_JOBS:
+                break
+            self._jobs.popitem(last=False)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.set_running()
+            try:
+                image = await self.generate(job)
+                if image:
+                    job.finish("done", image)
+                else:
+                    job.finish("failed", error="Image generation failed")
+            except asyncio.CancelledError:
+                job.finish("failed", error="Server shutting down")
+                raise
+            except Exception as e:
+                print(f"Image job {job.id} failed: {e}")
+                job.finish("failed", error=str(e))
+            finally:
+                self._inflight.pop(job.key, None)
+                self._queue.task_done()
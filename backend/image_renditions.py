@@ -0,0 +1,120 @@
+import os
+import tempfile
+from typing import Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from PIL import Image, ImageOps, features
+
+from image_store import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, UPLOAD_DIR, file_response, is_digest, shard_dir
+
+# HEIC/HEIF sources need the plugin registered wherever renditions are built
+# (the API, the upload path and backfill_renditions.py alike)
+try:
+    import pillow_heif  # type: ignore[import-not-found]
+    pillow_heif.register_heif_opener()
+    HEIF_AVAILABLE = True
+except ImportError:
+    HEIF_AVAILABLE = False
+
+# Every image in uploaded_images gets compressed renditions, so list screens
+# can download a thumbnail instead of a 1-2 MB SDXL PNG. Renditions of
+# content-addressed images sit next to the original as <sha256>_<size>.<ext>
+# and are immutable; legacy images use uploaded_images/<size>/<stem>.<ext>.
+# The route below serves them and fills in any that have not been built yet.
+RENDITION_SIZES = {"thumb": 160, "card": 480, "full": 1024}  # longest side in px
+RENDITION_FORMAT = os.getenv("IMAGE_RENDITION_FORMAT", "webp" if features.check("webp") else "jpeg").lower()
+RENDITION_QUALITY = int(os.getenv("IMAGE_RENDITION_QUALITY", "80"))
+RENDITION_EXTENSION = ".webp" if RENDITION_FORMAT == "webp" else ".jpg"
+RENDITION_MEDIA_TYPE = "image/webp" if RENDITION_FORMAT == "webp" else "image/jpeg"
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp") + ((".heic", ".heif") if HEIF_AVAILABLE else ())
+
+router = APIRouter(prefix="/static", tags=["images"])
+
+
+def _stem(image_path: str) -> str:
+    return os.path.splitext(os.path.basename(image_path.replace("\\", "/")))[0]
+
+
+def rendition_path(stem: str, size: str) -> str:
+    if is_digest(stem):
+        return os.path.join(shard_dir(stem), f"{stem}_{size}{RENDITION_EXTENSION}")
+    return os.path.join(UPLOAD_DIR, size, stem + RENDITION_EXTENSION)
+
+
+def rendition_urls(image: Optional[str]) -> Optional[Dict[str, str]]:
+    """Size → URL for a stored image path; None for remote or missing images."""
+    if not image or image.startswith("http"):
+        return None
+    stem = _stem(image)
+    return {size: f"/static/{size}/{stem}{RENDITION_EXTENSION}" for size in RENDITION_SIZES}
+
+
+def create_renditions(source_path: str, overwrite: bool = False) -> Dict[str, str]:
+    """Write the missing renditions of `source_path` (all of them with `overwrite`)."""
+    stem = _stem(source_path)
+    targets = {size: rendition_path(stem, size) for size in RENDITION_SIZES}
+    todo = [size for size, path in targets.items() if overwrite or not os.path.exists(path)]
+    if not todo:
+        return targets
+
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        keep_alpha = RENDITION_FORMAT == "webp" and img.mode in ("RGBA", "LA", "P")
+        current = img.convert("RGBA" if keep_alpha else "RGB")
+        # Largest first, so each smaller size is resampled from the previous one
+        for size in sorted(todo, key=RENDITION_SIZES.get, reverse=True):
+            max_side = RENDITION_SIZES[size]
+            current.thumbnail((max_side, max_side), Image.LANCZOS)
+            path = targets[size]
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _save_atomically(current, path)
+    return targets
+
+
+def _save_atomically(image: Image.Image, path: str) -> None:
+    # A temp file unique to this call, so concurrent builds of the same
+    # rendition (route fill-in, backfill, upload) never write into each other
+    tmp = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False)
+    try:
+        with tmp:
+            if RENDITION_FORMAT == "webp":
+                image.save(tmp, format="WEBP", quality=RENDITION_QUALITY, method=4)
+            else:
+                image.save(tmp, format="JPEG", quality=RENDITION_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+
+def find_source(stem: str) -> Optional[str]:
+    directory = shard_dir(stem) if is_digest(stem) else UPLOAD_DIR
+    for ext in SOURCE_EXTENSIONS:
+        path = os.path.join(directory, stem + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@router.api_route("/{size}/{filename}", methods=["GET", "HEAD"])
+async def get_rendition(size: str, filename: str, request: Request):
+    """Serve a rendition, building it from the original on first request."""
+    stem, ext = os.path.splitext(filename)
+    if size not in RENDITION_SIZES or ext != RENDITION_EXTENSION or not stem or stem.startswith("."):
+        raise HTTPException(status_code=404, detail="Not Found")
+    path = rendition_path(stem, size)
+    if not os.path.exists(path):
+        source = find_source(stem)
+        if source is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        try:
+            await run_in_threadpool(create_renditions, source)
+        except Exception as e:
+            print(f"Failed to build renditions for {source}: {e}")
+            raise HTTPException(status_code=404, detail="Not Found")
+    if is_digest(stem):
+        # Same source bytes and settings always give the same rendition
+        etag = f'"{stem}-{size}-{RENDITION_FORMAT}-q{RENDITION_QUALITY}"'
+        return file_response(request, path, etag, IMMUTABLE_CACHE_CONTROL, RENDITION_MEDIA_TYPE)
+    return file_response(request, path, None, REVALIDATE_CACHE_CONTROL, RENDITION_MEDIA_TYPE)
@@ -0,0 +1,93 @@
+"""
+Nearest-neighbour lookup over recipes that already have an image.
+
+Each recipe is embedded as a hashed bag of name words, name character
+trigrams and ingredient words (L2-normalised, float32), so "Garlic Butter
+Shrimp Pasta" and "Shrimp Pasta with Garlic Butter" land on nearly the same
+vector. A query is one matrix-vector product over the whole index.
+"""
+import re
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DIMENSIONS = 2048
+NAME_WORD_WEIGHT = 2.0
+NAME_TRIGRAM_WEIGHT = 0.5
+INGREDIENT_WEIGHT = 1.0
+
+_WORD = re.compile(r"[a-z]+")
+STOP_WORDS = {
+    "a", "an", "and", "the", "with", "of", "in", "on", "for", "to", "or", "style",
+    # quantities and units that show up in ingredient strings
+    "cup", "cups", "tbsp", "tsp", "tablespoon", "tablespoons", "teaspoon", "teaspoons",
+    "g", "kg", "mg", "ml", "l", "oz", "lb", "lbs", "pinch", "clove", "cloves", "slice", "slices",
+    "large", "small", "medium", "fresh", "chopped", "diced", "minced", "sliced", "to", "taste",
+}
+
+
+def _words(text: str) -> List[str]:
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        # Cheap singularisation so "tomatoes"/"tomato" and "eggs"/"egg" agree
+        if len(word) > 3 and word.endswith("es") and word[-3] in "osxz":
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _bucket(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) % DIMENSIONS
+
+
+def embed(name: str, ingredients: Sequence[str]) -> np.ndarray:
+    vec = np.zeros(DIMENSIONS, dtype=np.float32)
+    for word in _words(name):
+        vec[_bucket("w:" + word)] += NAME_WORD_WEIGHT
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vec[_bucket("c:" + padded[i:i + 3])] += NAME_TRIGRAM_WEIGHT
+    for word in set(_words(" ".join(ingredients))):
+        vec[_bucket("i:" + word)] += INGREDIENT_WEIGHT
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+class SimilarityIndex:
+    """Growable matrix of recipe embeddings with their image paths."""
+
+    def __init__(self, capacity: int = 256):
+        self._matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self._images: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def add(self, name: str, ingredients: Sequence[str], image_path: str) -> None:
+        vec = embed(name, ingredients)
+        if not vec.any():
+            return
+        size = len(self._images)
+        if size == self._matrix.shape[0]:
+            grown = np.zeros((size * 2, DIMENSIONS), dtype=np.float32)
+            grown[:size] = self._matrix
+            self._matrix = grown
+        self._matrix[size] = vec
+        self._images.append(image_path)
+
+    def nearest(self, name: str, ingredients: Sequence[str]) -> Optional[Tuple[str, float]]:
+        """(image_path, cosine similarity) of the closest indexed recipe."""
+        size = len(self._images)
+        if size == 0:
+            return None
+        vec = embed(name, ingredients)
+        if not vec.any():
+            return None
+        scores = self._matrix[:size] @ vec
+        best = int(np.argmax(scores))
+        return self._images[best], float(scores[best])
@@ -0,0 +1,161 @@
+import io
+import os
+import re
+import hashlib
+import tempfile
+import mimetypes
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Content-addressed image store. New images are saved as <sha256>.<ext> in
+# uploaded_images/objects/<aa>/<bb>/ so no directory grows unbounded, while
+# the path recorded in the database stays "uploaded_images/<sha256>.<ext>"
+# and keeps mapping to /static/<sha256>.<ext>. Because a name can never be
+# reused for different bytes, those responses are cacheable forever; legacy
+# flat files are still served but must be revalidated.
+UPLOAD_DIR = "uploaded_images"
+OBJECTS_DIR = os.path.join(UPLOAD_DIR, "objects")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+_EXTENSION = re.compile(r"^\.[a-z0-9]{1,5}$")
+
+router = APIRouter(prefix="/static", tags=["images"])
+
+
+def is_digest(stem: str) -> bool:
+    return bool(_DIGEST.match(stem))
+
+
+def shard_dir(digest: str) -> str:
+    return os.path.join(OBJECTS_DIR, digest[:2], digest[2:4])
+
+
+def local_path(image: str) -> str:
+    """Filesystem path of a stored image path such as 'uploaded_images/<name>'."""
+    name = os.path.basename(image.replace("\\", "/"))
+    stem = os.path.splitext(name)[0]
+    if is_digest(stem):
+        return os.path.join(shard_dir(stem), name)
+    return os.path.join(UPLOAD_DIR, name)
+
+
+def store_bytes(data: bytes, ext: str) -> str:
+    """Write `data` under its SHA-256 (once) and return the stored image path."""
+    ext = ext.lower()
+    if not _EXTENSION.match(ext):
+        raise ValueError(f"Unsupported image extension: {ext!r}")
+    digest = hashlib.sha256(data).hexdigest()
+    name = digest + ext
+    directory = shard_dir(digest)
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        # Unique per call: threads of one worker may store the same bytes at once
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as f:
+            f.write(data)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            # Losing a race to a writer of the same bytes (e.g. the target is
+            # open on Windows) still leaves the right content in place
+            os.unlink(f.name)
+            if not os.path.exists(path):
+                raise
+    return f"{UPLOAD_DIR}/{name}"
+
+
+def store_image(image, format: str = "PNG") -> str:
+    """Encode a PIL image and store it content-addressed."""
+    buf = io.BytesIO()
+    image.save(buf, format=format)
+    return store_bytes(buf.getvalue(), "." + format.lower().replace("jpeg", "jpg"))
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single byte range; (-1, -1) when unsatisfiable.
+
+    Multi-range and malformed headers return None, i.e. serve the whole file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            if not last:
+                return None
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        return (-1, -1)
+    return (start, end)
+
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: str, etag: Optional[str], cache_control: str, media_type: Optional[str] = None) -> Response:
+    """Serve a file with ETag/If-None-Match, single byte Range and caching headers."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if etag is None:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range == (-1, -1):
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{stat.st_size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                "Content-Length": str(length),
+            })
+            if request.method == "HEAD":
+                return Response(status_code=206, media_type=media_type, headers=headers)
+            return StreamingResponse(_iter_file(path, start, length), status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+async def get_image(filename: str, request: Request):
+    """Original images: immutable when content-addressed, revalidated otherwise."""
+    if filename.startswith(".") or filename != os.path.basename(filename):
+        raise HTTPException(status_code=404, detail="Not Found")
+    stem = os.path.splitext(filename)[0]
+    if is_digest(stem):
+        return file_response(request, local_path(filename), f'"{stem}"', IMMUTABLE_CACHE_CONTROL)
+    return file_response(request, os.path.join(UPLOAD_DIR, filename), None, REVALIDATE_CACHE_CONTROL)
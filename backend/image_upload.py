@@ -1,5 +1,8 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from starlette.concurrency import run_in_threadpool
 import os
+from image_renditions import create_renditions, rendition_urls
+from image_store import local_path, store_bytes
 
 router = APIRouter(prefix="/upload", tags=["image-upload"])
 UPLOAD_DIR = "uploaded_images"
@@ -7,8 +10,16 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.post("/")
 async def upload_image(file: UploadFile = File(...)):
-    file_location = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_location, "wb") as f:
-        content = await file.read()
-        f.write(content)
- 
\ No newline at end of file
+    content = await file.read()
+    ext = os.path.splitext(file.filename or "")[1].lower() or ".jpg"
+    try:
+        # Stored under the SHA-256 of its bytes, so re-uploads are free and
+        # a stored path always refers to the same image
+        image = await run_in_threadpool(store_bytes, content, ext)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await run_in_threadpool(create_renditions, local_path(image))
+    except Exception as e:
+        print(f"Failed to build renditions for {image}: {e}")
+    return {"image": image, "image_urls": rendition_urls(image)}
@@ -1,17 +1,23 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from auth import router as auth_router
 from meals import router as meals_router
 from plans import router as plans_router
 from pantry import router as pantry_router
 from grocery import router as grocery_router
-from ai import router as ai_router
+from ai import router as ai_router, image_jobs
 from image_upload import router as upload_router
-from yolo_detection import router as yolo_router
+from yolo_detection import router as yolo_router, yolo_batcher
+from yolo_model import YOLO_PRELOAD, detector
+from detection_images import image_decoder
 from user_profile import router as profile_router
 from utensils import router as utensils_router
-from database import init_db
+from image_renditions import router as renditions_router
+from image_store import router as static_router
+from database import init_db, pool
+from pagination import NEXT_CURSOR_HEADER
+from passwords import hasher
+from openai_client import close_openai_client
 
 app = FastAPI()
 
@@ -22,11 +28,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    await pool.open()
+    image_jobs.start()
+    yolo_batcher.start()
+    if YOLO_PRELOAD:
+        detector.start_loading()  # background; /detect/ready reports progress
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await image_jobs.shutdown()
+    yolo_batcher.shutdown()
+    image_decoder.shutdown()
+    await pool.close()
+    hasher.shutdown()
+    await close_openai_client()
 
 app.include_router(auth_router)      # /auth endpoints
 app.include_router(meals_router)     # /meals endpoints
@@ -38,8 +59,8 @@ app.include_router(upload_router)    # image upload endpoints
 app.include_router(yolo_router)      # /detect endpoints
 app.include_router(profile_router)   # /profile endpoints
 app.include_router(utensils_router)  # /utensils endpoints
-
-app.mount("/static", StaticFiles(directory="uploaded_images"), name="static")
+app.include_router(renditions_router)  # /static/{size}/{filename} renditions
+app.include_router(static_router)      # /static/{filename} originals (ETag, Range, immutable)
 
 @app.get("/")
 def root():
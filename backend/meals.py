@@ -1,125 +1,29 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional, Set
 import aiosqlite
 import json
+import re
 from models import MealCreate, MealOut, Nutrients
-from auth import SECRET_KEY, ALGORITHM
-from jose import jwt, JWTError
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import DB_PATH
+from image_renditions import rendition_urls
+from auth import get_current_user
+from database import get_db, pool
+from pagination import PageParams, decode_cursor, encode_cursor, parse_fields, split_page, list_response
 
 router = APIRouter(prefix="/meals", tags=["meals"])
-security = HTTPBearer()  # require token
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return int(payload["user_id"])
-    except (JWTError, KeyError, ValueError):
-        raise HTTPException(status_code=401, detail="Invalid token")
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_CHUNK_SIZE = 200  # rows per keyset query while streaming
 
-@router.post("/", response_model=MealOut)
-async def create_meal(meal: MealCreate, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Check if meal with same name already exists
-        cursor = await db.execute(
-            "SELECT id, name, ingredients, instructions, calories, protein, carbs, fat, prep_time, cook_time, image FROM meals WHERE name = ?",
-            (meal.name,)
-        )
-        existing = await cursor.fetchone()
-        
-        if existing:
-            # Return existing meal instead of creating duplicate
-            ingredients = json.loads(existing[2]) if existing[2] else []
-            nutrients = Nutrients(
-                calories=existing[4] or 0,
-                protein=existing[5] or 0,
-                carbs=existing[6] or 0,
-                fat=existing[7] or 0
-            )
-            return MealOut(
-                id=existing[0],
-                name=existing[1],
-                ingredients=ingredients,
-                instructions=existing[3] or "",
-                nutrients=nutrients,
-                prep_time=existing[8] or 0,
-                cook_time=existing[9] or 0,
-                image=existing[10]
-            )
-        
-        # Convert ingredients list to JSON string for storage
-        ingredients_json = json.dumps(meal.ingredients)
-        
-        cursor = await db.execute(
-            """INSERT INTO meals (name, ingredients, instructions, calories, protein, carbs, fat, prep_time, cook_time, image) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                meal.name,
-                ingredients_json,
-                meal.instructions,
-                meal.nutrients.calories,
-                meal.nutrients.protein,
-                meal.nutrients.carbs,
-                meal.nutrients.fat,
-                meal.prep_time,
-                meal.cook_time,
-                meal.image
-            )
-        )
-        await db.commit()
-        meal_id = cursor.lastrowid
-    return MealOut(id=meal_id, **meal.dict())
-
-@router.get("/", response_model=List[MealOut])
-async def list_meals(user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            """SELECT id, name, ingredients, instructions, calories, protein, carbs, fat, prep_time, cook_time, image 
-               FROM meals ORDER BY name ASC"""
-        )
-        rows = await cursor.fetchall()
-    
-    meals: List[MealOut] = []
-    for row in rows:
-        ingredients = json.loads(row[2]) if row[2] else []
-        nutrients = Nutrients(
-            calories=row[4] or 0,
-            protein=row[5] or 0, 
-            carbs=row[6] or 0,
-            fat=row[7] or 0
-        )
-        meal = MealOut(
-            id=row[0],
-            name=row[1],
-            ingredients=ingredients,
-            instructions=row[3] or "",
-            nutrients=nutrients,
-            prep_time=row[8] or 0,
-            cook_time=row[9] or 0,
-            image=row[10]
-        )
-        meals.append(meal)
-    
-    return meals
+MEAL_COLUMNS = "id, name, ingredients, instructions, calories, protein, carbs, fat, prep_time, cook_time, image"
 
-@router.get("/{meal_id}", response_model=MealOut)
-async def get_meal(meal_id: int, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            """SELECT id, name, ingredients, instructions, calories, protein, carbs, fat, prep_time, cook_time, image 
-               FROM meals WHERE id = ?""",
-            (meal_id,)
-        )
-        row = await cursor.fetchone()
-    
-    if not row:
-        raise HTTPException(status_code=404, detail="Meal not found")
-    
+def row_to_meal(row) -> MealOut:
+    """Build a MealOut from a row selected in MEAL_COLUMNS order"""
     ingredients = json.loads(row[2]) if row[2] else []
     nutrients = Nutrients(
         calories=row[4] or 0,
-        protein=row[5] or 0, 
+        protein=row[5] or 0,
         carbs=row[6] or 0,
         fat=row[7] or 0
     )
@@ -131,12 +35,173 @@ async def get_meal(meal_id: int, user_id: int = Depends(get_current_user)):
         nutrients=nutrients,
         prep_time=row[8] or 0,
         cook_time=row[9] or 0,
-        image=row[10]
+        image=row[10],
+        image_urls=rendition_urls(row[10])
     )
 
+def meal_columns(fields=None) -> str:
+    """MEAL_COLUMNS with the heavy text columns swapped for NULL when not projected"""
+    if fields is None:
+        return MEAL_COLUMNS
+    return ", ".join(
+        "NULL" if col in ("ingredients", "instructions") and col not in fields else col
+        for col in MEAL_COLUMNS.split(", ")
+    )
+
+def build_fts_query(text: str, prefix: bool = True) -> str:
+    """Turn free text into a safe FTS5 MATCH expression (all terms must match)"""
+    terms = re.findall(r"\w+", text.lower())
+    suffix = "*" if prefix else ""
+    return " ".join(f'"{term}"{suffix}' for term in terms)
+
+@router.post("/", response_model=MealOut)
+async def create_meal(meal: MealCreate, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    # Check if meal with same name already exists
+    cursor = await db.execute(
+        f"SELECT {MEAL_COLUMNS} FROM meals WHERE name = ?",
+        (meal.name,)
+    )
+    existing = await cursor.fetchone()
+
+    if existing:
+        # Return existing meal instead of creating duplicate
+        return row_to_meal(existing)
+
+    # Convert ingredients list to JSON string for storage
+    ingredients_json = json.dumps(meal.ingredients)
+
+    cursor = await db.execute(
+        """INSERT INTO meals (name, ingredients, instructions, calories, protein, carbs, fat, prep_time, cook_time, image) 
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            meal.name,
+            ingredients_json,
+            meal.instructions,
+            meal.nutrients.calories,
+            meal.nutrients.protein,
+            meal.nutrients.carbs,
+            meal.nutrients.fat,
+            meal.prep_time,
+            meal.cook_time,
+            meal.image
+        )
+    )
+    await db.commit()
+    meal_id = cursor.lastrowid
+    return MealOut(id=meal_id, image_urls=rendition_urls(meal.image), **meal.dict())
+
+def meal_list_query(fields: Optional[Set[str]], after: Optional[list], limit: Optional[int]):
+    query = f"SELECT {meal_columns(fields)} FROM meals"
+    params = []
+    if after:
+        query += " WHERE (name, id) > (?, ?)"
+        params.extend(after)
+    query += " ORDER BY name ASC, id ASC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, params
+
+async def stream_meals(fields: Optional[Set[str]], after: Optional[list], limit: Optional[int], ndjson: bool) -> AsyncIterator[bytes]:
+    """Yield meals as they are decoded so memory stays flat regardless of catalog size"""
+    # Each chunk is its own keyset query on a briefly borrowed pooled
+    # connection, released before the chunk is sent: a slow or stalled reader
+    # never holds a connection the other endpoints need.
+    remaining = limit
+    first = True
+    if not ndjson:
+        yield b"["
+    while remaining is None or remaining > 0:
+        size = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+        query, params = meal_list_query(fields, after, size)
+        async with pool.acquire() as db:
+            cursor = await db.execute(query, params)
+            rows = await cursor.fetchall()
+        if not rows:
+            break
+        chunk = []
+        for row in rows:
+            encoded = json.dumps(jsonable_encoder(row_to_meal(row).dict(include=fields)))
+            if ndjson:
+                chunk.append(encoded + "\n")
+            else:
+                chunk.append(encoded if first else "," + encoded)
+            first = False
+        yield "".join(chunk).encode("utf-8")
+        if len(rows) < size:
+            break
+        after = [rows[-1][1], rows[-1][0]]
+        if remaining is not None:
+            remaining -= len(rows)
+    if not ndjson:
+        yield b"]"
+
+@router.get("/", response_model=List[MealOut])
+async def list_meals(
+    request: Request,
+    page: PageParams = Depends(),
+    stream: bool = Query(False, description="Stream the list instead of buffering it"),
+    user_id: int = Depends(get_current_user)
+):
+    """List meals by name; pass `limit`/`after` to page and `fields` to project.
+
+    Send `Accept: application/x-ndjson` for one meal per line, or `stream=1`
+    for a streamed JSON array. Streamed responses carry no next-page cursor.
+    """
+    fields = parse_fields(page.fields, MealOut.__fields__)
+    after = decode_cursor(page.after, 2)
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    if ndjson or stream:
+        media_type = NDJSON_MEDIA_TYPE if ndjson else "application/json"
+        return StreamingResponse(stream_meals(fields, after, page.limit, ndjson), media_type=media_type)
+
+    query, params = meal_list_query(fields, after, page.limit + 1 if page.limit else None)
+    async with pool.acquire() as db:
+        cursor = await db.execute(query, params)
+        rows, has_more = split_page(await cursor.fetchall(), page.limit)
+    next_cursor = encode_cursor([rows[-1][1], rows[-1][0]]) if has_more else None
+    return list_response([row_to_meal(row) for row in rows], fields, next_cursor)
+
+@router.get("/search", response_model=List[MealOut])
+async def search_meals(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    prefix: bool = Query(True),
+    user_id: int = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """Full-text search over meal names, ingredients and instructions, best matches first"""
+    match = build_fts_query(q, prefix)
+    if not match:
+        return []
+    # bm25 weights: name matches count most, then ingredients, then instructions
+    cursor = await db.execute(
+        """SELECT m.id, m.name, m.ingredients, m.instructions, m.calories, m.protein, m.carbs, m.fat,
+                  m.prep_time, m.cook_time, m.image
+           FROM meals_fts
+           JOIN meals m ON m.id = meals_fts.rowid
+           WHERE meals_fts MATCH ?
+           ORDER BY bm25(meals_fts, 10.0, 5.0, 1.0)
+           LIMIT ?""",
+        (match, limit)
+    )
+    rows = await cursor.fetchall()
+    return [row_to_meal(row) for row in rows]
+
+@router.get("/{meal_id}", response_model=MealOut)
+async def get_meal(meal_id: int, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    cursor = await db.execute(
+        f"SELECT {MEAL_COLUMNS} FROM meals WHERE id = ?",
+        (meal_id,)
+    )
+    row = await cursor.fetchone()
+
+    if not row:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    return row_to_meal(row)
+
 @router.delete("/{meal_id}")
-async def delete_meal(meal_id: int, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
-        await db.commit()
+async def delete_meal(meal_id: int, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    await db.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
+    await db.commit()
     return {"message": "Meal deleted"} 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import date
 import json
 
@@ -77,6 +77,7 @@ class MealCreate(MealBase):
 
 class MealOut(MealBase):
     id: int
+    image_urls: Optional[Dict[str, str]] = None  # thumb/card/full rendition URLs
 
 class MealPlanItemBase(BaseModel):
     day: int  # 0=Monday, 6=Sunday
@@ -96,6 +97,15 @@ class MealPlanOut(BaseModel):
 class MealPlanItemOut(MealPlanItemBase):
     id: int
 
+class MealPlanItemExpanded(MealPlanItemBase):
+    meal: Optional[MealOut] = None  # None if the meal was deleted
+
+class MealPlanExpandedOut(BaseModel):
+    id: int
+    user_id: int
+    start_date: date
+    items: List[MealPlanItemExpanded]
+
 class PantryItemBase(BaseModel):
     name: str
 
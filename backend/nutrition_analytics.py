@@ -0,0 +1,151 @@
+"""
+Vectorized nutrition analytics over the daily_nutrition rollup.
+
+A user's window is loaded once into dense per-day NumPy arrays (one row per
+calendar day, one column per nutrient) and every metric is computed with
+array operations, so cost does not grow with per-row Python work.
+
+Plans are weekly templates: a daily_nutrition row holds the totals of one
+weekday from the first date it occurs on, and they recur every 7 days after
+that. build_daily_arrays expands rows accordingly, and every nutrition
+endpoint reads the rollup through it.
+"""
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+# kcal per gram for protein, carbs and fat
+MACRO_KCAL = np.array([4.0, 4.0, 9.0])
+
+
+def build_daily_arrays(rows: Sequence[tuple], start: date, end: date):
+    """Expand weekly-recurring (date, calories, protein, carbs, fat, meal_count) rows into dense arrays.
+
+    Each row applies to its date and every 7th day after it, so rows dated
+    before `start` still count. Returns (values, meals): values has shape
+    (days, 4), meals has shape (days,). Days without planned meals are zero.
+    """
+    days = (end - start).days + 1
+    weeks = -(-days // 7)
+    # Scatter each row at its first occurrence inside the window, then a
+    # cumulative sum over whole weeks carries it to the same weekday after
+    onset = np.zeros((weeks * 7, len(NUTRIENTS) + 1), dtype=np.float64)
+    if rows:
+        data = np.array([row[1:] for row in rows], dtype=np.float64)
+        offsets = np.array([(date.fromisoformat(row[0]) - start).days for row in rows], dtype=np.int64)
+        offsets = np.where(offsets < 0, offsets % 7, offsets)
+        keep = offsets < days
+        np.add.at(onset, offsets[keep], data[keep])
+    totals = onset.reshape(weeks, 7, -1).cumsum(axis=0).reshape(weeks * 7, -1)[:days]
+    return totals[:, :4], totals[:, 4].astype(np.int64)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` days; the first days average what is available."""
+    csum = np.cumsum(np.vstack([np.zeros((1, values.shape[1])), values]), axis=0)
+    idx = np.arange(1, values.shape[0] + 1)
+    lo = np.maximum(idx - window, 0)
+    counts = (idx - lo)[:, None]
+    return (csum[idx] - csum[lo]) / counts
+
+
+def macro_ratios(values: np.ndarray) -> np.ndarray:
+    """Share of macro energy from protein, carbs and fat (NaN where no macros)."""
+    kcal = values[..., 1:] * MACRO_KCAL
+    total = kcal.sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, kcal / total, np.nan)
+
+
+def run_lengths(mask: np.ndarray):
+    """(longest, current) run of True values; current counts back from the last day."""
+    padded = np.concatenate(([0], mask.astype(np.int8), [0]))
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if starts.size == 0:
+        return 0, 0
+    lengths = ends - starts
+    current = int(lengths[-1]) if ends[-1] == mask.size else 0
+    return int(lengths.max()), current
+
+
+def _to_list(arr: np.ndarray, digits: int = 1) -> list:
+    """JSON-safe list: rounded floats with NaN mapped to None."""
+    rounded = np.round(arr, digits).astype(object)
+    rounded[np.isnan(arr)] = None
+    return rounded.tolist()
+
+
+def _by_nutrient(arr: np.ndarray, digits: int = 1) -> Dict[str, Optional[float]]:
+    return dict(zip(NUTRIENTS, _to_list(arr, digits)))
+
+
+def analyze(
+    values: np.ndarray,
+    meals: np.ndarray,
+    goals: Dict[str, Optional[int]],
+    start: date,
+    window: int = 7,
+    tolerance: float = 0.1,
+) -> Dict:
+    """Rolling averages, macro ratios, goal deviation and adherence streaks."""
+    days = values.shape[0]
+    planned = meals > 0
+    planned_count = int(planned.sum())
+    goal_arr = np.array([goals.get(name) or np.nan for name in NUTRIENTS], dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Relative deviation from goal per day and nutrient (NaN where no goal)
+        deviation = (values - goal_arr) / goal_arr
+        planned_dev = deviation[planned]
+        mean_deviation = planned_dev.mean(axis=0) if planned_count else np.full(len(NUTRIENTS), np.nan)
+        mean_abs_deviation = np.abs(planned_dev).mean(axis=0) if planned_count else np.full(len(NUTRIENTS), np.nan)
+        # A day adheres when every nutrient with a goal is within tolerance
+        within = np.abs(deviation) <= tolerance
+        within = np.where(np.isnan(goal_arr), True, within)
+        adherent = planned & within.all(axis=1)
+        calorie_adherent = planned & (np.abs(deviation[:, 0]) <= tolerance)
+
+    longest, current = run_lengths(adherent)
+    cal_longest, cal_current = run_lengths(calorie_adherent)
+    totals = values.sum(axis=0)
+    planned_values = values[planned]
+
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    return {
+        "days": days,
+        "planned_days": planned_count,
+        "window": window,
+        "tolerance": tolerance,
+        "summary": {
+            "totals": _by_nutrient(totals),
+            "average_per_planned_day": _by_nutrient(
+                planned_values.mean(axis=0) if planned_count else np.full(len(NUTRIENTS), np.nan)
+            ),
+            "macro_ratio": dict(zip(NUTRIENTS[1:], _to_list(macro_ratios(totals), 3))),
+            "mean_deviation": _by_nutrient(mean_deviation, 3),
+            "mean_abs_deviation": _by_nutrient(mean_abs_deviation, 3),
+            "adherence_rate": round(float(adherent.sum()) / planned_count, 3) if planned_count else None,
+        },
+        "streaks": {
+            "longest": longest,
+            "current": current,
+            "calories_longest": cal_longest,
+            "calories_current": cal_current,
+        },
+        "series": {
+            "dates": dates,
+            "meals": meals.tolist(),
+            "values": {name: _to_list(values[:, i]) for i, name in enumerate(NUTRIENTS)},
+            "rolling_average": {
+                name: _to_list(col) for name, col in zip(NUTRIENTS, rolling_mean(values, window).T)
+            },
+            "macro_ratio": {
+                name: _to_list(col, 3) for name, col in zip(NUTRIENTS[1:], macro_ratios(values).T)
+            },
+            "adherent": adherent.tolist(),
+        },
+    }
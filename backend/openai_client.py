@@ -0,0 +1,90 @@
+import os
+import asyncio
+from typing import AsyncIterator, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+try:
+    from openai import AsyncOpenAI  # type: ignore
+except Exception:
+    AsyncOpenAI = None  # type: ignore
+
+load_dotenv()
+
+# One process-wide client so completions reuse pooled keep-alive connections
+# instead of paying a TLS handshake per request. Tune through the environment;
+# OPENAI_BASE_URL points the client at a local stub server for testing.
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "8"))
+
+_client: Optional["AsyncOpenAI"] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_openai_client() -> Optional["AsyncOpenAI"]:
+    """Shared AsyncOpenAI client, or None when the SDK or API key is missing."""
+    global _client
+    if _client is not None:
+        return _client
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key or AsyncOpenAI is None:
+        return None
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+    _client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=http_client,
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(OPENAI_CONCURRENCY)
+    return _semaphore
+
+
+async def chat_completion(timeout: Optional[float] = None, **kwargs):
+    """Run a chat completion on the shared client, capped at OPENAI_CONCURRENCY in flight."""
+    client = get_openai_client()
+    if client is None:
+        raise RuntimeError("OpenAI client is not configured")
+    async with _get_semaphore():
+        return await client.chat.completions.create(timeout=timeout or OPENAI_TIMEOUT, **kwargs)
+
+
+async def stream_chat_completion(timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+    """Yield content deltas of a streamed chat completion; holds a concurrency slot until done."""
+    client = get_openai_client()
+    if client is None:
+        raise RuntimeError("OpenAI client is not configured")
+    async with _get_semaphore():
+        stream = await client.chat.completions.create(stream=True, timeout=timeout or OPENAI_TIMEOUT, **kwargs)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+
+async def close_openai_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
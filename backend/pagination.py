@@ -0,0 +1,73 @@
+import json
+import base64
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+from fastapi import HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# List endpoints keep returning a bare JSON array; the cursor for the next
+# page travels in this header so existing clients are unaffected.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
+
+
+class PageParams:
+    """Common `limit` / `after` / `fields` query parameters for list endpoints"""
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size (omit for all rows)"),
+        after: Optional[str] = Query(None, description="Opaque cursor from the previous page's X-Next-Cursor header"),
+        fields: Optional[str] = Query(None, description="Comma-separated list of fields to return"),
+    ):
+        self.limit = limit
+        self.after = after
+        self.fields = fields
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[list]:
+    """Decode a cursor into its key values, or raise 400 if it was tampered with"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Only scalars SQLite can bind; anything else would fail as a 500
+    if not all(v is None or isinstance(v, (str, int, float)) for v in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[Set[str]]:
+    """Validate a `fields=` projection against the model's field names"""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested or None
+
+
+def split_page(rows: list, limit: Optional[int]) -> Tuple[list, bool]:
+    """Trim a `limit + 1` fetch to the page and report whether more rows exist"""
+    if limit is None or len(rows) <= limit:
+        return rows, False
+    return rows[:limit], True
+
+
+def list_response(items: List[BaseModel], fields: Optional[Set[str]], next_cursor: Optional[str]) -> JSONResponse:
+    content = [item.dict(include=fields) for item in items]
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
@@ -2,62 +2,70 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 import aiosqlite
 from models import PantryItemCreate, PantryItemOut
-from auth import SECRET_KEY, ALGORITHM
-from jose import jwt, JWTError
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import DB_PATH
+from auth import get_current_user
+from database import get_db
+from prompt_context import prompt_context_cache
+from pagination import PageParams, decode_cursor, encode_cursor, parse_fields, split_page, list_response
 
 router = APIRouter(prefix="/pantry", tags=["pantry"])
-security = HTTPBearer()
-
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return int(payload["user_id"])
-    except (JWTError, KeyError, ValueError):
-        raise HTTPException(status_code=401, detail="Invalid token")
 
 @router.post("/", response_model=PantryItemOut)
-async def add_pantry_item(item: PantryItemCreate, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "INSERT INTO pantry_items (user_id, name) VALUES (?, ?)",
-            (user_id, item.name)
-        )
-        await db.commit()
-        item_id = cursor.lastrowid
+async def add_pantry_item(item: PantryItemCreate, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    cursor = await db.execute(
+        "INSERT INTO pantry_items (user_id, name) VALUES (?, ?)",
+        (user_id, item.name)
+    )
+    await db.commit()
+    prompt_context_cache.invalidate_user(user_id)
+    item_id = cursor.lastrowid
     return PantryItemOut(id=item_id, user_id=user_id, name=item.name)
 
 @router.get("/", response_model=List[PantryItemOut])
 async def list_pantry_items(
     user_id: int = Depends(get_current_user),
     search: Optional[str] = Query(None),
-    category: Optional[str] = Query(None)
+    category: Optional[str] = Query(None),
+    page: PageParams = Depends(),
+    db: aiosqlite.Connection = Depends(get_db)
 ):
+    fields = parse_fields(page.fields, PantryItemOut.__fields__)
+    after = decode_cursor(page.after, 2)
     query = "SELECT id, name FROM pantry_items WHERE user_id = ?"
     params = [user_id]
     if search:
         query += " AND name LIKE ?"
         params.append(f"%{search}%")
+    if after:
+        query += " AND (name, id) > (?, ?)"
+        params.extend(after)
+    if page.limit or after:
+        query += " ORDER BY name, id"
+    else:
+        # Unpaged lists keep their original insertion order
+        query += " ORDER BY id"
+    if page.limit:
+        query += " LIMIT ?"
+        params.append(page.limit + 1)
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
-    return [PantryItemOut(id=row[0], user_id=user_id, name=row[1]) for row in rows]
+    cursor = await db.execute(query, params)
+    rows, has_more = split_page(await cursor.fetchall(), page.limit)
+    next_cursor = encode_cursor([rows[-1][1], rows[-1][0]]) if has_more else None
+    items = [PantryItemOut(id=row[0], user_id=user_id, name=row[1]) for row in rows]
+    return list_response(items, fields, next_cursor)
 
 @router.put("/{item_id}", response_model=PantryItemOut)
-async def update_pantry_item(item_id: int, item: PantryItemCreate, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id FROM pantry_items WHERE id = ? AND user_id = ?", (item_id, user_id))
-        if not await cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Pantry item not found")
-        await db.execute("UPDATE pantry_items SET name = ? WHERE id = ? AND user_id = ?", (item.name, item_id, user_id))
-        await db.commit()
+async def update_pantry_item(item_id: int, item: PantryItemCreate, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    cursor = await db.execute("SELECT id FROM pantry_items WHERE id = ? AND user_id = ?", (item_id, user_id))
+    if not await cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Pantry item not found")
+    await db.execute("UPDATE pantry_items SET name = ? WHERE id = ? AND user_id = ?", (item.name, item_id, user_id))
+    await db.commit()
+    prompt_context_cache.invalidate_user(user_id)
     return PantryItemOut(id=item_id, user_id=user_id, name=item.name)
 
 @router.delete("/{item_id}")
-async def delete_pantry_item(item_id: int, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM pantry_items WHERE id = ? AND user_id = ?", (item_id, user_id))
-        await db.commit()
+async def delete_pantry_item(item_id: int, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    await db.execute("DELETE FROM pantry_items WHERE id = ? AND user_id = ?", (item_id, user_id))
+    await db.commit()
+    prompt_context_cache.invalidate_user(user_id)
     return {"message": "Pantry item deleted"} 
\ No newline at end of file
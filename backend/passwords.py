@@ -0,0 +1,83 @@
+import os
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# bcrypt is deliberately slow (tens to hundreds of ms per call), so it runs in
+# a dedicated pool instead of on the event loop. Tune through the environment.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+PASSWORD_EXECUTOR = os.getenv("PASSWORD_EXECUTOR", "thread")  # "thread" | "process"
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    return pwd_context.verify(password, password_hash)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded pool and sheds load once the queue is full.
+
+    At most `workers` hashes run at once and at most `queue_limit` more may
+    wait; further calls fail fast with HTTP 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, queue_limit: int = PASSWORD_QUEUE_LIMIT, kind: str = PASSWORD_EXECUTOR):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        # The counter is only touched from the event loop thread, so no lock is needed
+        if self._in_flight >= self.capacity:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"},
+            )
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(_verify, password, password_hash)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher()
@@ -1,89 +1,151 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
 from datetime import date
+from itertools import groupby
 import aiosqlite
-from models import MealPlanCreate, MealPlanOut, MealPlanItemBase
-from auth import SECRET_KEY, ALGORITHM
-from jose import jwt, JWTError
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import DB_PATH
+from models import MealPlanCreate, MealPlanOut, MealPlanItemBase, MealPlanItemExpanded, MealPlanExpandedOut
+from meals import MEAL_COLUMNS, row_to_meal
+from auth import get_current_user
+from database import get_db
+from pagination import PageParams, decode_cursor, encode_cursor, parse_fields, split_page, list_response
 
 router = APIRouter(prefix="/plans", tags=["plans"])
-security = HTTPBearer()
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload["user_id"]
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Plan headers plus their items in one LEFT JOIN; plans without items yield
+# one row with NULL item columns. `{plans}` is the (paged) header query, so
+# the join and final sort only touch the plans on the requested page.
+PLAN_ITEMS_QUERY = """
+    SELECT mp.id, mp.user_id, mp.start_date, mpi.day, mpi.meal_id, mpi.meal_type
+    FROM ({plans}) mp
+    LEFT JOIN meal_plan_items mpi ON mpi.meal_plan_id = mp.id
+    ORDER BY mp.start_date, mp.id, mpi.id
+"""
+
+def rows_to_plans(rows) -> List[MealPlanOut]:
+    """Group joined plan/item rows (ordered by plan) into MealPlanOut objects"""
+    plans: List[MealPlanOut] = []
+    for plan_id, plan_rows in groupby(rows, key=lambda row: row[0]):
+        plan_rows = list(plan_rows)
+        first = plan_rows[0]
+        items = [
+            MealPlanItemBase(day=row[3], meal_id=row[4], meal_type=row[5] or 'Breakfast')
+            for row in plan_rows if row[3] is not None
+        ]
+        plans.append(MealPlanOut(id=plan_id, user_id=first[1], start_date=date.fromisoformat(first[2]), items=items))
+    return plans
 
 @router.post("/", response_model=MealPlanOut)
-async def create_plan(plan: MealPlanCreate, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "INSERT INTO meal_plans (user_id, start_date) VALUES (?, ?)",
-            (user_id, plan.start_date.isoformat())
-        )
-        await db.commit()
-        plan_id = cursor.lastrowid
-        for item in plan.items:
-            await db.execute(
-                "INSERT INTO meal_plan_items (meal_plan_id, day, meal_id, meal_type) VALUES (?, ?, ?, ?)",
-                (plan_id, item.day, item.meal_id, item.meal_type or 'Breakfast')
-            )
-        await db.commit()
+async def create_plan(plan: MealPlanCreate, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    # Header and items are written in a single transaction
+    cursor = await db.execute(
+        "INSERT INTO meal_plans (user_id, start_date) VALUES (?, ?)",
+        (user_id, plan.start_date.isoformat())
+    )
+    plan_id = cursor.lastrowid
+    await db.executemany(
+        "INSERT INTO meal_plan_items (meal_plan_id, day, meal_id, meal_type) VALUES (?, ?, ?, ?)",
+        [(plan_id, item.day, item.meal_id, item.meal_type or 'Breakfast') for item in plan.items]
+    )
+    await db.commit()
     return MealPlanOut(id=plan_id, user_id=user_id, start_date=plan.start_date, items=plan.items)
 
 @router.get("/", response_model=List[MealPlanOut])
-async def list_plans(user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id, start_date FROM meal_plans WHERE user_id = ?", (user_id,))
-        plans = await cursor.fetchall()
-        result = []
-        for plan in plans:
-            plan_id, start_date_str = plan
-            cursor2 = await db.execute("SELECT day, meal_id, meal_type FROM meal_plan_items WHERE meal_plan_id = ?", (plan_id,))
-            items = [MealPlanItemBase(day=row[0], meal_id=row[1], meal_type=row[2] or 'Breakfast') for row in await cursor2.fetchall()]
-            result.append(MealPlanOut(id=plan_id, user_id=user_id, start_date=date.fromisoformat(start_date_str), items=items))
-    return result
+async def list_plans(
+    page: PageParams = Depends(),
+    date_from: Optional[date] = Query(None, alias="from", description="Earliest start_date (inclusive)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Latest start_date (inclusive)"),
+    user_id: int = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    fields = parse_fields(page.fields, MealPlanOut.__fields__)
+    after = decode_cursor(page.after, 2)
+    plans_query = "SELECT id, user_id, start_date FROM meal_plans WHERE user_id = ?"
+    params = [user_id]
+    if date_from:
+        plans_query += " AND start_date >= ?"
+        params.append(date_from.isoformat())
+    if date_to:
+        plans_query += " AND start_date <= ?"
+        params.append(date_to.isoformat())
+    if after:
+        plans_query += " AND (start_date, id) > (?, ?)"
+        params.extend(after)
+    plans_query += " ORDER BY start_date, id"
+    if page.limit:
+        plans_query += " LIMIT ?"
+        params.append(page.limit + 1)
+
+    if fields is None or "items" in fields:
+        cursor = await db.execute(PLAN_ITEMS_QUERY.format(plans=plans_query), params)
+    else:
+        # Headers only: skip the join entirely
+        cursor = await db.execute(
+            f"SELECT id, user_id, start_date, NULL, NULL, NULL FROM ({plans_query})", params
+        )
+    plans = rows_to_plans(await cursor.fetchall())
+    plans, has_more = split_page(plans, page.limit)
+    next_cursor = encode_cursor([plans[-1].start_date.isoformat(), plans[-1].id]) if has_more else None
+    return list_response(plans, fields, next_cursor)
 
 @router.get("/{plan_id}", response_model=MealPlanOut)
-async def get_plan(plan_id: int, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT id, user_id, start_date FROM meal_plans WHERE id = ? AND user_id = ?", (plan_id, user_id))
-        plan = await cursor.fetchone()
-        if not plan:
-            raise HTTPException(status_code=404, detail="Meal plan not found")
-        
-        plan_id, owner_id, start_date_str = plan
-        cursor2 = await db.execute("SELECT day, meal_id, meal_type FROM meal_plan_items WHERE meal_plan_id = ?", (plan_id,))
-        items = [MealPlanItemBase(day=row[0], meal_id=row[1], meal_type=row[2] or 'Breakfast') for row in await cursor2.fetchall()]
-        
-        return MealPlanOut(id=plan_id, user_id=owner_id, start_date=date.fromisoformat(start_date_str), items=items)
+async def get_plan(plan_id: int, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    cursor = await db.execute(
+        PLAN_ITEMS_QUERY.format(plans="SELECT id, user_id, start_date FROM meal_plans WHERE id = ? AND user_id = ?"),
+        (plan_id, user_id)
+    )
+    plans = rows_to_plans(await cursor.fetchall())
+    if not plans:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
+    return plans[0]
+
+@router.get("/{plan_id}/expanded", response_model=MealPlanExpandedOut)
+async def get_plan_expanded(plan_id: int, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    """Get a meal plan with each item's full meal inlined"""
+    cursor = await db.execute(
+        f"""SELECT mp.id, mp.start_date, mpi.day, mpi.meal_id, mpi.meal_type,
+                   {", ".join("m." + col for col in MEAL_COLUMNS.split(", "))}
+            FROM meal_plans mp
+            LEFT JOIN meal_plan_items mpi ON mpi.meal_plan_id = mp.id
+            LEFT JOIN meals m ON m.id = mpi.meal_id
+            WHERE mp.id = ? AND mp.user_id = ?
+            ORDER BY mpi.id""",
+        (plan_id, user_id)
+    )
+    rows = await cursor.fetchall()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
+
+    items = [
+        MealPlanItemExpanded(
+            day=row[2],
+            meal_id=row[3],
+            meal_type=row[4] or 'Breakfast',
+            meal=row_to_meal(row[5:]) if row[5] is not None else None
+        )
+        for row in rows if row[2] is not None
+    ]
+    return MealPlanExpandedOut(id=rows[0][0], user_id=user_id, start_date=date.fromisoformat(rows[0][1]), items=items)
 
 @router.delete("/{plan_id}")
-async def delete_plan(plan_id: int, user_id: int = Depends(get_current_user)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM meal_plan_items WHERE meal_plan_id = ?", (plan_id,))
-        await db.execute("DELETE FROM meal_plans WHERE id = ? AND user_id = ?", (plan_id, user_id))
-        await db.commit()
+async def delete_plan(plan_id: int, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
+    await db.execute("DELETE FROM meal_plan_items WHERE meal_plan_id = ?", (plan_id,))
+    await db.execute("DELETE FROM meal_plans WHERE id = ? AND user_id = ?", (plan_id, user_id))
+    await db.commit()
     return {"message": "Meal plan deleted"}
 
 @router.post("/{plan_id}/add-meal")
-async def add_meal_to_plan(plan_id: int, item: MealPlanItemBase, user_id: int = Depends(get_current_user)):
+async def add_meal_to_plan(plan_id: int, item: MealPlanItemBase, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
     # Check that the plan belongs to the user
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT user_id FROM meal_plans WHERE id = ?", (plan_id,))
-        row = await cursor.fetchone()
-        if not row or row[0] != user_id:
-            raise HTTPException(status_code=404, detail="Meal plan not found")
-        # Insert the meal into the plan
-        await db.execute(
-            "INSERT INTO meal_plan_items (meal_plan_id, day, meal_id, meal_type) VALUES (?, ?, ?, ?)",
-            (plan_id, item.day, item.meal_id, item.meal_type or 'Breakfast')
-        )
-        await db.commit()
+    cursor = await db.execute("SELECT user_id FROM meal_plans WHERE id = ?", (plan_id,))
+    row = await cursor.fetchone()
+    if not row or row[0] != user_id:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
+    # Insert the meal into the plan
+    await db.execute(
+        "INSERT INTO meal_plan_items (meal_plan_id, day, meal_id, meal_type) VALUES (?, ?, ?, ?)",
+        (plan_id, item.day, item.meal_id, item.meal_type or 'Breakfast')
+    )
+    await db.commit()
     return {"message": "Meal added to plan", "plan_id": plan_id, "day": item.day, "meal_id": item.meal_id}
 
 @router.delete("/{plan_id}/meals/{meal_id}")
@@ -92,28 +154,28 @@ async def remove_meal_from_plan(
     meal_id: int, 
     day: int, 
     meal_type: str, 
-    user_id: int = Depends(get_current_user)
+    user_id: int = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db)
 ):
     """Remove a specific meal from a meal plan for a specific day and meal type"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Verify plan belongs to user
-        cursor = await db.execute("SELECT user_id FROM meal_plans WHERE id = ?", (plan_id,))
-        row = await cursor.fetchone()
-        if not row or row[0] != user_id:
-            raise HTTPException(status_code=404, detail="Meal plan not found")
-        
-        # Find the first matching item's rowid
-        cursor = await db.execute(
-            """SELECT rowid FROM meal_plan_items 
-               WHERE meal_plan_id = ? AND meal_id = ? AND day = ? AND meal_type = ?
-               LIMIT 1""",
-            (plan_id, meal_id, day, meal_type)
-        )
-        row = await cursor.fetchone()
-        
-        if row:
-            # Delete by rowid to remove only one instance
-            await db.execute("DELETE FROM meal_plan_items WHERE rowid = ?", (row[0],))
-            await db.commit()
-    
+    # Verify plan belongs to user
+    cursor = await db.execute("SELECT user_id FROM meal_plans WHERE id = ?", (plan_id,))
+    row = await cursor.fetchone()
+    if not row or row[0] != user_id:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
+
+    # Find the first matching item's rowid
+    cursor = await db.execute(
+        """SELECT rowid FROM meal_plan_items 
+           WHERE meal_plan_id = ? AND meal_id = ? AND day = ? AND meal_type = ?
+           LIMIT 1""",
+        (plan_id, meal_id, day, meal_type)
+    )
+    row = await cursor.fetchone()
+
+    if row:
+        # Delete by rowid to remove only one instance
+        await db.execute("DELETE FROM meal_plan_items WHERE rowid = ?", (row[0],))
+        await db.commit()
+
     return {"message": "Meal removed from plan"} 
\ No newline at end of file
@@ -0,0 +1,190 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import aiosqlite
+
+from database import pool
+
+# The AI Chef prompt depends on the user's pantry, preferences, utensils and
+# the last few chat turns. That context is rendered once and kept here until
+# one of the pantry/utensils/profile write endpoints invalidates it; the TTL
+# bounds staleness when another worker process handled the write.
+PROMPT_CONTEXT_CACHE_SIZE = int(os.getenv("PROMPT_CONTEXT_CACHE_SIZE", "1024"))
+PROMPT_CONTEXT_TTL = int(os.getenv("PROMPT_CONTEXT_TTL", "300"))
+RECENT_MESSAGES = 5
+MAX_PANTRY_ITEMS = 30
+MAX_UTENSILS = 25
+
+SYSTEM_PROMPT = (
+    "You are a helpful cooking assistant AI Chef. Return STRICT JSON ONLY. No markdown, no prose.\n\n"
+    "When the user asks for recipes, respond with EXACTLY this JSON object shape:\n"
+    "{\n  \"recipes\": [\n    {\n      \"name\": \"Descriptive Recipe Name\",\n      \"ingredients\": [\"ingredient with quantity\", \"ingredient\"],\n      \"instructions\": \"Sentence 1.\\nSentence 2.\\nSentence 3.\",\n      \"nutrients\": {\"calories\": 450, \"protein\": 30, \"carbs\": 60, \"fat\": 15},\n      \"prep_time\": 15,\n      \"cook_time\": 25,\n      \"image\": \"\",\n      \"id\": 1\n    }\n  ],\n  \"follow_up\": \"A short, friendly follow-up question\"\n}\n\n"
+    "Rules for instructions: write clear sentences separated by \n, DO NOT prefix with numbers or bullets (no '1.', '-', '•'). Avoid quotes inside sentences when possible. No trailing commas anywhere.\n\n"
+    "If the user asks a cooking question (not recipes), reply with a JSON object: {\"answer\": \"text\", \"recipes\": [] } and keep it short.\n\n"
+    "Apply dietary and equipment rules strictly.\n"
+)
+
+
+class ChatContext(NamedTuple):
+    """Everything about the user's kitchen and conversation that shapes the prompt."""
+    pantry: List[str]
+    dietary: Tuple[Optional[str], Optional[str], Optional[str]]  # diet type, allergies, cuisines
+    utensils: List[str]
+    recent: List[dict]
+    system_prompt: str
+
+
+async def fetch_user_pantry_items(db: aiosqlite.Connection, user_id: int) -> List[str]:
+    query = "SELECT name FROM pantry_items WHERE user_id = ?"
+    cursor = await db.execute(query, (user_id,))
+    rows = await cursor.fetchall()
+    return [row[0] for row in rows]
+
+
+async def fetch_user_utensils(db: aiosqlite.Connection, user_id: int) -> List[str]:
+    query = "SELECT name, category FROM utensils WHERE user_id = ?"
+    cursor = await db.execute(query, (user_id,))
+    rows = await cursor.fetchall()
+    return [f"{row[0]} ({row[1]})" for row in rows]
+
+
+async def get_recent_messages(db: aiosqlite.Connection, user_id: int, limit: int = RECENT_MESSAGES) -> List[dict]:
+    try:
+        cursor = await db.execute(
+            "SELECT role, content FROM chat_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit),
+        )
+        rows = await cursor.fetchall()
+        # Reverse to chronological order
+        return [{"role": row[0], "content": row[1]} for row in rows[::-1]]
+    except Exception as e:
+        print(f"Failed to load chat messages: {e}")
+        return []
+
+
+def dietary_from_user(user: Dict) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    return (user.get("dietary_preferences"), user.get("allergies"), user.get("cuisine_preferences"))
+
+
+def render_system_prompt(pantry: List[str], dietary: Tuple, utensils: List[str]) -> str:
+    pantry_context = ""
+    dietary_context = ""
+    utensils_context = ""
+
+    if pantry:
+        formatted = [f"- {name}" for name in pantry]
+        pantry_context = "\nUser pantry items:\n" + "\n".join(formatted)
+
+    diet_type, allergies, cuisines = dietary
+    dietary_parts = []
+    if diet_type:
+        dietary_parts.append(f"Diet Type: {diet_type}")
+    if allergies:
+        dietary_parts.append(f"⚠️ ALLERGIES (MUST AVOID): {allergies}")
+    if cuisines:
+        dietary_parts.append(f"Preferred Cuisines: {cuisines}")
+    if dietary_parts:
+        dietary_context = "\n\nUser Dietary Preferences:\n" + "\n".join(dietary_parts)
+
+    if utensils:
+        formatted = [f"- {name}" for name in utensils]
+        utensils_context = "\n\nAvailable Kitchen Utensils:\n" + "\n".join(formatted)
+
+    return SYSTEM_PROMPT + dietary_context + pantry_context + utensils_context
+
+
+class PromptContextCache:
+    """Per-user LRU of rendered ChatContext objects.
+
+    invalidate_user stamps the user with a new value from a global counter,
+    so a load that raced with a write is not stored over the newer state.
+    Stamps are kept in an LRU of the same size as the entries; an evicted
+    stamp raises the floor every unstamped user reports, which can only make
+    an in-flight load skip storing, never store stale state.
+    """
+
+    def __init__(self, max_entries: int = PROMPT_CONTEXT_CACHE_SIZE, ttl: int = PROMPT_CONTEXT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, ChatContext]]" = OrderedDict()
+        self._generations: "OrderedDict[int, int]" = OrderedDict()
+        self._counter = 0
+        self._generation_floor = 0
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, self._generation_floor)
+
+    def get(self, user_id: int) -> Optional[ChatContext]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, context = entry
+        if expires_at <= time.time():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return context
+
+    def put(self, user_id: int, context: ChatContext, generation: int) -> None:
+        if generation != self.generation(user_id):
+            return
+        self._entries[user_id] = (time.time() + self.ttl, context)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_turn(self, user_id: int, question: str, answer: str) -> None:
+        """Append a persisted chat turn to the cached context instead of reloading it."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        expires_at, context = entry
+        recent = context.recent + [
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": answer},
+        ]
+        self._entries[user_id] = (expires_at, context._replace(recent=recent[-RECENT_MESSAGES:]))
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._counter += 1
+        self._generations[user_id] = self._counter
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.max_entries:
+            _, evicted = self._generations.popitem(last=False)
+            self._generation_floor = max(self._generation_floor, evicted)
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._generations.clear()
+        self._generation_floor = self._counter
+
+
+prompt_context_cache = PromptContextCache()
+
+
+async def load_chat_context(user_id: int, user: Dict) -> ChatContext:
+    """Cached prompt context for the user; a miss loads all inputs in one batch."""
+    dietary = dietary_from_user(user)
+    context = prompt_context_cache.get(user_id)
+    if context is not None and context.dietary == dietary:
+        return context
+
+    generation = prompt_context_cache.generation(user_id)
+    # One pooled connection; the three queries are queued together rather than
+    # awaited one after another
+    async with pool.acquire() as db:
+        recent, pantry, utensils = await asyncio.gather(
+            get_recent_messages(db, user_id),
+            fetch_user_pantry_items(db, user_id),
+            fetch_user_utensils(db, user_id),
+        )
+    # Limit pantry items and utensils added to the prompt to reduce tokens
+    pantry = pantry[:MAX_PANTRY_ITEMS]
+    utensils = utensils[:MAX_UTENSILS]
+    context = ChatContext(pantry, dietary, utensils, recent, render_system_prompt(pantry, dietary, utensils))
+    prompt_context_cache.put(user_id, context, generation)
+    return context
@@ -0,0 +1,82 @@
+import json
+from typing import Dict, List, Optional
+
+
+class RecipeStreamParser:
+    """Incrementally pull recipe objects out of a streamed `{"recipes": [...]}` reply.
+
+    Feed it completion deltas as they arrive; each call returns the recipes
+    whose JSON object closed within that chunk. Only brace/bracket depth and
+    string state are tracked, so the cost is linear in the reply length.
+    """
+
+    def __init__(self, key: str = "recipes"):
+        self.key = key
+        self.text = ""
+        self.count = 0
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._object_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict]:
+        self.text += chunk
+        text = self.text
+        found: List[Dict] = []
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_string = text[self._string_start:i]
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif ch == ":" and len(self._stack) == 1:
+                self._current_key = self._last_string
+            elif ch in "{[":
+                if (
+                    ch == "{"
+                    and self._array_depth is not None
+                    and len(self._stack) == self._array_depth
+                ):
+                    self._object_start = i
+                self._stack.append(ch)
+                if ch == "[" and len(self._stack) == 2 and self._current_key == self.key:
+                    self._array_depth = 2
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and self._object_start is not None and len(self._stack) == self._array_depth:
+                    recipe = self._load(text[self._object_start:i + 1])
+                    self._object_start = None
+                    if recipe is not None:
+                        found.append(recipe)
+                elif ch == "]" and self._array_depth is not None and len(self._stack) < self._array_depth:
+                    self._array_depth = None
+                if len(self._stack) == 1:
+                    self._current_key = None
+        self._pos = len(text)
+        return found
+
+    def _load(self, raw: str) -> Optional[Dict]:
+        try:
+            recipe = json.loads(raw)
+        except json.JSONDecodeError as e:
+            print(f"Skipping malformed streamed recipe: {e}")
+            return None
+        if not isinstance(recipe, dict):
+            return None
+        self.count += 1
+        return recipe
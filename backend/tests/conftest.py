@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# No model loading, Redis or real OpenAI calls during tests
+os.environ.setdefault("YOLO_PRELOAD", "0")
+os.environ.setdefault("REDIS_DISABLED", "1")
+os.environ.pop("OPENAI_API_KEY", None)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory so app.db and uploaded_images are per-test."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("uploaded_images", exist_ok=True)
+    return tmp_path
+
+
+@pytest.fixture
+def db_path(workdir):
+    """A fully migrated database file."""
+    from database import DB_PATH, init_db
+
+    asyncio.run(init_db())
+    return os.path.join(workdir, DB_PATH)
+
+
+@pytest.fixture
+def client(workdir):
+    from fastapi.testclient import TestClient
+    from auth import token_cache
+    from answer_cache import answer_cache
+    from image_cache import recipe_image_cache
+    from prompt_context import prompt_context_cache
+    import main
+
+    # Process-wide caches would otherwise leak rows from the previous test's database
+    token_cache.clear()
+    prompt_context_cache.clear()
+    answer_cache.clear()
+    recipe_image_cache.clear()
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def _openai_server():
+    from openai_stub import OpenAIStub
+
+    stub = OpenAIStub()
+    stub.start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def openai_stub(_openai_server, monkeypatch):
+    """Points the shared OpenAI client at a local stub server."""
+    import openai_client
+    from openai_stub import RECIPES
+
+    _openai_server.requests.clear()
+    _openai_server.peak_in_flight = 0
+    _openai_server.delay = 0.0
+    _openai_server.content = json.dumps(RECIPES)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", _openai_server.base_url)
+    monkeypatch.setattr(openai_client, "OPENAI_MAX_RETRIES", 0)
+    # The client and semaphore bind to an event loop; each test gets its own
+    monkeypatch.setattr(openai_client, "_client", None)
+    monkeypatch.setattr(openai_client, "_semaphore", None)
+    return _openai_server
+
+
+def register(client, username: str = "alice", password: str = "pw") -> dict:
+    client.post("/auth/register", json={"username": username, "password": password})
+    r = client.post("/auth/login", json={"username": username, "password": password})
+    assert r.status_code == 200, r.text
+    return {"Authorization": "Bearer " + r.json()["access_token"]}
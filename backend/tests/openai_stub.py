@@ -0,0 +1,81 @@
+"""Minimal OpenAI-compatible chat completions server for tests."""
+import json
+import time
+import socket
+import asyncio
+import threading
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+RECIPES = {
+    "recipes": [
+        {"name": "Tomato Soup", "ingredients": ["tomato", "onion"], "instructions": "Simmer"},
+        {"name": "Omelette", "ingredients": ["egg"], "instructions": "Fry"},
+    ],
+    "follow_up": "Anything else?",
+}
+
+
+class OpenAIStub:
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.delay = 0.0  # seconds before answering non-streamed completions
+        self.content = json.dumps(RECIPES)
+        self.app = FastAPI()
+        self.app.post("/v1/chat/completions")(self._completions)
+        self._server = None
+        self._thread = None
+        self.base_url = None
+
+    def _completion(self, model: str) -> dict:
+        return {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    async def _completions(self, request: Request):
+        body = await request.json()
+        self.requests.append(body)
+        if body.get("stream"):
+            content = self.content
+
+            async def chunks():
+                for i in range(0, len(content), 7):
+                    chunk = {
+                        "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + 7]}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return self._completion(body["model"])
+
+    def start(self) -> None:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.time() + 10
+        while not self._server.started:
+            if time.time() > deadline:
+                raise RuntimeError("OpenAI stub did not start")
+            time.sleep(0.01)
+        self.base_url = f"http://127.0.0.1:{port}/v1"
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(5)
@@ -0,0 +1,48 @@
+import json
+
+from answer_cache import answer_cache
+from conftest import register
+
+# No ingredients, so no image generation jobs are queued
+REPLY = {"recipes": [{"name": "Tomato Soup", "instructions": "Simmer"}], "follow_up": "Anything else?"}
+
+
+def test_repeated_question_is_answered_from_the_cache(client, openai_stub):
+    openai_stub.content = json.dumps(REPLY)
+    headers = register(client)
+
+    first = client.post("/ask-ai/", json={"question": "What can I cook?"}, headers=headers)
+    assert first.status_code == 200
+    # The first exchange is now part of the chat history; asking it again still hits
+    second = client.post("/ask-ai/", json={"question": "  what can I cook"}, headers=headers)
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert len(openai_stub.requests) == 1
+    assert answer_cache.stats()["hits"] == 1
+
+
+def test_pantry_change_misses_the_cache(client, openai_stub):
+    openai_stub.content = json.dumps(REPLY)
+    headers = register(client)
+
+    client.post("/ask-ai/", json={"question": "What can I cook?"}, headers=headers)
+    client.post("/pantry/", json={"name": "Eggs"}, headers=headers)
+    client.post("/ask-ai/", json={"question": "What can I cook?"}, headers=headers)
+    assert len(openai_stub.requests) == 2
+
+
+def test_follow_ups_are_cached_per_conversation(client, openai_stub):
+    openai_stub.content = json.dumps(REPLY)
+    alice = register(client, "alice")
+    bob = register(client, "bob")
+
+    client.post("/ask-ai/", json={"question": "Soup ideas?"}, headers=alice)
+    client.post("/ask-ai/", json={"question": "Another one"}, headers=alice)
+    # Same kitchen, same follow-up, but after a different question
+    client.post("/ask-ai/", json={"question": "Salad ideas?"}, headers=bob)
+    client.post("/ask-ai/", json={"question": "Another one"}, headers=bob)
+    assert len(openai_stub.requests) == 4
+
+    # A different history before the same question misses too
+    client.post("/ask-ai/", json={"question": "Soup ideas?"}, headers=bob)
+    assert len(openai_stub.requests) == 5
@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+
+import auth
+from conftest import register
+from database import pool
+
+
+@pytest.fixture
+def hash_watch(monkeypatch):
+    """Records how many pooled connections were free while each hash ran."""
+    free = []
+    original = auth.hasher.hash
+
+    async def watched(password):
+        free.append(pool._queue.qsize())
+        return await original(password)
+
+    monkeypatch.setattr(auth.hasher, "hash", watched)
+    return free
+
+
+def test_register_releases_connection_while_hashing(client, hash_watch):
+    assert client.post("/auth/register", json={"username": "bob", "password": "pw"}).status_code == 200
+    assert hash_watch == [pool.size]
+
+
+def test_usernames_are_unique_ignoring_case(client):
+    assert client.post("/auth/register", json={"username": "Bob", "password": "pw"}).status_code == 200
+    r = client.post("/auth/register", json={"username": "bob", "password": "pw"})
+    assert r.status_code == 400
+    # The database enforces it too, for registrations racing past the lookup
+    with sqlite3.connect("app.db") as db, pytest.raises(sqlite3.IntegrityError):
+        db.execute("INSERT INTO users (username, password_hash) VALUES ('BOB', 'x')")
+
+
+def test_reset_password_is_single_use(client, hash_watch):
+    register(client, "carol", "old")
+    token = client.post("/auth/forgot-password", json={"username": "carol"}).json()["reset_token"]
+
+    r = client.post("/auth/reset-password", json={"token": token, "new_password": "new"})
+    assert r.status_code == 200
+    assert hash_watch[-1] == pool.size
+    assert client.post("/auth/login", json={"username": "carol", "password": "new"}).status_code == 200
+    assert client.post("/auth/login", json={"username": "carol", "password": "old"}).status_code == 401
+
+    r = client.post("/auth/reset-password", json={"token": token, "new_password": "again"})
+    assert r.status_code == 400
+
+
+def test_unique_username_migration_waits_for_duplicates_to_be_resolved(workdir):
+    import asyncio
+    from database import CREATE_USERS, init_db
+
+    with sqlite3.connect("app.db") as db:
+        db.execute(CREATE_USERS)
+        db.executemany("INSERT INTO users (username, password_hash) VALUES (?, 'x')", [("dave",), ("Dave",)])
+    asyncio.run(init_db())
+    with sqlite3.connect("app.db") as db:
+        versions = {row[0] for row in db.execute("SELECT version FROM schema_version")}
+        assert 6 not in versions and {1, 2, 3, 4, 5} <= versions
+        assert db.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 2
+        db.execute("DELETE FROM users WHERE username = 'Dave'")
+
+    # Retried on the next startup once the duplicates are gone
+    asyncio.run(init_db())
+    with sqlite3.connect("app.db") as db:
+        assert 6 in {row[0] for row in db.execute("SELECT version FROM schema_version")}
+        with pytest.raises(sqlite3.IntegrityError):
+            db.execute("INSERT INTO users (username, password_hash) VALUES ('DAVE', 'x')")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+def test_profile_reads_pick_up_writes_from_other_workers(client, monkeypatch):
+    headers = register(client)
+    r = client.put("/profile/", json={"daily_calorie_goal": 2000}, headers=headers)
+    assert r.status_code == 200
+    # The worker that handled the write sees it at once
+    assert client.get("/profile/", headers=headers).json()["daily_calorie_goal"] == 2000
+
+    clock = Clock()
+    monkeypatch.setattr(auth, "time", clock)
+    decodes = []
+    decode = auth.jwt.decode
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **kw: decodes.append(1) or decode(*a, **kw))
+    auth.token_cache.clear()
+    assert client.get("/profile/", headers=headers).json()["daily_calorie_goal"] == 2000
+
+    # Another worker updates the row; this worker's cache doesn't know
+    with sqlite3.connect("app.db") as db:
+        db.execute("UPDATE users SET daily_calorie_goal = 1800 WHERE username = 'alice'")
+    assert client.get("/profile/", headers=headers).json()["daily_calorie_goal"] == 2000
+
+    clock.now += auth.TOKEN_USER_TTL
+    assert client.get("/profile/", headers=headers).json()["daily_calorie_goal"] == 1800
+    assert client.get("/profile/nutrition/analytics", headers=headers).json()["goals"]["calories"] == 1800
+    # The signature was only verified once; refreshing the row didn't redo it
+    assert decodes == [1]
@@ -0,0 +1,56 @@
+import io
+import asyncio
+
+from PIL import Image
+
+import detection_images
+import yolo_detection
+from detection_images import MODEL_MAX_SIDE, OCR_MAX_SIDE, _decode, decode_for_detection, decode_for_ocr
+
+
+def jpeg(size, orientation=None) -> bytes:
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, (120, 160, 90)).save(buf, format="JPEG", quality=70, exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def test_each_rendition_uses_its_own_draft_scale():
+    data = jpeg((6000, 4000))  # 24 MP
+    model_decode, original_size = _decode(data, MODEL_MAX_SIDE)
+    assert original_size == (6000, 4000)
+    assert model_decode.size == (750, 500)  # 1/8 scale
+    assert _decode(data, OCR_MAX_SIDE)[0].size == (3000, 2000)  # 1/2 scale
+
+    images = decode_for_detection(data)
+    assert images.model.size == (640, 426)
+    assert images.data is data
+    assert max(decode_for_ocr(data).size) <= OCR_MAX_SIDE * detection_images.OCR_SLACK
+
+
+def test_exif_rotation_is_applied():
+    images = decode_for_detection(jpeg((1200, 800), orientation=6))
+    assert images.model.size == (426, 640)
+    assert decode_for_ocr(jpeg((1200, 800), orientation=6)).size == (800, 1200)
+
+
+def test_ocr_rendition_is_only_decoded_when_the_gate_passes(monkeypatch):
+    decoded = []
+
+    async def decode_ocr(data):
+        decoded.append(data)
+        return decode_for_ocr(data)
+
+    monkeypatch.setattr(yolo_detection.image_decoder, "decode_ocr", decode_ocr)
+    monkeypatch.setattr(yolo_detection, "extract_text_from_image", lambda image: f"{image.size}")
+    images = decode_for_detection(jpeg((1200, 800)))
+
+    monkeypatch.setattr(yolo_detection, "likely_has_text", lambda image: False)
+    assert asyncio.run(yolo_detection.read_text(images)) == (None, True)
+    assert decoded == []
+
+    monkeypatch.setattr(yolo_detection, "likely_has_text", lambda image: True)
+    assert asyncio.run(yolo_detection.read_text(images)) == ("(1200, 800)", False)
+    assert decoded == [images.data]
@@ -0,0 +1,91 @@
+import json
+import asyncio
+import sqlite3
+
+from image_cache import make_image_cache_key, recipe_image_cache
+
+INGREDIENTS = ["tomato", "onion"]
+
+
+class FakeRedis:
+    """Just the get/set calls RecipeImageCache makes."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+
+def write_image(name: str) -> str:
+    with open(f"uploaded_images/{name}", "wb") as f:
+        f.write(b"png")
+    return f"uploaded_images/{name}"
+
+
+def test_lookups_fall_through_memory_redis_and_sqlite(client):
+    call = client.portal.call
+    key = make_image_cache_key("Tomato Soup", INGREDIENTS)
+    image = write_image("recipe_soup.png")
+    r = FakeRedis()
+
+    assert call(recipe_image_cache.get, key, r) is None
+    call(recipe_image_cache.put, key, image, "Tomato Soup", INGREDIENTS, r)
+    assert call(recipe_image_cache.get, key, r) == image
+    assert recipe_image_cache.memory_hits == 1
+
+    # Memory gone: Redis answers and refills memory
+    recipe_image_cache.clear()
+    assert call(recipe_image_cache.get, key, r) == image
+    assert recipe_image_cache.redis_hits == 1
+
+    # Memory and Redis gone: the durable table answers and refills Redis
+    recipe_image_cache.clear()
+    r = FakeRedis()
+    assert call(recipe_image_cache.get, key, r) == image
+    assert recipe_image_cache.db_hits == 1
+    assert r.values == {key: image}
+
+
+def test_mapping_to_a_deleted_file_is_dropped(client, db_path):
+    call = client.portal.call
+    key = make_image_cache_key("Tomato Soup", INGREDIENTS)
+    call(recipe_image_cache.put, key, "uploaded_images/recipe_gone.png", "Tomato Soup", INGREDIENTS)
+    recipe_image_cache.clear()
+
+    assert call(recipe_image_cache.get, key) is None
+    with sqlite3.connect(db_path) as db:
+        assert db.execute("SELECT COUNT(*) FROM recipe_images").fetchone()[0] == 0
+
+
+def test_similar_recipe_reuses_the_image(client):
+    call = client.portal.call
+    image = write_image("recipe_soup.png")
+    call(recipe_image_cache.put, make_image_cache_key("Tomato Soup", INGREDIENTS), image, "Tomato Soup", INGREDIENTS)
+
+    key = make_image_cache_key("Tomato Soup", INGREDIENTS + ["basil"])
+    assert call(recipe_image_cache.get_similar, key, "Tomato Soup", INGREDIENTS + ["basil"]) == image
+    # Recorded under the new key, so the next lookup is exact
+    assert call(recipe_image_cache.get, key) == image
+
+
+def test_migration_seeds_recipe_images_from_meals(workdir):
+    from database import CREATE_MEALS, init_db
+
+    image = write_image("recipe_old.png")
+    with sqlite3.connect("app.db") as db:
+        db.execute(CREATE_MEALS)
+        db.executemany(
+            "INSERT INTO meals (name, calories, image, ingredients) VALUES (?, 100, ?, ?)",
+            [
+                ("Tomato Soup", image, json.dumps(INGREDIENTS)),
+                ("Missing File", "uploaded_images/recipe_missing.png", json.dumps(INGREDIENTS)),
+            ],
+        )
+    asyncio.run(init_db())
+    with sqlite3.connect("app.db") as db:
+        rows = db.execute("SELECT cache_key, image_path FROM recipe_images").fetchall()
+    assert rows == [(make_image_cache_key("Tomato Soup", INGREDIENTS), image)]
@@ -0,0 +1,31 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from image_renditions import RENDITION_SIZES, create_renditions
+from image_store import local_path, store_image
+
+
+def test_concurrent_builds_of_the_same_renditions(workdir):
+    source = os.path.join(workdir, "uploaded_images", "recipe_big.png")
+    Image.new("RGB", (1600, 1200), (200, 80, 40)).save(source)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: create_renditions(source, overwrite=True), range(8)))
+
+    targets = results[0]
+    for size, path in targets.items():
+        with Image.open(path) as img:
+            img.load()
+            assert max(img.size) == RENDITION_SIZES[size]
+    leftovers = [n for _, _, names in os.walk("uploaded_images") for n in names if n.endswith(".tmp")]
+    assert leftovers == []
+
+
+def test_content_addressed_renditions_sit_next_to_the_original(workdir):
+    image = store_image(Image.new("RGB", (300, 200), "white"))
+    source = local_path(image)
+    targets = create_renditions(source)
+    assert all(os.path.dirname(path) == os.path.dirname(source) for path in targets.values())
+    assert all(os.path.exists(path) for path in targets.values())
@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from image_store import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, file_response, local_path, store_bytes
+
+DATA = bytes(range(256)) * 4
+
+
+def test_concurrent_stores_of_the_same_bytes(workdir):
+    with ThreadPoolExecutor(8) as pool:
+        paths = set(pool.map(lambda _: store_bytes(DATA, ".png"), range(16)))
+    assert len(paths) == 1
+    stored = local_path(paths.pop())
+    with open(stored, "rb") as f:
+        assert f.read() == DATA
+    assert [n for n in os.listdir(os.path.dirname(stored)) if n.endswith(".tmp")] == []
+
+
+def test_content_addressed_image_is_immutable(client):
+    url = "/static/" + os.path.basename(store_bytes(DATA, ".png"))
+    r = client.get(url)
+    assert r.status_code == 200
+    assert r.content == DATA
+    assert r.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert r.headers["accept-ranges"] == "bytes"
+
+    etag = r.headers["etag"]
+    r = client.get(url, headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+
+
+def test_byte_ranges(client):
+    url = "/static/" + os.path.basename(store_bytes(DATA, ".png"))
+    size = len(DATA)
+
+    r = client.get(url, headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.content == DATA[10:20]
+    assert r.headers["content-range"] == f"bytes 10-19/{size}"
+
+    r = client.get(url, headers={"Range": "bytes=-5"})
+    assert r.status_code == 206
+    assert r.content == DATA[-5:]
+
+    r = client.get(url, headers={"Range": f"bytes={size - 3}-"})
+    assert r.content == DATA[-3:]
+
+    r = client.get(url, headers={"Range": f"bytes={size}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{size}"
+
+    # Multi-range isn't supported: the whole file is served
+    r = client.get(url, headers={"Range": "bytes=0-1,4-5"})
+    assert r.status_code == 200
+    assert r.content == DATA
+
+
+def test_if_range_with_a_stale_etag_serves_the_whole_file(client):
+    url = "/static/" + os.path.basename(store_bytes(DATA, ".png"))
+    etag = client.get(url).headers["etag"]
+
+    r = client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert r.status_code == 206
+    r = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert r.status_code == 200
+    assert r.content == DATA
+
+
+def test_legacy_image_is_revalidated(client):
+    with open("uploaded_images/recipe_old.png", "wb") as f:
+        f.write(DATA)
+    r = client.get("/static/recipe_old.png")
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert client.get("/static/recipe_old.png", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+
+    os.utime("uploaded_images/recipe_old.png", ns=(0, 0))
+    assert client.get("/static/recipe_old.png", headers={"If-None-Match": r.headers["etag"]}).status_code == 200
+
+
+def test_missing_and_hidden_files_are_not_found(client):
+    assert client.get("/static/nope.png").status_code == 404
+    assert client.get("/static/.hidden").status_code == 404
+
+
+def test_head_with_range_sends_headers_only(client):
+    url = "/static/" + os.path.basename(store_bytes(DATA, ".png"))
+    r = client.head(url, headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.content == b""
+    assert r.headers["content-length"] == "10"
+    assert r.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+    assert r.headers["content-type"] == "image/png"
+
+
+def test_head_range_response_has_no_body(workdir):
+    path = local_path(store_bytes(DATA, ".png"))
+    request = Request({"type": "http", "method": "HEAD", "headers": [(b"range", b"bytes=0-9")]})
+    response = file_response(request, path, None, REVALIDATE_CACHE_CONTROL, "image/png")
+    assert response.status_code == 206
+    assert not isinstance(response, StreamingResponse)
+    assert response.body == b""
+    assert response.headers["content-length"] == "10"
@@ -0,0 +1,34 @@
+import sqlite3
+
+from conftest import register
+from test_nutrition import create_meal
+
+
+def search(client, headers, q, **params):
+    r = client.get("/meals/search", params={"q": q, **params}, headers=headers)
+    assert r.status_code == 200, r.text
+    return [m["name"] for m in r.json()]
+
+
+def test_search_matches_prefixes_and_diacritics(client):
+    headers = register(client)
+    create_meal(client, headers, "Crème Brûlée")
+    create_meal(client, headers, "Chicken Curry")
+    assert search(client, headers, "creme") == ["Crème Brûlée"]
+    assert search(client, headers, "chick") == ["Chicken Curry"]
+    assert search(client, headers, "chick", prefix=False) == []
+
+
+def test_fts_index_follows_updates_and_deletes(client):
+    headers = register(client)
+    meal_id = create_meal(client, headers, "Tomato Soup")
+    with sqlite3.connect("app.db") as db:
+        db.execute("UPDATE meals SET name = 'Lentil Stew' WHERE id = ?", (meal_id,))
+    assert search(client, headers, "tomato") == []
+    assert search(client, headers, "lentil") == ["Lentil Stew"]
+
+    with sqlite3.connect("app.db") as db:
+        db.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
+        # The external-content index must agree with the table after the delete
+        db.execute("INSERT INTO meals_fts(meals_fts) VALUES ('integrity-check')")
+    assert search(client, headers, "lentil") == []
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import meals
+from conftest import register
+from database import pool
+from pagination import NEXT_CURSOR_HEADER
+from test_nutrition import create_meal
+
+NAMES = ["Apple Pie", "Bean Chili", "Carrot Cake", "Dal", "Egg Fried Rice"]
+
+
+@pytest.fixture
+def catalog(client, monkeypatch):
+    # Small chunks so every stream spans several keyset queries
+    monkeypatch.setattr(meals, "STREAM_CHUNK_SIZE", 2)
+    headers = register(client)
+    for name in reversed(NAMES):
+        create_meal(client, headers, name)
+    return headers
+
+
+def test_ndjson_stream(client, catalog):
+    r = client.get("/meals/", headers={**catalog, "Accept": "application/x-ndjson"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = r.text.splitlines()
+    assert [json.loads(line)["name"] for line in lines] == NAMES
+
+
+def test_json_array_stream_with_limit_and_cursor(client, catalog):
+    r = client.get("/meals/", params={"stream": 1}, headers=catalog)
+    assert [m["name"] for m in r.json()] == NAMES
+
+    cursor = client.get("/meals/", params={"limit": 2}, headers=catalog).headers[NEXT_CURSOR_HEADER]
+    r = client.get("/meals/", params={"stream": 1, "limit": 3, "after": cursor}, headers=catalog)
+    assert [m["name"] for m in r.json()] == NAMES[2:5]
+
+
+def test_empty_stream_is_valid_json(client):
+    headers = register(client)
+    assert client.get("/meals/", params={"stream": 1}, headers=headers).json() == []
+    assert client.get("/meals/", headers={**headers, "Accept": "application/x-ndjson"}).text == ""
+
+
+def test_stream_projects_fields(client, catalog):
+    r = client.get("/meals/", params={"stream": 1, "fields": "id,name"}, headers=catalog)
+    assert all(set(m) == {"id", "name"} for m in r.json())
+
+
+def test_stream_does_not_hold_a_pooled_connection_between_chunks(client, catalog):
+    async def read_one_chunk():
+        stream = meals.stream_meals(None, None, None, ndjson=True)
+        try:
+            chunk = await stream.__anext__()
+            # The client hasn't asked for more yet: every connection is back in the pool
+            return chunk, pool._queue.qsize()
+        finally:
+            await stream.aclose()
+
+    chunk, idle = client.portal.call(read_one_chunk)
+    assert len(chunk.splitlines()) == 2
+    assert idle == pool.size
@@ -0,0 +1,104 @@
+import sqlite3
+from datetime import date, timedelta
+
+from conftest import register
+
+
+def create_meal(client, headers, name="Oats", calories=300, protein=10, carbs=50, fat=5):
+    r = client.post("/meals/", json={
+        "name": name, "ingredients": ["oats"], "instructions": "cook",
+        "nutrients": {"calories": calories, "protein": protein, "carbs": carbs, "fat": fat},
+    }, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()["id"]
+
+
+def daily_rows():
+    with sqlite3.connect("app.db") as db:
+        return db.execute("SELECT date, calories, protein, meal_count FROM daily_nutrition ORDER BY date").fetchall()
+
+
+def test_today_counts_plans_started_in_earlier_weeks(client):
+    headers = register(client)
+    meal_id = create_meal(client, headers)
+    other_id = create_meal(client, headers, "Soup", calories=200, protein=8, carbs=20, fat=4)
+    today = date.today()
+    started = today - timedelta(weeks=3)
+    client.post("/plans/", json={"start_date": started.isoformat(), "items": [
+        {"day": today.weekday(), "meal_id": meal_id, "meal_type": "Breakfast"},
+        {"day": today.weekday(), "meal_id": other_id, "meal_type": "Dinner"},
+        {"day": (today.weekday() + 1) % 7, "meal_id": other_id, "meal_type": "Lunch"},
+    ]}, headers=headers)
+
+    r = client.get("/profile/nutrition/today", headers=headers)
+    assert r.status_code == 200
+    assert r.json() == {"calories": 500, "protein": 18, "carbs": 70, "fat": 9}
+
+
+def test_today_matches_the_range_endpoint(client):
+    headers = register(client)
+    meal_id = create_meal(client, headers)
+    other_id = create_meal(client, headers, "Soup", calories=200, protein=8, carbs=20, fat=4)
+    today = date.today()
+    client.post("/plans/", json={"start_date": (today - timedelta(weeks=3)).isoformat(), "items": [
+        {"day": today.weekday(), "meal_id": meal_id},
+    ]}, headers=headers)
+    client.post("/plans/", json={"start_date": today.isoformat(), "items": [
+        {"day": today.weekday(), "meal_id": other_id},
+    ]}, headers=headers)
+    # Starts next week, so it doesn't count yet
+    client.post("/plans/", json={"start_date": (today + timedelta(weeks=1)).isoformat(), "items": [
+        {"day": today.weekday(), "meal_id": meal_id},
+    ]}, headers=headers)
+
+    today_totals = client.get("/profile/nutrition/today", headers=headers).json()
+    assert today_totals == {"calories": 500, "protein": 18, "carbs": 70, "fat": 9}
+    r = client.get(f"/profile/nutrition?from={today}&to={today}", headers=headers)
+    assert r.status_code == 200
+    day = r.json()["periods"][0]
+    assert {name: day[name] for name in today_totals} == today_totals
+    assert day["meals"] == 2
+
+
+def test_range_repeats_plans_weekly_from_their_start(client):
+    headers = register(client)
+    meal_id = create_meal(client, headers)
+    # Starts on Wednesday 2026-03-04; its Monday first falls on 2026-03-02
+    client.post("/plans/", json={"start_date": "2026-03-04", "items": [{"day": 0, "meal_id": meal_id}]}, headers=headers)
+
+    r = client.get("/profile/nutrition?from=2026-02-23&to=2026-03-31", headers=headers)
+    calories = {p["start"]: p["calories"] for p in r.json()["periods"] if p["calories"]}
+    assert calories == {d: 300 for d in ("2026-03-02", "2026-03-09", "2026-03-16", "2026-03-23", "2026-03-30")}
+
+    r = client.get("/profile/nutrition?from=2026-03-01&to=2026-03-31&period=month", headers=headers)
+    assert r.json()["totals"]["calories"] == 1500
+    assert r.json()["totals"]["meals"] == 5
+
+
+def test_today_is_zero_without_plans(client):
+    headers = register(client)
+    assert client.get("/profile/nutrition/today", headers=headers).json() == {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
+
+
+def test_daily_rollup_follows_plan_and_meal_writes(client):
+    headers = register(client)
+    meal_id = create_meal(client, headers)
+    monday = date(2026, 3, 2)
+    plan = client.post("/plans/", json={"start_date": (monday + timedelta(days=2)).isoformat(), "items": [
+        {"day": 0, "meal_id": meal_id}, {"day": 0, "meal_id": meal_id, "meal_type": "Dinner"}, {"day": 3, "meal_id": meal_id},
+    ]}, headers=headers).json()
+    assert daily_rows() == [("2026-03-02", 600, 20, 2), ("2026-03-05", 300, 10, 1)]
+
+    # Meal nutrient edits are applied to every day the meal is planned on
+    with sqlite3.connect("app.db") as db:
+        db.execute("UPDATE meals SET calories = 400, protein = 12 WHERE id = ?", (meal_id,))
+    assert daily_rows() == [("2026-03-02", 800, 24, 2), ("2026-03-05", 400, 12, 1)]
+
+    # Removing a day's last item drops that day
+    with sqlite3.connect("app.db") as db:
+        db.execute("DELETE FROM meal_plan_items WHERE meal_plan_id = ? AND day = 3", (plan["id"],))
+    assert daily_rows() == [("2026-03-02", 800, 24, 2)]
+
+    with sqlite3.connect("app.db") as db:
+        db.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
+    assert daily_rows() == []
@@ -0,0 +1,85 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from conftest import register
+from nutrition_analytics import build_daily_arrays, macro_ratios, rolling_mean, run_lengths
+from test_nutrition import create_meal
+
+
+def test_build_daily_arrays_repeats_rows_weekly():
+    start, end = date(2026, 3, 2), date(2026, 3, 17)
+    rows = [
+        ("2026-02-24", 100, 1, 2, 3, 1),  # a Tuesday two weeks before the window
+        ("2026-03-04", 50, 0, 0, 0, 2),  # Wednesday inside the window
+        ("2026-03-11", 25, 0, 0, 0, 1),  # a second plan on the same weekday, a week later
+        ("2026-03-20", 999, 0, 0, 0, 1),  # after the window
+    ]
+    values, meals = build_daily_arrays(rows, start, end)
+    assert values.shape == (16, 4)
+    calories = dict(zip(range(16), values[:, 0]))
+    assert {i: c for i, c in calories.items() if c} == {1: 100, 2: 50, 8: 100, 9: 75, 15: 100}
+    assert values[1].tolist() == [100, 1, 2, 3]
+    assert meals.tolist() == [0, 1, 2, 0, 0, 0, 0, 0, 1, 3, 0, 0, 0, 0, 0, 1]
+
+
+def test_build_daily_arrays_without_rows():
+    values, meals = build_daily_arrays([], date(2026, 3, 2), date(2026, 3, 2))
+    assert values.tolist() == [[0, 0, 0, 0]]
+    assert meals.tolist() == [0]
+
+
+def test_rolling_mean_is_trailing():
+    values = np.array([[2.0], [4.0], [6.0], [8.0]])
+    assert rolling_mean(values, 2)[:, 0].tolist() == [2.0, 3.0, 5.0, 7.0]
+    assert rolling_mean(values, 10)[:, 0].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_macro_ratios_use_energy_per_gram():
+    ratios = macro_ratios(np.array([[0.0, 10.0, 50.0, 5.0], [100.0, 0.0, 0.0, 0.0]]))
+    assert ratios[0] == pytest.approx([40 / 285, 200 / 285, 45 / 285])
+    assert np.isnan(ratios[1]).all()
+
+
+@pytest.mark.parametrize("mask, expected", [
+    ([], (0, 0)),
+    ([False, False], (0, 0)),
+    ([True, True, False, True], (2, 1)),
+    ([True, False, True, True, True, False], (3, 0)),
+    ([True, True, True], (3, 3)),
+])
+def test_run_lengths(mask, expected):
+    assert run_lengths(np.array(mask, dtype=bool)) == expected
+
+
+def test_analytics_endpoint(client):
+    headers = register(client)
+    client.put("/profile/", json={
+        "daily_calorie_goal": 300, "daily_protein_goal": 10, "daily_carbs_goal": 50, "daily_fat_goal": 5,
+    }, headers=headers)
+    oats = create_meal(client, headers)
+    soup = create_meal(client, headers, "Soup", calories=200, protein=8, carbs=20, fat=4)
+    # Started three weeks before the window; repeats weekly into it
+    client.post("/plans/", json={"start_date": "2026-02-09", "items": [
+        {"day": 0, "meal_id": oats}, {"day": 1, "meal_id": oats}, {"day": 2, "meal_id": soup},
+    ]}, headers=headers)
+
+    r = client.get("/profile/nutrition/analytics?from=2026-03-02&to=2026-03-08&window=2", headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["planned_days"] == 3
+    assert body["series"]["values"]["calories"] == [300, 300, 200, 0, 0, 0, 0]
+    assert body["series"]["rolling_average"]["calories"] == [300, 300, 250, 100, 0, 0, 0]
+    assert body["series"]["adherent"] == [True, True, False, False, False, False, False]
+    assert body["streaks"] == {"longest": 2, "current": 0, "calories_longest": 2, "calories_current": 0}
+    summary = body["summary"]
+    assert summary["totals"] == {"calories": 800, "protein": 28, "carbs": 120, "fat": 14}
+    assert summary["adherence_rate"] == pytest.approx(2 / 3, abs=1e-3)
+    assert summary["mean_deviation"]["calories"] == pytest.approx(-1 / 9, abs=1e-3)
+
+
+def test_analytics_rejects_reversed_range(client):
+    headers = register(client)
+    r = client.get("/profile/nutrition/analytics?from=2026-03-08&to=2026-03-02", headers=headers)
+    assert r.status_code == 400
@@ -0,0 +1,81 @@
+import json
+import asyncio
+
+import openai
+import pytest
+
+import openai_client
+from openai_stub import RECIPES
+
+
+def run(coro_fn):
+    """Run a coroutine on a fresh loop and close the shared client afterwards."""
+    async def main():
+        try:
+            return await coro_fn()
+        finally:
+            await openai_client.close_openai_client()
+    return asyncio.run(main())
+
+
+def test_client_is_none_without_api_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(openai_client, "_client", None)
+    assert openai_client.get_openai_client() is None
+    with pytest.raises(RuntimeError):
+        asyncio.run(openai_client.chat_completion(model="m", messages=[]))
+
+
+def test_chat_completion_reuses_one_client(openai_stub):
+    async def main():
+        first = await openai_client.chat_completion(model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}])
+        client = openai_client.get_openai_client()
+        await openai_client.chat_completion(model="gpt-4o-mini", messages=[{"role": "user", "content": "again"}])
+        assert openai_client.get_openai_client() is client
+        return first
+
+    response = run(main)
+    assert json.loads(response.choices[0].message.content) == RECIPES
+    assert [r["messages"][0]["content"] for r in openai_stub.requests] == ["hi", "again"]
+
+
+def test_concurrency_is_capped_by_the_semaphore(openai_stub, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_CONCURRENCY", 2)
+    openai_stub.delay = 0.1
+
+    async def main():
+        await asyncio.gather(*[
+            openai_client.chat_completion(model="m", messages=[{"role": "user", "content": str(i)}]) for i in range(6)
+        ])
+
+    run(main)
+    assert len(openai_stub.requests) == 6
+    assert openai_stub.peak_in_flight == 2
+
+
+def test_timeout_raises_and_frees_the_slot(openai_stub, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_CONCURRENCY", 1)
+    openai_stub.delay = 1.0
+
+    async def main():
+        with pytest.raises(openai.APITimeoutError):
+            await openai_client.chat_completion(model="m", messages=[], timeout=0.1)
+        openai_stub.delay = 0.0
+        # The semaphore slot was released, so the next call is not blocked
+        return await asyncio.wait_for(openai_client.chat_completion(model="m", messages=[]), 5)
+
+    assert run(main).choices[0].message.content
+
+
+def test_stream_yields_deltas_and_releases_the_slot(openai_stub, monkeypatch):
+    monkeypatch.setattr(openai_client, "OPENAI_CONCURRENCY", 1)
+
+    async def main():
+        chunks = [c async for c in openai_client.stream_chat_completion(model="m", messages=[])]
+        assert openai_client._get_semaphore()._value == 1
+        return chunks
+
+    chunks = run(main)
+    assert len(chunks) > 1
+    assert json.loads("".join(chunks)) == RECIPES
+    assert openai_stub.requests[0]["stream"] is True
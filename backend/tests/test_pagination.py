@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import register
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    values = ["Café olé", 42]
+    assert decode_cursor(encode_cursor(values), 2) == values
+    assert decode_cursor(None, 2) is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!", encode_cursor(["a"]), encode_cursor({"a": 1}), encode_cursor([{}, 1]), encode_cursor([["a"], 1]),
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, 2)
+    assert exc.value.status_code == 400
+
+
+def fetch_all_pages(client, url, headers, limit):
+    items, cursor = [], None
+    while True:
+        params = {"limit": limit}
+        if cursor:
+            params["after"] = cursor
+        r = client.get(url, params=params, headers=headers)
+        assert r.status_code == 200, r.text
+        items.extend(r.json())
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return items
+
+
+def test_pantry_unpaged_keeps_insertion_order_and_pages_by_name(client):
+    headers = register(client)
+    names = ["rice", "apple", "milk", "bread", "eggs"]
+    for name in names:
+        client.post("/pantry/", json={"name": name}, headers=headers)
+
+    assert [i["name"] for i in client.get("/pantry/", headers=headers).json()] == names
+    assert [i["name"] for i in fetch_all_pages(client, "/pantry/", headers, 2)] == sorted(names)
+
+
+def test_grocery_unpaged_keeps_insertion_order(client):
+    headers = register(client)
+    names = ["zucchini", "apple", "milk"]
+    for name in names:
+        client.post("/grocery/", json={"name": name}, headers=headers)
+    assert [i["name"] for i in client.get("/grocery/", headers=headers).json()] == names
+
+
+def test_utensil_paging_includes_rows_without_category(client):
+    headers = register(client)
+    for name, category in [("whisk", "Tools"), ("pan", "Cookware"), ("knife", "Cutlery")]:
+        client.post("/utensils/", json={"name": name, "category": category}, headers=headers)
+    with sqlite3.connect("app.db") as db:
+        user_id = db.execute("SELECT id FROM users WHERE username = 'alice'").fetchone()[0]
+        db.executemany(
+            "INSERT INTO utensils (user_id, name, category) VALUES (?, ?, NULL)",
+            [(user_id, "ladle"), (user_id, "tongs")],
+        )
+
+    paged = fetch_all_pages(client, "/utensils/", headers, 2)
+    assert [(u["category"], u["name"]) for u in paged] == [
+        ("Cookware", "pan"), ("Cutlery", "knife"), ("Other", "ladle"), ("Other", "tongs"), ("Tools", "whisk"),
+    ]
+    assert len(client.get("/utensils/", params={"category": "Other"}, headers=headers).json()) == 2
+
+
+def test_crafted_cursor_is_a_400_not_a_500(client):
+    headers = register(client)
+    for url in ("/pantry/", "/utensils/", "/meals/"):
+        size = 3 if url == "/utensils/" else 2
+        r = client.get(url, params={"limit": 2, "after": encode_cursor([{}] * size)}, headers=headers)
+        assert r.status_code == 400, url
+
+
+def test_utensil_list_is_served_by_the_index(client):
+    register(client)
+    with sqlite3.connect("app.db") as db:
+        plan = db.execute(
+            "EXPLAIN QUERY PLAN SELECT id, user_id, name, category FROM utensils "
+            "WHERE user_id = ? AND (category, name, id) > (?, ?, ?) ORDER BY category, name, id LIMIT 3",
+            (1, "Other", "ladle", 4),
+        ).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "idx_utensils_user" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_utensil_category_migration_fills_legacy_nulls(workdir):
+    import asyncio
+    from database import CREATE_USERS, CREATE_UTENSILS, init_db
+
+    with sqlite3.connect("app.db") as db:
+        db.execute(CREATE_USERS)
+        db.execute(CREATE_UTENSILS)
+        db.execute("INSERT INTO utensils (user_id, name, category) VALUES (1, 'ladle', NULL)")
+    asyncio.run(init_db())
+    with sqlite3.connect("app.db") as db:
+        assert db.execute("SELECT category FROM utensils").fetchall() == [("Other",)]
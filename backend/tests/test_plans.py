@@ -0,0 +1,23 @@
+from conftest import register
+from test_nutrition import create_meal
+
+
+def test_plan_items_keep_insertion_order(client):
+    headers = register(client)
+    oats = create_meal(client, headers)
+    soup = create_meal(client, headers, "Soup", calories=200)
+    items = [
+        {"day": 3, "meal_id": soup, "meal_type": "Dinner"},
+        {"day": 0, "meal_id": oats, "meal_type": "Lunch"},
+        {"day": 3, "meal_id": oats, "meal_type": "Breakfast"},
+    ]
+    plan_id = client.post("/plans/", json={"start_date": "2026-03-02", "items": items}, headers=headers).json()["id"]
+    client.post(f"/plans/{plan_id}/add-meal", json={"day": 0, "meal_id": soup, "meal_type": "Breakfast"}, headers=headers)
+    expected = [(i["day"], i["meal_id"], i["meal_type"]) for i in items] + [(0, soup, "Breakfast")]
+
+    def order(plan):
+        return [(i["day"], i["meal_id"], i["meal_type"]) for i in plan["items"]]
+
+    assert order(client.get("/plans/", headers=headers).json()[0]) == expected
+    assert order(client.get(f"/plans/{plan_id}", headers=headers).json()) == expected
+    assert order(client.get(f"/plans/{plan_id}/expanded", headers=headers).json()) == expected
@@ -0,0 +1,36 @@
+from prompt_context import ChatContext, PromptContextCache
+
+
+def context(name: str) -> ChatContext:
+    return ChatContext([name], (None, None, None), [], [], f"prompt for {name}")
+
+
+def test_generations_are_bounded_with_the_entries():
+    cache = PromptContextCache(max_entries=3)
+    for user_id in range(100):
+        cache.invalidate_user(user_id)
+    assert len(cache._generations) == 3
+
+
+def test_racing_load_is_not_stored_after_invalidation():
+    cache = PromptContextCache(max_entries=2)
+    generation = cache.generation(1)
+    cache.invalidate_user(1)
+    cache.put(1, context("stale"), generation)
+    assert cache.get(1) is None
+
+
+def test_racing_load_is_not_stored_after_its_stamp_is_evicted():
+    cache = PromptContextCache(max_entries=2)
+    generation = cache.generation(1)
+    cache.invalidate_user(1)
+    # Other users' writes push user 1's stamp out of the LRU
+    cache.invalidate_user(2)
+    cache.invalidate_user(3)
+    assert 1 not in cache._generations
+    cache.put(1, context("stale"), generation)
+    assert cache.get(1) is None
+
+    # A load that starts afterwards is cached normally
+    cache.put(1, context("fresh"), cache.generation(1))
+    assert cache.get(1).pantry == ["fresh"]
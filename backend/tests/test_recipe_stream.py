@@ -0,0 +1,49 @@
+import json
+
+from recipe_stream import RecipeStreamParser
+
+REPLY = {
+    "answer": "Try these {not a recipe}",
+    "recipes": [
+        {"name": "Say \"cheese\" toast", "ingredients": ["bread", "cheese"], "notes": "use [thick] {slices}"},
+        {"name": "Salad", "nutrition": {"calories": 120, "tags": ["light", "raw"]}},
+    ],
+    "follow_up": "Want more?",
+}
+
+
+def feed_all(parser, text, size):
+    found = []
+    for i in range(0, len(text), size):
+        found.extend(parser.feed(text[i:i + size]))
+    return found
+
+
+def test_recipes_come_out_whatever_the_chunking():
+    text = json.dumps(REPLY)
+    for size in (1, 3, 7, len(text)):
+        parser = RecipeStreamParser()
+        assert feed_all(parser, text, size) == REPLY["recipes"]
+        assert parser.count == 2
+        assert parser.text == text
+
+
+def test_each_recipe_is_emitted_as_soon_as_it_closes():
+    text = json.dumps(REPLY)
+    first_end = text.index("slices}\"}") + len("slices}\"}")
+    parser = RecipeStreamParser()
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [REPLY["recipes"][0]]
+    assert parser.feed(text[first_end:]) == [REPLY["recipes"][1]]
+
+
+def test_objects_outside_the_recipes_array_are_ignored():
+    text = json.dumps({"meta": {"recipes": [{"name": "nested"}]}, "other": [{"name": "x"}], "recipes": [{"name": "real"}]})
+    assert RecipeStreamParser().feed(text) == [{"name": "real"}]
+
+
+def test_non_json_and_malformed_recipes_are_skipped():
+    assert RecipeStreamParser().feed("Sorry, I can't help with that.") == []
+    parser = RecipeStreamParser()
+    assert parser.feed('{"recipes": [{"name": bad}, {"name": "ok"}]}') == [{"name": "ok"}]
+    assert parser.count == 1
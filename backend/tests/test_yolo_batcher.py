@@ -0,0 +1,82 @@
+import queue
+import asyncio
+import threading
+
+import pytest
+
+from yolo_batcher import MicroBatcher
+
+
+def test_concurrent_submits_are_batched():
+    batches = []
+
+    def predict(items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(predict, window_ms=50, max_batch=4)
+
+    async def main():
+        return await asyncio.gather(*[batcher.submit(i) for i in range(6)])
+
+    try:
+        assert asyncio.run(main()) == [0, 2, 4, 6, 8, 10]
+    finally:
+        batcher.shutdown()
+    assert [len(b) for b in batches] == [4, 2]
+    assert batcher.stats()["largest_batch"] == 4
+
+
+def test_failed_batch_is_retried_one_by_one():
+    def predict(items):
+        if len(items) > 1:
+            raise RuntimeError("batch failed")
+        if items[0] == "bad":
+            raise ValueError("bad input")
+        return [items[0].upper()]
+
+    batcher = MicroBatcher(predict, window_ms=50)
+
+    async def main():
+        return await asyncio.gather(*[batcher.submit(i) for i in ("a", "bad", "c")], return_exceptions=True)
+
+    try:
+        a, bad, c = asyncio.run(main())
+    finally:
+        batcher.shutdown()
+    assert (a, c) == ("A", "C")
+    assert isinstance(bad, ValueError)
+
+
+def test_full_queue_rejects_and_shutdown_does_not_block():
+    release = threading.Event()
+    started = threading.Event()
+
+    def predict(items):
+        started.set()
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(predict, window_ms=0, max_batch=1, queue_limit=2)
+
+    async def main():
+        running = asyncio.ensure_future(batcher.submit("running"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        waiting = [asyncio.ensure_future(batcher.submit(i)) for i in ("w1", "w2")]
+        await asyncio.sleep(0)
+        with pytest.raises(queue.Full):
+            await batcher.submit("overflow")
+
+        # The worker is stuck in predict with a full queue; shutdown must return
+        stopper = threading.Thread(target=batcher.shutdown, args=(0.1,))
+        stopper.start()
+        stopper.join(2)
+        assert not stopper.is_alive()
+        release.set()
+
+        for future in waiting:
+            with pytest.raises(RuntimeError, match="shutting down"):
+                await future
+        assert await running == "running"
+
+    asyncio.run(main())
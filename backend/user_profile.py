@@ -1,201 +1,233 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 import aiosqlite
-from database import DB_PATH
+from auth import get_current_user, fetch_user, token_cache
+from database import get_db
+from prompt_context import prompt_context_cache
 from models import UserOut, UserProfileUpdate
-from datetime import date
-from typing import Dict
-
-SECRET_KEY = "supersecretkey"
-ALGORITHM = "HS256"
-security = HTTPBearer()
+import nutrition_analytics
+from datetime import date, timedelta
+from typing import Dict, Optional
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload["user_id"]
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
 @router.get("/", response_model=UserOut)
-async def get_profile(user_id: int = Depends(get_current_user)):
+async def get_profile(request: Request, user_id: int = Depends(get_current_user)):
     """Get the current user's profile information"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            """SELECT id, username, name, email, height, weight, 
-               daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal,
-               breakfast_time, lunch_time, dinner_time, snack_time,
-               dietary_preferences, allergies, cuisine_preferences
-               FROM users WHERE id = ?""",
-            (user_id,)
-        )
-        row = await cursor.fetchone()
-        
-        if not row:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        return UserOut(
-            id=row[0],
-            username=row[1],
-            name=row[2],
-            email=row[3],
-            height=row[4],
-            weight=row[5],
-            daily_calorie_goal=row[6],
-            daily_protein_goal=row[7],
-            daily_carbs_goal=row[8],
-            daily_fat_goal=row[9],
-            breakfast_time=row[10],
-            lunch_time=row[11],
-            dinner_time=row[12],
-            snack_time=row[13],
-            dietary_preferences=row[14],
-            allergies=row[15],
-            cuisine_preferences=row[16]
-        )
+    # The auth dependency already resolved the user row
+    return UserOut(**request.state.user)
 
 @router.put("/", response_model=UserOut)
 async def update_profile(
     profile: UserProfileUpdate,
-    user_id: int = Depends(get_current_user)
+    user_id: int = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db)
 ):
     """Update the current user's profile information"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Build update query dynamically based on provided fields
-        update_fields = []
-        values = []
-        
-        if profile.name is not None:
-            update_fields.append("name = ?")
-            values.append(profile.name)
-        
-        if profile.email is not None:
-            update_fields.append("email = ?")
-            values.append(profile.email)
-        
-        if profile.height is not None:
-            update_fields.append("height = ?")
-            values.append(profile.height)
-        
-        if profile.weight is not None:
-            update_fields.append("weight = ?")
-            values.append(profile.weight)
-        
-        if profile.daily_calorie_goal is not None:
-            update_fields.append("daily_calorie_goal = ?")
-            values.append(profile.daily_calorie_goal)
-        
-        if profile.daily_protein_goal is not None:
-            update_fields.append("daily_protein_goal = ?")
-            values.append(profile.daily_protein_goal)
-        
-        if profile.daily_carbs_goal is not None:
-            update_fields.append("daily_carbs_goal = ?")
-            values.append(profile.daily_carbs_goal)
-        
-        if profile.daily_fat_goal is not None:
-            update_fields.append("daily_fat_goal = ?")
-            values.append(profile.daily_fat_goal)
-        
-        if profile.breakfast_time is not None:
-            update_fields.append("breakfast_time = ?")
-            values.append(profile.breakfast_time)
-        
-        if profile.lunch_time is not None:
-            update_fields.append("lunch_time = ?")
-            values.append(profile.lunch_time)
-        
-        if profile.dinner_time is not None:
-            update_fields.append("dinner_time = ?")
-            values.append(profile.dinner_time)
-        
-        if profile.snack_time is not None:
-            update_fields.append("snack_time = ?")
-            values.append(profile.snack_time)
-        
-        if profile.dietary_preferences is not None:
-            update_fields.append("dietary_preferences = ?")
-            values.append(profile.dietary_preferences)
-        
-        if profile.allergies is not None:
-            update_fields.append("allergies = ?")
-            values.append(profile.allergies)
-        
-        if profile.cuisine_preferences is not None:
-            update_fields.append("cuisine_preferences = ?")
-            values.append(profile.cuisine_preferences)
-        
-        if not update_fields:
-            raise HTTPException(status_code=400, detail="No fields to update")
-        
-        # Add user_id to values for WHERE clause
-        values.append(user_id)
-        
-        query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?"
-        await db.execute(query, values)
-        await db.commit()
-        
-        # Fetch updated profile
-        cursor = await db.execute(
-            """SELECT id, username, name, email, height, weight,
-               daily_calorie_goal, daily_protein_goal, daily_carbs_goal, daily_fat_goal,
-               breakfast_time, lunch_time, dinner_time, snack_time,
-               dietary_preferences, allergies, cuisine_preferences
-               FROM users WHERE id = ?""",
-            (user_id,)
-        )
-        row = await cursor.fetchone()
-        
-        return UserOut(
-            id=row[0],
-            username=row[1],
-            name=row[2],
-            email=row[3],
-            height=row[4],
-            weight=row[5],
-            daily_calorie_goal=row[6],
-            daily_protein_goal=row[7],
-            daily_carbs_goal=row[8],
-            daily_fat_goal=row[9],
-            breakfast_time=row[10],
-            lunch_time=row[11],
-            dinner_time=row[12],
-            snack_time=row[13],
-            dietary_preferences=row[14],
-            allergies=row[15],
-            cuisine_preferences=row[16]
-        )
+    # Build update query dynamically based on provided fields
+    update_fields = []
+    values = []
+
+    if profile.name is not None:
+        update_fields.append("name = ?")
+        values.append(profile.name)
+
+    if profile.email is not None:
+        update_fields.append("email = ?")
+        values.append(profile.email)
+
+    if profile.height is not None:
+        update_fields.append("height = ?")
+        values.append(profile.height)
+
+    if profile.weight is not None:
+        update_fields.append("weight = ?")
+        values.append(profile.weight)
+
+    if profile.daily_calorie_goal is not None:
+        update_fields.append("daily_calorie_goal = ?")
+        values.append(profile.daily_calorie_goal)
+
+    if profile.daily_protein_goal is not None:
+        update_fields.append("daily_protein_goal = ?")
+        values.append(profile.daily_protein_goal)
+
+    if profile.daily_carbs_goal is not None:
+        update_fields.append("daily_carbs_goal = ?")
+        values.append(profile.daily_carbs_goal)
+
+    if profile.daily_fat_goal is not None:
+        update_fields.append("daily_fat_goal = ?")
+        values.append(profile.daily_fat_goal)
+
+    if profile.breakfast_time is not None:
+        update_fields.append("breakfast_time = ?")
+        values.append(profile.breakfast_time)
+
+    if profile.lunch_time is not None:
+        update_fields.append("lunch_time = ?")
+        values.append(profile.lunch_time)
+
+    if profile.dinner_time is not None:
+        update_fields.append("dinner_time = ?")
+        values.append(profile.dinner_time)
+
+    if profile.snack_time is not None:
+        update_fields.append("snack_time = ?")
+        values.append(profile.snack_time)
+
+    if profile.dietary_preferences is not None:
+        update_fields.append("dietary_preferences = ?")
+        values.append(profile.dietary_preferences)
+
+    if profile.allergies is not None:
+        update_fields.append("allergies = ?")
+        values.append(profile.allergies)
+
+    if profile.cuisine_preferences is not None:
+        update_fields.append("cuisine_preferences = ?")
+        values.append(profile.cuisine_preferences)
+
+    if not update_fields:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    # Add user_id to values for WHERE clause
+    values.append(user_id)
+
+    query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = ?"
+    await db.execute(query, values)
+    await db.commit()
+
+    # Cached tokens and prompt context carry the old profile row
+    token_cache.invalidate_user(user_id)
+    prompt_context_cache.invalidate_user(user_id)
+
+    # Fetch updated profile
+    return UserOut(**await fetch_user(db, user_id))
+
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+MAX_NUTRITION_RANGE_DAYS = 400
+
+def nutrition_goals(user: Dict) -> Dict:
+    """Daily goals from the user row resolved by the auth dependency"""
+    return {name: user[f"daily_{'calorie' if name == 'calories' else name}_goal"] for name in NUTRIENTS}
+
+def period_start(day: date, period: str) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+def summarize_period(start: date, end: date, days: Dict[date, tuple], goals: Dict) -> Dict:
+    """Totals and goal progress for one bucket of the daily rollup"""
+    totals = {name: 0 for name in NUTRIENTS}
+    meals = 0
+    for values in days.values():
+        for name, value in zip(NUTRIENTS, values):
+            totals[name] += value
+        meals += values[4]
+    span = (end - start).days + 1
+    progress = {
+        name: round(totals[name] * 100.0 / (goals[name] * span), 1) if goals.get(name) else None
+        for name in NUTRIENTS
+    }
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": span,
+        **totals,
+        "meals": meals,
+        "daily_average": {name: round(totals[name] / span, 1) for name in NUTRIENTS},
+        "progress": progress
+    }
+
+async def load_daily_nutrition(db: aiosqlite.Connection, user_id: int, date_from: date, date_to: date):
+    """Per-day (values, meals) arrays for the range, expanded from the weekly rollup rows"""
+    # Primary-key range read; a user has at most 7 rows per plan start week
+    cursor = await db.execute(
+        """SELECT date, calories, protein, carbs, fat, meal_count FROM daily_nutrition
+           WHERE user_id = ? AND date <= ?""",
+        (user_id, date_to.isoformat())
+    )
+    return nutrition_analytics.build_daily_arrays(await cursor.fetchall(), date_from, date_to)
+
+@router.get("/nutrition", response_model=Dict)
+async def get_nutrition_range(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from", description="First day (defaults to 6 days before `to`)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day (defaults to today)"),
+    period: str = Query("day", pattern="^(day|week|month)$"),
+    user_id: int = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """Planned nutrition totals and goal progress per day, week or month"""
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=6)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (date_to - date_from).days >= MAX_NUTRITION_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_NUTRITION_RANGE_DAYS} days")
+
+    goals = nutrition_goals(request.state.user)
+    values, meals = await load_daily_nutrition(db, user_id, date_from, date_to)
+    buckets: Dict[date, Dict[date, tuple]] = {}
+    for offset in meals.nonzero()[0]:
+        day = date_from + timedelta(days=int(offset))
+        row = tuple(int(v) for v in values[offset]) + (int(meals[offset]),)
+        buckets.setdefault(period_start(day, period), {})[day] = row
+
+    periods = []
+    start = period_start(date_from, period)
+    while start <= date_to:
+        if period == "week":
+            next_start = start + timedelta(days=7)
+        elif period == "month":
+            next_start = (start + timedelta(days=32)).replace(day=1)
+        else:
+            next_start = start + timedelta(days=1)
+        # Clip the first and last bucket to the requested range
+        bucket_start = max(start, date_from)
+        bucket_end = min(next_start - timedelta(days=1), date_to)
+        periods.append(summarize_period(bucket_start, bucket_end, buckets.get(start, {}), goals))
+        start = next_start
+
+    all_days = {day: values for bucket in buckets.values() for day, values in bucket.items()}
+    return {
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "period": period,
+        "goals": goals,
+        "periods": periods,
+        "totals": summarize_period(date_from, date_to, all_days, goals)
+    }
+
+@router.get("/nutrition/analytics", response_model=Dict)
+async def get_nutrition_analytics(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from", description="First day (defaults to 29 days before `to`)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day (defaults to today)"),
+    window: int = Query(7, ge=1, le=90, description="Rolling average window in days"),
+    tolerance: float = Query(0.1, gt=0, le=1, description="Allowed relative deviation from a goal"),
+    user_id: int = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db)
+):
+    """Rolling averages, macro ratios, goal deviation and streaks over a window"""
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (date_to - date_from).days >= MAX_NUTRITION_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_NUTRITION_RANGE_DAYS} days")
+
+    goals = nutrition_goals(request.state.user)
+    values, meals = await load_daily_nutrition(db, user_id, date_from, date_to)
+    result = nutrition_analytics.analyze(values, meals, goals, date_from, window=window, tolerance=tolerance)
+    return {"from": date_from.isoformat(), "to": date_to.isoformat(), "goals": goals, **result}
 
 @router.get("/nutrition/today", response_model=Dict)
-async def get_today_nutrition(user_id: int = Depends(get_current_user)):
+async def get_today_nutrition(user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
     """Get today's nutrition intake from meal plan"""
+    # Same rollup read as /nutrition, so both agree on every day
     today = date.today()
-    weekday = today.weekday()  # 0=Monday, 6=Sunday
-    
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Get today's meals from the meal plan
-        cursor = await db.execute("""
-            SELECT m.calories, m.protein, m.carbs, m.fat
-            FROM meal_plan_items mpi
-            JOIN meal_plans mp ON mpi.meal_plan_id = mp.id
-            JOIN meals m ON mpi.meal_id = m.id
-            WHERE mp.user_id = ? AND mpi.day = ?
-        """, (user_id, weekday))
-        
-        meals = await cursor.fetchall()
-        
-        # Calculate totals
-        total_calories = sum(meal[0] or 0 for meal in meals)
-        total_protein = sum(meal[1] or 0 for meal in meals)
-        total_carbs = sum(meal[2] or 0 for meal in meals)
-        total_fat = sum(meal[3] or 0 for meal in meals)
-        
-        return {
-            "calories": total_calories,
-            "protein": total_protein,
-            "carbs": total_carbs,
-            "fat": total_fat
-        }
\ No newline at end of file
+    values, _ = await load_daily_nutrition(db, user_id, today, today)
+    return {name: int(value) for name, value in zip(NUTRIENTS, values[0])}
@@ -2,13 +2,12 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 import aiosqlite
 from pydantic import BaseModel
-from auth import SECRET_KEY, ALGORITHM
-from jose import jwt, JWTError
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import DB_PATH
+from auth import get_current_user
+from database import get_db
+from prompt_context import prompt_context_cache
+from pagination import PageParams, decode_cursor, encode_cursor, parse_fields, split_page, list_response
 
 router = APIRouter(prefix="/utensils", tags=["utensils"])
-security = HTTPBearer()
 
 
 class UtensilCreate(BaseModel):
@@ -23,24 +22,16 @@ class UtensilOut(BaseModel):
     category: str
 
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload["user_id"]
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-
 @router.post("/", response_model=UtensilOut)
-async def add_utensil(utensil: UtensilCreate, user_id: int = Depends(get_current_user)):
+async def add_utensil(utensil: UtensilCreate, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
     """Add a new utensil to user's kitchen inventory"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "INSERT INTO utensils (user_id, name, category) VALUES (?, ?, ?)",
-            (user_id, utensil.name, utensil.category or "Other")
-        )
-        await db.commit()
-        utensil_id = cursor.lastrowid
+    cursor = await db.execute(
+        "INSERT INTO utensils (user_id, name, category) VALUES (?, ?, ?)",
+        (user_id, utensil.name, utensil.category or "Other")
+    )
+    await db.commit()
+    prompt_context_cache.invalidate_user(user_id)
+    utensil_id = cursor.lastrowid
     return UtensilOut(
         id=utensil_id,
         user_id=user_id,
@@ -53,9 +44,14 @@ async def add_utensil(utensil: UtensilCreate, user_id: int = Depends(get_current
 async def list_utensils(
     user_id: int = Depends(get_current_user),
     search: Optional[str] = Query(None),
-    category: Optional[str] = Query(None)
+    category: Optional[str] = Query(None),
+    page: PageParams = Depends(),
+    db: aiosqlite.Connection = Depends(get_db)
 ):
-    """Get all utensils for the current user"""
+    """Get the current user's utensils, optionally paged with `limit`/`after`"""
+    fields = parse_fields(page.fields, UtensilOut.__fields__)
+    after = decode_cursor(page.after, 3)
+    # category is never NULL (migration 7), so idx_utensils_user serves the sort and the seek
     query = "SELECT id, user_id, name, category FROM utensils WHERE user_id = ?"
     params = [user_id]
     
@@ -67,41 +63,51 @@ async def list_utensils(
         query += " AND category = ?"
         params.append(category)
     
-    query += " ORDER BY category, name"
+    if after:
+        query += " AND (category, name, id) > (?, ?, ?)"
+        params.extend(after)
+    
+    query += " ORDER BY category, name, id"
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
+    if page.limit:
+        query += " LIMIT ?"
+        params.append(page.limit + 1)
     
-    return [
+    cursor = await db.execute(query, params)
+    rows, has_more = split_page(await cursor.fetchall(), page.limit)
+    next_cursor = encode_cursor([rows[-1][3], rows[-1][2], rows[-1][0]]) if has_more else None
+
+    utensils = [
         UtensilOut(id=row[0], user_id=row[1], name=row[2], category=row[3])
         for row in rows
     ]
+    return list_response(utensils, fields, next_cursor)
 
 
 @router.put("/{utensil_id}", response_model=UtensilOut)
 async def update_utensil(
     utensil_id: int,
     utensil: UtensilCreate,
-    user_id: int = Depends(get_current_user)
+    user_id: int = Depends(get_current_user),
+    db: aiosqlite.Connection = Depends(get_db)
 ):
     """Update a utensil"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Check if utensil exists and belongs to user
-        cursor = await db.execute(
-            "SELECT id FROM utensils WHERE id = ? AND user_id = ?",
-            (utensil_id, user_id)
-        )
-        if not await cursor.fetchone():
-            raise HTTPException(status_code=404, detail="Utensil not found")
-        
-        # Update the utensil
-        await db.execute(
-            "UPDATE utensils SET name = ?, category = ? WHERE id = ? AND user_id = ?",
-            (utensil.name, utensil.category or "Other", utensil_id, user_id)
-        )
-        await db.commit()
-    
+    # Check if utensil exists and belongs to user
+    cursor = await db.execute(
+        "SELECT id FROM utensils WHERE id = ? AND user_id = ?",
+        (utensil_id, user_id)
+    )
+    if not await cursor.fetchone():
+        raise HTTPException(status_code=404, detail="Utensil not found")
+
+    # Update the utensil
+    await db.execute(
+        "UPDATE utensils SET name = ?, category = ? WHERE id = ? AND user_id = ?",
+        (utensil.name, utensil.category or "Other", utensil_id, user_id)
+    )
+    await db.commit()
+    prompt_context_cache.invalidate_user(user_id)
+
     return UtensilOut(
         id=utensil_id,
         user_id=user_id,
@@ -111,18 +117,18 @@ async def update_utensil(
 
 
 @router.delete("/{utensil_id}")
-async def delete_utensil(utensil_id: int, user_id: int = Depends(get_current_user)):
+async def delete_utensil(utensil_id: int, user_id: int = Depends(get_current_user), db: aiosqlite.Connection = Depends(get_db)):
     """Delete a utensil"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "DELETE FROM utensils WHERE id = ? AND user_id = ?",
-            (utensil_id, user_id)
-        )
-        await db.commit()
-        
-        if cursor.rowcount == 0:
-            raise HTTPException(status_code=404, detail="Utensil not found")
-    
+    cursor = await db.execute(
+        "DELETE FROM utensils WHERE id = ? AND user_id = ?",
+        (utensil_id, user_id)
+    )
+    await db.commit()
+    prompt_context_cache.invalidate_user(user_id)
+
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Utensil not found")
+
     return {"message": "Utensil deleted"}
 
 
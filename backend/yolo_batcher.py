@@ -0,0 +1,153 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Detection requests are handed to one dedicated inference thread instead of
+# running model.predict on the event loop. The thread waits up to
+# YOLO_BATCH_WINDOW_MS after the first request for others to arrive and runs
+# them as a single batched predict (at most YOLO_MAX_BATCH images), then
+# resolves each caller's future with its own result. PyTorch releases the GIL
+# during inference, so the API keeps serving requests meanwhile.
+YOLO_BATCH_WINDOW_MS = float(os.getenv("YOLO_BATCH_WINDOW_MS", "15"))
+YOLO_MAX_BATCH = int(os.getenv("YOLO_MAX_BATCH", "8"))
+YOLO_QUEUE_LIMIT = int(os.getenv("YOLO_QUEUE_LIMIT", "64"))
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Runs `predict(inputs) -> outputs` (one output per input) on its own thread."""
+
+    def __init__(
+        self,
+        predict: Callable[[List[Any]], List[Any]],
+        window_ms: float = YOLO_BATCH_WINDOW_MS,
+        max_batch: int = YOLO_MAX_BATCH,
+        queue_limit: int = YOLO_QUEUE_LIMIT,
+        name: str = "yolo-inference",
+    ):
+        self.predict = predict
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_limit))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # Never block on a full queue (the worker may be stuck in predict):
+        # fail whatever is still waiting to make room for the sentinel
+        while True:
+            try:
+                self._queue.put_nowait(_STOP)
+                break
+            except queue.Full:
+                self._fail_pending()
+        thread.join(timeout)
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next batch and await its output.
+
+        Raises queue.Full when too many requests are already waiting.
+        """
+        if not self.running:
+            self.start()
+        future: Future = Future()
+        self._queue.put_nowait((item, future))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else None,
+            "largest_batch": self.largest_batch,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+        }
+
+    def _collect(self, first: Tuple[Any, Future]) -> Tuple[List[Tuple[Any, Future]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch, stop = self._collect(entry)
+            # Callers whose request was cancelled while queued are dropped
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+            if stop:
+                break
+        self._fail_pending()
+
+    def _run_batch(self, batch: List[Tuple[Any, Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            outputs = self.predict([item for item, _ in batch])
+            if len(outputs) != len(batch):
+                raise RuntimeError(f"predict returned {len(outputs)} results for {len(batch)} inputs")
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # One bad input should not fail everyone it was batched with
+            print(f"Batched inference failed ({e}), retrying {len(batch)} inputs one by one")
+            for entry in batch:
+                try:
+                    entry[1].set_result(self.predict([entry[0]])[0])
+                except Exception as single_err:
+                    entry[1].set_exception(single_err)
+            return
+        for (_, future), output in zip(batch, outputs):
+            future.set_result(output)
+
+    def _fail_pending(self) -> None:
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if entry is not _STOP and entry[1].set_running_or_notify_cancel():
+                entry[1].set_exception(RuntimeError("Inference worker shutting down"))
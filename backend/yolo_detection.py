@@ -1,12 +1,12 @@
 import os
-import io
 import json
-from typing import Dict, List, Optional
+import queue
+import asyncio
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
-from ultralytics import YOLO
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from PIL import Image
 import logging
 from dotenv import load_dotenv
@@ -21,13 +21,8 @@ except ImportError:
     TESSERACT_AVAILABLE = False
     logging.warning("pytesseract not installed. OCR functionality will be disabled.")
 
-# OpenAI for LLM filtering
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    logging.warning("OpenAI not installed. LLM filtering will be disabled.")
+# OpenAI for LLM filtering (shared async client)
+from openai_client import chat_completion, get_openai_client
 
 # Optional HEIF/HEIC support
 try:
@@ -36,8 +31,11 @@ try:
 except ImportError:
     pass  # continue without HEIF
 
-# Import authentication config
-from auth import SECRET_KEY, ALGORITHM
+# Shared authentication dependency
+from auth import get_current_user
+from yolo_batcher import MicroBatcher
+from yolo_model import detector
+from detection_images import DetectionImages, image_decoder, likely_has_text
 
 load_dotenv()
 
@@ -47,15 +45,6 @@ logging.basicConfig(level=logging.INFO)
 os.environ['YOLO_PROFILING'] = '0'
 # FastAPI router
 router = APIRouter(prefix="/detect", tags=["detection"])
-security = HTTPBearer(auto_error=False)
-
-# Load YOLO model (downloads yolov8n.pt if not present)
-try:
-    model = YOLO("best.pt")
-    logger.info("best model loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load YOLO model: {e}")
-    raise RuntimeError("YOLO model could not be loaded")
 
 # Food items mapping
 FOOD_ITEMS_MAP: Dict[str, str] = {
@@ -185,19 +174,55 @@ FOOD_ITEMS_MAP: Dict[str, str] = {
 }
 
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    """Validate JWT token and return user_id"""
-    if token is None:
-        raise HTTPException(status_code=401, detail="Authentication required")
-
-    try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token: user_id missing")
-        return int(user_id)
-    except (JWTError, ValueError):
-        raise HTTPException(status_code=401, detail="Invalid token")
+def parse_detections(result, names: Dict[int, str]) -> List[Dict]:
+    """Food items (deduplicated, most confident first) from one YOLO result."""
+    items: List[Dict] = []
+    if result.boxes is None:
+        return items
+    boxes = result.boxes
+    for i in range(len(boxes)):
+        try:
+            class_id = int(boxes.cls[i].item())
+            confidence = float(boxes.conf[i].item())
+            class_name = names[class_id]
+
+            if confidence > 0.5:
+                food_name = FOOD_ITEMS_MAP.get(class_name.lower(), class_name)
+                if not any(item["name"] == food_name for item in items):
+                    items.append({
+                        "name": food_name,
+                        "confidence": round(confidence * 100, 1),
+                        "yolo_class": class_name,
+                        "source": "yolo"
+                    })
+        except Exception as parse_err:
+            logger.warning(f"Skipping detection due to parse error: {parse_err}")
+            continue
+    items.sort(key=lambda x: x["confidence"], reverse=True)
+    return items
+
+
+def predict_batch(images: List[Image.Image]) -> List[List[Dict]]:
+    """One batched YOLO call; runs on the inference thread."""
+    model = detector.model
+    results = model.predict(source=images, save=False, verbose=False, stream=False)
+    return [parse_detections(result, model.names) for result in results]
+
+
+yolo_batcher = MicroBatcher(predict_batch)
+
+
+def model_unavailable_response() -> JSONResponse:
+    """503 telling the client whether the model is still warming up or failed to load."""
+    if detector.state == "failed":
+        message = "Detection model is unavailable"
+    else:
+        message = "Detection model is warming up, please retry shortly"
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "5"},
+        content={"success": False, "detected_items": [], "total_items": 0, "status": detector.state, "error": message},
+    )
 
 
 def extract_text_from_image(image: Image.Image) -> Optional[str]:
@@ -215,9 +240,30 @@ def extract_text_from_image(image: Image.Image) -> Optional[str]:
         return None
 
 
-def filter_items_with_llm(yolo_items: List[Dict], ocr_text: Optional[str]) -> Dict:
+async def read_text(images: DetectionImages) -> Tuple[Optional[str], bool]:
+    """(OCR text, skipped); the OCR rendition is only decoded and read when the gate sees text."""
+    if not await run_in_threadpool(likely_has_text, images.model):
+        logger.info("No text-like regions found, skipping OCR")
+        return None, True
+    ocr_image = await image_decoder.decode_ocr(images.data)
+    return await run_in_threadpool(extract_text_from_image, ocr_image), False
+
+
+async def run_yolo(image: Image.Image) -> List[Dict]:
+    try:
+        yolo_items = await yolo_batcher.submit(image)
+        logger.info(f"YOLO detected {len(yolo_items)} items")
+        return yolo_items
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Detection is busy, please retry shortly")
+    except Exception as yolo_err:
+        logger.error(f"YOLO inference failed: {yolo_err}")
+        return []
+
+
+async def filter_items_with_llm(yolo_items: List[Dict], ocr_text: Optional[str]) -> Dict:
     """Use LLM to filter and combine YOLO detections with OCR text to extract food items"""
-    if not OPENAI_AVAILABLE:
+    if get_openai_client() is None:
         logger.warning("OpenAI not available, returning unfiltered results")
         return {
             "yolo_items": yolo_items,
@@ -227,8 +273,6 @@ def filter_items_with_llm(yolo_items: List[Dict], ocr_text: Optional[str]) -> Di
         }
     
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
         # Prepare the prompt
         yolo_list = [item["name"] for item in yolo_items]
         
@@ -255,7 +299,7 @@ Return format:
 
 Be liberal with extraction - include anything that could be a food item, ingredient, or beverage."""
 
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": "You are a food item extraction assistant. Return ONLY valid JSON."},
@@ -319,58 +363,33 @@ async def detect_food_items(
         if upload is None:
             raise HTTPException(status_code=422, detail="No image provided. Send multipart/form-data with field 'file' or 'image'.")
 
+        if not detector.ready:
+            detector.start_loading()
+            return model_unavailable_response()
+
         # Validate file type
         if upload.content_type and not upload.content_type.startswith("image/"):
             return {"success": False, "detected_items": [], "total_items": 0, "error": "File must be an image"}
 
-        # Read and open image
+        # Decode the model input at reduced scale (off the event loop)
         image_data = await upload.read()
         try:
-            image_obj = Image.open(io.BytesIO(image_data)).convert("RGB")
+            images = await image_decoder.decode(image_data)
         except Exception as pil_err:
             return {"success": False, "detected_items": [], "total_items": 0, "error": f"Invalid image file: {pil_err}"}
 
-        # ===== STEP 1: Run YOLO Detection =====
-        yolo_items: List[Dict] = []
-        try:
-            results = model.predict(source=image_obj, save=False, verbose=False, stream=False)
-            
-            # Process detections
-            for result in results:
-                if result.boxes is not None:
-                    boxes = result.boxes
-                    for i in range(len(boxes)):
-                        try:
-                            class_id = int(boxes.cls[i].item())
-                            confidence = float(boxes.conf[i].item())
-                            class_name = model.names[class_id]
-
-                            if confidence > 0.5:
-                                food_name = FOOD_ITEMS_MAP.get(class_name.lower(), class_name)
-                                if not any(item["name"] == food_name for item in yolo_items):
-                                    yolo_items.append({
-                                        "name": food_name,
-                                        "confidence": round(confidence * 100, 1),
-                                        "yolo_class": class_name,
-                                        "source": "yolo"
-                                    })
-                        except Exception as parse_err:
-                            logger.warning(f"Skipping detection due to parse error: {parse_err}")
-                            continue
-
-            yolo_items.sort(key=lambda x: x["confidence"], reverse=True)
-            logger.info(f"YOLO detected {len(yolo_items)} items")
-            
-        except Exception as yolo_err:
-            logger.error(f"YOLO inference failed: {yolo_err}")
-            yolo_items = []
+        # ===== STEP 1+2: YOLO (batched) and OCR (gated on text presence) run concurrently =====
+        yolo_items, (ocr_text, ocr_skipped) = await asyncio.gather(
+            run_yolo(images.model),
+            read_text(images),
+        )
+
+        # ===== STEP 3: Combine with LLM Filtering (only when OCR found text) =====
+        if ocr_text:
+            llm_result = await filter_items_with_llm(yolo_items, ocr_text)
+        else:
+            llm_result = {"yolo_items": yolo_items, "ocr_items": [], "combined_items": yolo_items, "llm_filtered": False}
 
-        # ===== STEP 2: Run OCR (Tesseract) =====
-        ocr_text = extract_text_from_image(image_obj)
-        
-        # ===== STEP 3: Combine with LLM Filtering =====
-        llm_result = filter_items_with_llm(yolo_items, ocr_text)
-        
         combined_items = llm_result.get("combined_items", yolo_items)
         
         return {
@@ -382,7 +401,8 @@ async def detect_food_items(
                 "yolo_count": len(yolo_items),
                 "ocr_count": len(llm_result.get("ocr_items", [])),
                 "combined_count": len(combined_items),
-                "llm_filtered": llm_result.get("llm_filtered", False)
+                "llm_filtered": llm_result.get("llm_filtered", False),
+                "ocr_skipped": ocr_skipped
             },
             "ocr_text": ocr_text[:500] if ocr_text else None,  # First 500 chars for debugging
             "yolo_items": [{"name": item["name"], "confidence": item.get("confidence", 0)} for item in yolo_items],
@@ -396,6 +416,20 @@ async def detect_food_items(
         return {"success": False, "detected_items": [], "total_items": 0, "error": f"Unexpected server error: {str(e)}"}
 
 
+@router.get("/ready")
+async def detection_ready():
+    """Readiness of the detection model: 200 once warmed up, 503 before"""
+    if not detector.ready:
+        detector.start_loading()
+    return JSONResponse(status_code=200 if detector.ready else 503, content=detector.status())
+
+
+@router.get("/stats")
+async def detection_stats():
+    """Inference batching counters for this worker"""
+    return yolo_batcher.stats()
+
+
 @router.get("/supported-items")
 async def get_supported_items():
     """Get list of food items that can be detected"""
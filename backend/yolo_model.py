@@ -0,0 +1,114 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+# The detection model is loaded on a background thread (at startup when
+# YOLO_PRELOAD=1, otherwise on the first /detect request) instead of at
+# import, so API workers start without pulling in ultralytics/torch and a
+# missing weights file only disables detection. A warm-up inference on a
+# blank image runs before the model is reported ready, so the first real
+# request doesn't pay for lazy initialisation and allocation.
+#
+# YOLO_BACKEND selects the runtime: "torch" loads YOLO_WEIGHTS directly,
+# "onnx" (ONNX Runtime) and "openvino" load the artifacts written next to it
+# by export_detector.py, with YOLO_INT8=1 picking the INT8-quantized export.
+# All of them go through the same ultralytics predict/Results interface.
+YOLO_WEIGHTS = os.getenv("YOLO_WEIGHTS", "best.pt")
+YOLO_BACKEND = os.getenv("YOLO_BACKEND", "torch").lower()
+YOLO_INT8 = os.getenv("YOLO_INT8", "0") == "1"
+YOLO_BACKENDS = ("torch", "onnx", "openvino")
+YOLO_PRELOAD = os.getenv("YOLO_PRELOAD", "1") == "1"
+YOLO_WARMUP_SIZE = int(os.getenv("YOLO_WARMUP_SIZE", "640"))
+YOLO_RETRY_SECONDS = int(os.getenv("YOLO_RETRY_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+def backend_weights(weights: str, backend: str, int8: bool = False) -> str:
+    """Path of the model artifact for `backend` exported from `weights` (a .pt file)."""
+    stem = os.path.splitext(weights)[0]
+    if backend == "torch":
+        return weights
+    if backend == "onnx":
+        return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+    if backend == "openvino":
+        # Directory names used by ultralytics' OpenVINO exporter
+        return f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+    raise ValueError(f"Unknown YOLO backend {backend!r}, expected one of {', '.join(YOLO_BACKENDS)}")
+
+
+def load_yolo(path: str):
+    from ultralytics import YOLO
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found (run export_detector.py for onnx/openvino backends)")
+    return YOLO(path, task="detect")
+
+
+class DetectorModel:
+    def __init__(self, weights: str = YOLO_WEIGHTS, backend: str = YOLO_BACKEND, int8: bool = YOLO_INT8):
+        self.backend = backend
+        self.int8 = int8
+        try:
+            self.weights = backend_weights(weights, backend, int8)
+        except ValueError as e:
+            logger.error(str(e))
+            self.weights = weights
+            self.backend = "torch"
+        self.state = "idle"  # idle | loading | ready | failed
+        self.model: Any = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._failed_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start_loading(self) -> None:
+        """Begin loading in the background; a failed load is retried after a cooldown."""
+        with self._lock:
+            if self.state in ("loading", "ready"):
+                return
+            if self.state == "failed" and time.time() - self._failed_at < YOLO_RETRY_SECONDS:
+                return
+            self.state = "loading"
+            self.error = None
+        threading.Thread(target=self._load, name="yolo-loader", daemon=True).start()
+
+    def _load(self) -> None:
+        started = time.perf_counter()
+        try:
+            model = load_yolo(self.weights)
+            model.predict(source=Image.new("RGB", (YOLO_WARMUP_SIZE, YOLO_WARMUP_SIZE)), save=False, verbose=False)
+        except Exception as e:
+            logger.error(f"Failed to load YOLO model {self.weights}: {e}")
+            with self._lock:
+                self.state = "failed"
+                self.error = str(e)
+                self._failed_at = time.time()
+            return
+        with self._lock:
+            self.model = model
+            self.load_seconds = round(time.perf_counter() - started, 2)
+            self.state = "ready"
+        logger.info(f"YOLO model {self.weights} ({self.backend}) loaded and warmed up in {self.load_seconds}s")
+
+    def status(self) -> Dict:
+        return {
+            "status": self.state,
+            "ready": self.ready,
+            "weights": self.weights,
+            "backend": self.backend,
+            "int8": self.int8,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+detector = DetectorModel()